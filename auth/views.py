@@ -194,7 +194,7 @@ def profile(request):
         p_form = ProfileUpdateForm(instance=user.profile)
 
     # Get user's listings with statistics
-    user_listings = Listing.objects.filter(user=user).order_by('-created_at')
+    user_listings = Listing.objects.filter(user=user).prefetch_related('images').order_by('-created_at')
     approved_listings_count = user_listings.filter(is_approved=True).count()
     featured_listings_count = user_listings.filter(listing_type='featured').count()
 
@@ -263,7 +263,7 @@ def my_listings(request):
     if not request.user.is_authenticated:
         return redirect('login')
 
-    listings = Listing.objects.filter(user=request.user).order_by('-created_at')
+    listings = Listing.objects.filter(user=request.user).prefetch_related('images').order_by('-created_at')
 
     # Statistics
     active_listings = listings.filter(is_approved=True)
@@ -194,6 +194,74 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', 10485760))
 FILE_UPLOAD_PERMISSIONS = int(os.getenv('FILE_UPLOAD_PERMISSIONS', '0o644'), 8)
+# Listing photo uploads are streamed to temporary files and refused over these
+# limits while they arrive, then normalized by a bounded thread pool (see
+# listings/uploads.py); other uploads use Django's default handlers
+UPLOAD_MAX_FILE_SIZE = int(os.getenv('UPLOAD_MAX_FILE_SIZE', 20971520))
+UPLOAD_MAX_IMAGE_PIXELS = int(os.getenv('UPLOAD_MAX_IMAGE_PIXELS', 50000000))
+LISTING_PHOTO_MAX_DIMENSION = int(os.getenv('LISTING_PHOTO_MAX_DIMENSION', 2560))
+LISTING_PHOTO_WORKERS = int(os.getenv('LISTING_PHOTO_WORKERS', min(4, os.cpu_count() or 1)))
+# Threads resizing committed photos into their derivatives (listings/images.py),
+# apart from the ones normalizing uploads while their request waits
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv('IMAGE_DERIVATIVE_WORKERS', min(2, os.cpu_count() or 1)))
+# Resumable chunked photo uploads: where they are assembled, the chunk size
+# suggested to clients and how long unfinished or unused uploads are kept
+CHUNKED_UPLOAD_DIR = os.getenv('CHUNKED_UPLOAD_DIR', BASE_DIR / 'cache' / 'uploads')
+CHUNKED_UPLOAD_CHUNK_SIZE = int(os.getenv('CHUNKED_UPLOAD_CHUNK_SIZE', 262144))
+CHUNKED_UPLOAD_EXPIRY_HOURS = int(os.getenv('CHUNKED_UPLOAD_EXPIRY_HOURS', 24))
+# Drafts of the new listing form kept after a failed submit (listings/drafts.py)
+LISTING_DRAFT_EXPIRY_DAYS = int(os.getenv('LISTING_DRAFT_EXPIRY_DAYS', 7))
+
+# Sizes media images are resized to on request at MEDIA_URL r/<size>/<path>
+# (see listings/resize.py): 'crop' fills the box exactly, 'fit' stays inside it
+MEDIA_RESIZE_SIZES = {
+    '1200x630': 'crop',   # WhatsApp / Open Graph share previews
+    '1600x900': 'crop',   # slider
+    '2048x2048': 'fit',   # lightbox
+    '192x192': 'crop',    # PWA icons
+    '512x512': 'crop',
+}
+MEDIA_RESIZE_CACHE_DIR = os.getenv('MEDIA_RESIZE_CACHE_DIR', BASE_DIR / 'cache' / 'resized')
+
+# Media is checked by Django and sent by the web server (see listings/delivery.py):
+# 'x-accel-redirect' (nginx), 'x-sendfile' (Apache mod_xsendfile, lighttpd) or ''
+# to send it from Django; the locations are nginx internal aliases of MEDIA_ROOT
+# and MEDIA_RESIZE_CACHE_DIR
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL', '')
+MEDIA_ACCEL_LOCATION = os.getenv('MEDIA_ACCEL_LOCATION', '/internal/media/')
+MEDIA_RESIZE_ACCEL_LOCATION = os.getenv('MEDIA_RESIZE_ACCEL_LOCATION', '/internal/resized/')
+
+
+# Cache shared by every worker process; entries are invalidated by tags such as
+# listing:<id> when listings change (see listings/caching.py). CACHE_BACKEND is
+# 'file' (default), 'redis' or 'memcached' with CACHE_LOCATION as their address,
+# 'database' (run `manage.py createcachetable` first), or 'locmem' for a single
+# process
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+CACHE_BACKENDS = {
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache' / 'django')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache', '127.0.0.1:11211'),
+    'database': ('django.core.cache.backends.db.DatabaseCache', 'bnb_cache'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'bnb'),
+}
+# Whether cache.add() is atomic across worker processes, so that one worker
+# recomputes a missing entry while the others wait for it. The file backend
+# checks then writes, and locmem is not shared between processes; with them
+# every worker computes its own copy.
+CACHE_LOCKS = CACHE_BACKEND in ('redis', 'memcached', 'database')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 300)),
+        'KEY_PREFIX': 'bnb',
+        'OPTIONS': {'MAX_ENTRIES': 20000} if CACHE_BACKEND in ('file', 'locmem') else {},
+    },
+}
+# Longest a public page is served from the cache; changes to listings purge
+# the pages showing them straight away (see listings/pagecache.py)
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 600))
 
 
 # CSRF Settings - IMPORTANT FOR LOCAL DEVELOPMENT
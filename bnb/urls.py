@@ -2,10 +2,12 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.contrib.sitemaps.views import sitemap
 from listings.sitemaps import sitemaps
+from listings import caching
+from listings.pagecache import cached_page, positive_int
+from listings.views import protected_media, resized_media
 from django.views.generic.base import TemplateView
 from django.views.generic import RedirectView
 
@@ -16,7 +18,8 @@ urlpatterns = [
 path('accounts/', RedirectView.as_view(url='/auth/login/', permanent=True)),
     path('accounts/profile/', RedirectView.as_view(url='/auth/profile/', permanent=True)),
 
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps},
+    path('sitemap.xml', cached_page(lambda request, **kwargs: {caching.ALL_LISTINGS}, {'p': positive_int(1000)})(sitemap),
+         {'sitemaps': sitemaps},
          name='django.contrib.sitemaps.views.sitemap'),
 
 path('robots.txt', TemplateView.as_view(
@@ -24,13 +27,14 @@ path('robots.txt', TemplateView.as_view(
         content_type='text/plain')
     ),
 
+    # Media, in production too: the web server passes MEDIA_URL on to Django, which
+    # checks access and hands the file back to it (see listings/delivery.py)
+    path(f"{settings.MEDIA_URL.lstrip('/')}r/<str:size>/<path:path>", resized_media, name='resized_media'),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", protected_media, name='media'),
+
 ]
 
 # Serve static files during development
 urlpatterns += staticfiles_urlpatterns()
 
-# Serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
 # For production, you'll need to configure your web server (nginx/apache)
\ No newline at end of file
@@ -1,6 +1,17 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
+from django.db.models import Case, IntegerField, Value, When
 from django.utils.html import format_html
-from .models import Listing, Booking
+from .models import Listing, ListingImage, Booking
+from . import caching, search
+
+
+class ListingImageInline(admin.TabularInline):
+    model = ListingImage
+    fields = ('image', 'position', 'width', 'height', 'dominant_color')
+    readonly_fields = ('width', 'height', 'dominant_color')
+    max_num = ListingImage.MAX_PER_LISTING
+    extra = 0
 
 
 @admin.register(Listing)
@@ -18,6 +29,7 @@ class ListingAdmin(admin.ModelAdmin):
     raw_id_fields = ('user',)
     list_per_page = 25
     date_hierarchy = 'created_at'
+    inlines = [ListingImageInline]
 
     # Add actions for bulk operations
     actions = ['make_featured', 'make_free', 'approve_listings', 'unapprove_listings',
@@ -72,59 +84,9 @@ class ListingAdmin(admin.ModelAdmin):
             'fields': ('parking_spots', 'covered_parking', 'visitor_parking')
         }),
 
-        # Basic Amenities
-        ('Basic Amenities', {
-            'fields': ('wifi', 'parking', 'kitchen')
-        }),
-
-        # Fitness & Wellness
-        ('Fitness & Wellness', {
-            'fields': ('gym', 'pool', 'spa', 'sauna', 'steam_room'),
-            'classes': ('collapse',)
-        }),
-
-        # Climate Control
-        ('Climate Control', {
-            'fields': ('ac', 'heating', 'ceiling_fans', 'fireplace'),
-            'classes': ('collapse',)
-        }),
-
-        # Entertainment
-        ('Entertainment', {
-            'fields': ('tv', 'sound_system', 'home_theater'),
-            'classes': ('collapse',)
-        }),
-
-        # Outdoor Features
-        ('Outdoor Features', {
-            'fields': ('balcony', 'terrace', 'garden', 'roof_terrace', 'bbq_area', 'outdoor_shower'),
-            'classes': ('collapse',)
-        }),
-
-        # Security
-        ('Security', {
-            'fields': ('cctv', 'security_guards', 'electric_fence', 'secure_compound', 'alarm_system'),
-            'classes': ('collapse',)
-        }),
-
-        # Utilities
-        ('Utilities', {
-            'fields': ('generator', 'solar_panels', 'water_tank', 'borehole', 'backup_water', 'internet_fiber'),
-            'classes': ('collapse',)
-        }),
-
-        # Building Amenities
-        ('Building Amenities', {
-            'fields': ('elevator', 'wheelchair_accessible', 'reception', 'lobby', 'concierge',
-                       'laundry_room', 'play_area', 'pet_friendly'),
-            'classes': ('collapse',)
-        }),
-
-        # Staff
-        ('Staff', {
-            'fields': ('house_staff', 'askari', 'caretaker'),
-            'classes': ('collapse',)
-        }),
+        # Amenities - one section per group, in the amenities_mask bit order
+        *((group, {'fields': fields, 'classes': () if group == 'Basic Amenities' else ('collapse',)})
+          for group, fields in Listing.AMENITY_GROUPS),
 
         # Additional Features
         ('Additional Features', {
@@ -138,8 +100,7 @@ class ListingAdmin(admin.ModelAdmin):
 
         # Media
         ('Media', {
-            'fields': ('main_image', 'image_2', 'image_3', 'image_4', 'image_5', 'image_6',
-                       'image_7', 'image_8', 'virtual_tour_url', 'youtube_video_id', 'image_count_display')
+            'fields': ('virtual_tour_url', 'youtube_video_id', 'image_count_display')
         }),
 
         # Map & Location
@@ -266,6 +227,24 @@ class ListingAdmin(admin.ModelAdmin):
         """Optimize queryset with select_related"""
         return super().get_queryset(request).select_related('user')
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search through the full-text index instead of icontains scans over
+        search_fields, best match first unless a column was clicked to sort by.
+        Past search.MAX_RESULTS matches the ranking would drop listings, so the
+        stock search takes over.
+        """
+        ids = search.search_listing_ids(search_term, queryset, limit=search.MAX_RESULTS + 1, admin=True)
+        if not search.tokenize(search_term) or len(ids) > search.MAX_RESULTS:
+            return super().get_search_results(request, queryset, search_term)
+        rank = Case(*[When(pk=pk, then=Value(len(ids) - position)) for position, pk in enumerate(ids)],
+                    default=Value(0), output_field=IntegerField())
+        queryset = queryset.filter(pk__in=ids).annotate(search_rank=rank)
+        if ORDER_VAR not in request.GET:
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset, False
+
+
 
 
 @admin.register(Booking)
@@ -360,31 +339,37 @@ class BookingAdmin(admin.ModelAdmin):
         return '-'
     price_at_inquiry_display.short_description = 'Price at Inquiry'
 
+    def update_status(self, queryset, status):
+        """queryset.update() sends no signals: expire the cache entries of the listings too"""
+        listing_ids = set(queryset.values_list('listing_id', flat=True))
+        caching.invalidate_on_commit(caching.listing_tag(pk) for pk in listing_ids)
+        return queryset.update(status=status)
+
     # Custom action methods
     def mark_as_confirmed(self, request, queryset):
         """Action to mark inquiries as confirmed"""
-        updated = queryset.update(status='confirmed')
+        updated = self.update_status(queryset, 'confirmed')
         self.message_user(request, f'✅ {updated} inquiry/inquiries marked as confirmed.')
 
     mark_as_confirmed.short_description = "✅ Mark selected as confirmed"
 
     def mark_as_pending(self, request, queryset):
         """Action to mark inquiries as pending"""
-        updated = queryset.update(status='pending')
+        updated = self.update_status(queryset, 'pending')
         self.message_user(request, f'⏳ {updated} inquiry/inquiries marked as pending.')
 
     mark_as_pending.short_description = "⏳ Mark selected as pending"
 
     def mark_as_cancelled(self, request, queryset):
         """Action to mark inquiries as cancelled"""
-        updated = queryset.update(status='cancelled')
+        updated = self.update_status(queryset, 'cancelled')
         self.message_user(request, f'❌ {updated} inquiry/inquiries marked as cancelled.')
 
     mark_as_cancelled.short_description = "❌ Mark selected as cancelled"
 
     def mark_as_completed(self, request, queryset):
         """Action to mark inquiries as completed"""
-        updated = queryset.update(status='completed')
+        updated = self.update_status(queryset, 'completed')
         self.message_user(request, f'✅ {updated} inquiry/inquiries marked as completed.')
 
     mark_as_completed.short_description = "✅ Mark selected as completed"
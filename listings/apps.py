@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ListingsConfig(AppConfig):
     name = 'listings'
+
+    def ready(self):
+        # Connect the search index signal handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,237 @@
+# listings/caching.py
+"""
+Entries of the shared cache invalidated by tags.
+
+An entry is stored with the tags its content depends on, e.g. the page of a
+location carries 'location:kilimani' and a listing's fragment
+'listing:42'. Each tag has a version in the cache; the entry keeps the
+versions it was computed under and is a miss as soon as one of them has
+moved on. Invalidating a tag is thus a single write, however many entries
+depend on it:
+
+    tags = [caching.listing_tag(listing.pk)]
+    html = caching.get_or_set(f'card:{listing.pk}', tags, lambda: render(listing))
+
+The Listing, ListingImage and Booking signals (signals.py) invalidate the tags
+of whatever they change once the transaction commits; queryset.update() on
+listings, which the admin bulk actions use, does too through
+listings_bulk_updated.
+
+An approval batch or an expiring entry would otherwise have every worker
+asking for a hot entry recompute it at once. Recomputing is single-flight: the
+worker that adds the entry's lock to the cache computes it, and the others
+wait for its result (wait_for) or, where a slightly old copy will do, serve the
+stale entry meanwhile; entries are kept STALE_TIMEOUT past their timeout for
+this. The lock needs an add() that is atomic across processes (redis,
+memcached, database); on the file and locmem backends settings.CACHE_LOCKS
+is off and every worker computes for itself, as without single-flight.
+"""
+import secrets
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+# Pages showing every listing depend on this one
+ALL_LISTINGS = 'listings'
+# Pages showing the facet counts (facets.py), which change far less often
+FACETS = 'facets'
+# Map tiles of marker clusters (clusters.py)
+CLUSTERS = 'clusters'
+
+TAG_PREFIX = 'tag:'
+LOCK_PREFIX = 'lock:'
+
+# How long an entry is kept past its timeout, to be served while it is recomputed
+STALE_TIMEOUT = 60
+# How long a worker may take to recompute an entry before another one may too
+LOCK_TIMEOUT = 30
+# How long a worker waits for an entry another one is computing, and how often it looks
+WAIT_TIMEOUT = 2
+POLL_INTERVAL = 0.05
+
+# lookup() of a key without an entry
+MISSING = object()
+
+
+def listing_tag(pk):
+    return f'listing:{pk}'
+
+
+def location_tag(code):
+    return f'location:{code}'
+
+
+def property_type_tag(code):
+    return f'ptype:{code}'
+
+
+def photo_tag(stem):
+    """Tag of a stored photo (its name without extension), shared by the listings showing it"""
+    return f'photo:{stem}'
+
+
+def listing_tags(*rows):
+    """
+    Tags of listings given as (pk, location, property_type) rows, plus
+    ALL_LISTINGS; pass a listing's old and new row when it moves
+    """
+    tags = {ALL_LISTINGS}
+    for pk, location, property_type in rows:
+        tags.add(listing_tag(pk))
+        if location:
+            tags.add(location_tag(location))
+        if property_type:
+            tags.add(property_type_tag(property_type))
+    return tags
+
+
+def stored_listing_tags(pks):
+    """listing_tags() of the listings ``pks`` as they are stored now"""
+    from .models import Listing, pk_batches
+
+    pks = list(pks)
+    return listing_tags(*(
+        row
+        for batch in pk_batches(pks)
+        for row in Listing.objects.filter(pk__in=batch).values_list('pk', 'location', 'property_type')
+    ))
+
+
+def new_version():
+    return secrets.token_hex(8)
+
+
+def tag_versions(tags):
+    """{tag: current version}; tags evicted or never seen get a fresh one"""
+    keys = {TAG_PREFIX + tag: tag for tag in tags}
+    versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+    missing = {key: new_version() for key, tag in keys.items() if tag not in versions}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        # Whoever added first wins
+        versions.update((keys[key], version) for key, version in cache.get_many(missing).items())
+    return versions
+
+
+def invalidate(tags):
+    """Expire every entry stored with one of ``tags``"""
+    if tags:
+        cache.set_many({TAG_PREFIX + tag: new_version() for tag in tags}, None)
+
+
+def invalidate_on_commit(tags):
+    """invalidate() once the current transaction commits (straight away outside one)"""
+    tags = set(tags)
+    if tags:
+        transaction.on_commit(lambda: invalidate(tags))
+
+
+def is_fresh(entry, versions):
+    if entry is None:
+        return False
+    entry_versions, value, fresh_until = entry
+    return ((fresh_until is None or time.time() < fresh_until)
+            and all(versions.get(tag) == version for tag, version in entry_versions.items()))
+
+
+def get_many(keys):
+    """{key: value} of the fresh entries among ``keys``; two cache round trips"""
+    entries = cache.get_many(keys)
+    versions = tag_versions({tag for entry in entries.values() for tag in entry[0]})
+    return {key: entry[1] for key, entry in entries.items() if is_fresh(entry, versions)}
+
+
+def get(key, default=None):
+    return get_many([key]).get(key, default)
+
+
+def lookup(key):
+    """(value, fresh) of the entry at ``key``: MISSING if there is none, else possibly stale"""
+    entry = cache.get(key)
+    if entry is None:
+        return MISSING, False
+    return entry[1], is_fresh(entry, tag_versions(entry[0]))
+
+
+def store_many(values, versions, timeout=DEFAULT_TIMEOUT):
+    """
+    Store {key: value}, each under its {tag: version} in ``versions`` read
+    *before* the values were computed, so an invalidation racing the
+    computation is not lost
+    """
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = cache.default_timeout
+    fresh_until = None if timeout is None else time.time() + timeout
+    cache.set_many(
+        {key: (versions[key], value, fresh_until) for key, value in values.items()},
+        None if timeout is None else timeout + STALE_TIMEOUT,
+    )
+
+
+def store(key, value, versions, timeout=DEFAULT_TIMEOUT):
+    store_many({key: value}, {key: versions}, timeout)
+
+
+@contextmanager
+def single_flight(key):
+    """
+    Take the lock on computing the entry at ``key``; yields whether this worker
+    got it, i.e. should compute the entry rather than wait for it. Always True
+    without settings.CACHE_LOCKS.
+    """
+    if not settings.CACHE_LOCKS:
+        yield True
+        return
+    token = new_version()
+    acquired = cache.add(LOCK_PREFIX + key, token, LOCK_TIMEOUT)
+    try:
+        yield acquired
+    finally:
+        # Not if it timed out and another worker holds it now
+        if acquired and cache.get(LOCK_PREFIX + key) == token:
+            cache.delete(LOCK_PREFIX + key)
+
+
+def wait_for(key):
+    """
+    The entry another worker is computing at ``key`` once it is stored, or
+    MISSING if that worker gives up, stores nothing or takes over WAIT_TIMEOUT.
+    Only for a worker single_flight() kept from computing, which holds no lock.
+    """
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        locked = cache.get(LOCK_PREFIX + key) is not None
+        value, fresh = lookup(key)
+        if fresh:
+            return value
+        if not locked:
+            break
+    return MISSING
+
+
+def get_or_set(key, tags, compute, timeout=DEFAULT_TIMEOUT, stale=False):
+    """
+    The fresh entry at ``key``, or compute() stored with ``tags``. While
+    another worker computes it, wait for its result, or with ``stale`` serve
+    the stale entry if there is one.
+    """
+    value, fresh = lookup(key)
+    if fresh:
+        return value
+    with single_flight(key) as computing:
+        if not computing:
+            if stale and value is not MISSING:
+                return value
+            value = wait_for(key)
+            if value is not MISSING:
+                return value
+        versions = tag_versions(tags)
+        value = compute()
+        store(key, value, versions, timeout)
+    return value
@@ -0,0 +1,85 @@
+# listings/cards.py
+"""
+Rendered listing cards kept in the shared cache.
+
+The featured slider and the listings grid each render their cards from a
+template of their own (TEMPLATES), which sees nothing but the ListingCard, so
+a card's HTML is the same on every page and for every visitor. It is cached
+under the card kind, the template version and the listing's id and
+updated_at, and tagged with the listing's tag: edits through save() move
+updated_at, while queryset.update() and photo changes, which do not, purge
+the tag (see caching.py). A page fetches all its cards with one multi-get and
+renders only the ones missing.
+
+A card row read just before a listing changes would be cached as fresh under
+the new tag version, so the page reads listings_version() before querying
+its rows, and cards rendered while any listing changed are not cached.
+"""
+import hashlib
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from . import caching
+
+TEMPLATES = {
+    'slide': 'listings/cards/slide.html',
+    'grid': 'listings/cards/grid.html',
+}
+
+# How long an untouched card is kept, in seconds
+TIMEOUT = 24 * 60 * 60
+
+_versions = {}
+
+
+def template_version(kind):
+    """Short hash of a card template's source; editing the template retires its cards"""
+    version = _versions.get(kind)
+    if version is None:
+        source = get_template(TEMPLATES[kind]).template.source
+        version = hashlib.sha256(source.encode()).hexdigest()[:12]
+        if not settings.DEBUG:
+            _versions[kind] = version
+    return version
+
+
+def listings_version():
+    """Version of the ALL_LISTINGS tag, which any change to a listing moves"""
+    return caching.tag_versions({caching.ALL_LISTINGS})[caching.ALL_LISTINGS]
+
+
+def card_key(kind, version, card):
+    return f'card:{kind}:{version}:{card.id}:{card.updated_at.timestamp():.6f}'
+
+
+def render(cards, since):
+    """
+    {kind: {listing id: safe HTML}} of {kind: ListingCards}, from the cache
+    where possible; ``since`` is the listings_version() read before the cards
+    were queried
+    """
+    keys = {}
+    for kind, listings in cards.items():
+        version = template_version(kind)
+        for card in listings:
+            keys[card_key(kind, version, card)] = (kind, card)
+
+    html = caching.get_many(list(keys))
+    missing = {key: entry for key, entry in keys.items() if key not in html}
+    if missing:
+        tags = {key: caching.listing_tag(card.id) for key, (kind, card) in missing.items()}
+        versions = caching.tag_versions(set(tags.values()) | {caching.ALL_LISTINGS})
+        rendered = {
+            key: get_template(TEMPLATES[kind]).render({'listing': card})
+            for key, (kind, card) in missing.items()
+        }
+        if versions[caching.ALL_LISTINGS] == since:
+            caching.store_many(rendered, {key: {tag: versions[tag]} for key, tag in tags.items()}, TIMEOUT)
+        html.update(rendered)
+
+    rendered = {kind: {} for kind in cards}
+    for key, (kind, card) in keys.items():
+        rendered[kind][card.id] = mark_safe(html[key])
+    return rendered
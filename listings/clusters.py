@@ -0,0 +1,201 @@
+# listings/clusters.py
+"""
+Map marker clustering over listing coordinates.
+
+The map asks for one Web Mercator tile (zoom/x/y, 256px) at a time. The
+listings inside the tile are binned into a grid of CELL_SIZE_PX cells; cells
+holding several listings are returned as a single cluster (count, centroid and
+bounds) and lone listings as markers. Binning is vectorised with NumPy when it
+is installed. Results are cached per (zoom, tile, filters) under the
+caching.CLUSTERS tag, which the Listing signals invalidate once a transaction
+moving a listing or changing its visibility commits.
+"""
+import hashlib
+import math
+
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from . import caching, geo
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - pure Python binning is used instead
+    np = None
+
+TILE_SIZE_PX = 256
+CELL_SIZE_PX = 64
+CELLS_PER_TILE = TILE_SIZE_PX // CELL_SIZE_PX
+MAX_ZOOM = 20
+# From this zoom on every listing is sent as its own marker
+MAX_CLUSTER_ZOOM = 17
+MAX_LATITUDE = 85.05112878
+
+CACHE_TIMEOUT = 60 * 10
+
+# Listing fields whose changes can move a listing between tiles or filter sets
+CLUSTER_FIELDS = frozenset({
+    'latitude', 'longitude', 'is_approved', 'listing_type', 'is_featured', 'location',
+    'property_type', 'effective_price', 'amenities_mask',
+})
+
+
+def valid_tile(zoom, x, y):
+    return 0 <= zoom <= MAX_ZOOM and 0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom
+
+
+def tile_latitude(y, zoom):
+    """Latitude of the top edge of tile row y"""
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / 2 ** zoom))))
+
+
+def tile_bounds(zoom, x, y):
+    """(south, west, north, east) of a tile"""
+    n = 2 ** zoom
+    return (
+        tile_latitude(y + 1, zoom),
+        x / n * 360.0 - 180.0,
+        tile_latitude(y, zoom),
+        (x + 1) / n * 360.0 - 180.0,
+    )
+
+
+def tile_rows(queryset, box):
+    """(pk, lat, lng, is_featured) of the located listings inside box"""
+    return list(
+        geo.within_bbox(queryset, *box).order_by()
+        .filter(latitude__isnull=False, longitude__isnull=False)
+        .annotate(lat=Cast('latitude', FloatField()), lng=Cast('longitude', FloatField()))
+        .values_list('pk', 'lat', 'lng', 'is_featured')
+    )
+
+
+def bin_rows(rows, zoom, x, y):
+    """Cell index (row-major within the tile) of every row, -1 outside the tile"""
+    scale = 2 ** zoom * CELLS_PER_TILE
+    cells = []
+    for pk, lat, lng, featured in rows:
+        lat = min(max(lat, -MAX_LATITUDE), MAX_LATITUDE)
+        sin_lat = math.sin(math.radians(lat))
+        cx = math.floor((lng + 180.0) / 360.0 * scale) - x * CELLS_PER_TILE
+        cy = math.floor((0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale) - y * CELLS_PER_TILE
+        inside = 0 <= cx < CELLS_PER_TILE and 0 <= cy < CELLS_PER_TILE
+        cells.append(cy * CELLS_PER_TILE + cx if inside else -1)
+    return cells
+
+
+def cluster_rows(rows, zoom, x, y):
+    """Pure-Python grid binning, the fallback when NumPy is not installed"""
+    groups = {}
+    for row, cell in zip(rows, bin_rows(rows, zoom, x, y)):
+        if cell >= 0:
+            groups.setdefault(cell, []).append(row)
+
+    clusters, markers = [], []
+    for cell in sorted(groups):
+        members = groups[cell]
+        if len(members) == 1:
+            pk, lat, lng, featured = members[0]
+            markers.append(marker(pk, lat, lng, featured))
+            continue
+        lats = [row[1] for row in members]
+        lngs = [row[2] for row in members]
+        clusters.append(cluster(
+            len(members), sum(lats) / len(lats), sum(lngs) / len(lngs),
+            (min(lats), min(lngs), max(lats), max(lngs)),
+        ))
+    return clusters, markers
+
+
+def cluster_rows_numpy(rows, zoom, x, y):
+    """Vectorised grid binning of the tile rows"""
+    data = np.array([(pk, lat, lng, featured) for pk, lat, lng, featured in rows], dtype=np.float64)
+    ids, lats, lngs, featured = data.T
+    scale = 2 ** zoom * CELLS_PER_TILE
+    sin_lat = np.sin(np.radians(np.clip(lats, -MAX_LATITUDE, MAX_LATITUDE)))
+    cx = np.floor((lngs + 180.0) / 360.0 * scale).astype(np.int64) - x * CELLS_PER_TILE
+    cy = np.floor((0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale).astype(np.int64) - y * CELLS_PER_TILE
+
+    # Rows on the far edge of the bbox query can fall in the neighbouring tile
+    inside = (cx >= 0) & (cx < CELLS_PER_TILE) & (cy >= 0) & (cy < CELLS_PER_TILE)
+    cells = (cy * CELLS_PER_TILE + cx)[inside]
+    ids, lats, lngs, featured = ids[inside], lats[inside], lngs[inside], featured[inside]
+
+    size = CELLS_PER_TILE ** 2
+    counts = np.bincount(cells, minlength=size)
+    lat_sums = np.bincount(cells, weights=lats, minlength=size)
+    lng_sums = np.bincount(cells, weights=lngs, minlength=size)
+    # For a cell holding a single listing the sums are that listing's values
+    id_sums = np.bincount(cells, weights=ids, minlength=size)
+    featured_sums = np.bincount(cells, weights=featured, minlength=size)
+    bounds = np.empty((4, size))
+    bounds[:2] = np.inf
+    bounds[2:] = -np.inf
+    np.minimum.at(bounds[0], cells, lats)
+    np.minimum.at(bounds[1], cells, lngs)
+    np.maximum.at(bounds[2], cells, lats)
+    np.maximum.at(bounds[3], cells, lngs)
+
+    clusters, markers = [], []
+    for cell in np.flatnonzero(counts):
+        count = int(counts[cell])
+        if count == 1:
+            markers.append(marker(int(id_sums[cell]), lat_sums[cell], lng_sums[cell], featured_sums[cell]))
+        else:
+            clusters.append(cluster(
+                count, lat_sums[cell] / count, lng_sums[cell] / count,
+                tuple(float(value) for value in bounds[:, cell]),
+            ))
+    return clusters, markers
+
+
+def cluster(count, lat, lng, bounds):
+    return {
+        'count': count,
+        'latitude': round(float(lat), 6),
+        'longitude': round(float(lng), 6),
+        'bounds': [round(value, 6) for value in bounds],
+    }
+
+
+def marker(pk, lat, lng, featured):
+    return {
+        'id': pk,
+        'latitude': round(float(lat), 6),
+        'longitude': round(float(lng), 6),
+        'is_featured': bool(featured),
+    }
+
+
+def compute_tile(queryset, zoom, x, y):
+    rows = tile_rows(queryset, tile_bounds(zoom, x, y))
+    if zoom >= MAX_CLUSTER_ZOOM:
+        return [], [marker(*row) for row in rows]
+    if not rows:
+        return [], []
+    if np is not None:
+        return cluster_rows_numpy(rows, zoom, x, y)
+    return cluster_rows(rows, zoom, x, y)
+
+
+def invalidate():
+    """Expire every cached tile once the current transaction commits"""
+    caching.invalidate_on_commit([caching.CLUSTERS])
+
+
+def cache_key(zoom, x, y, filters):
+    digest = hashlib.md5(repr(sorted(filters.items())).encode()).hexdigest()
+    return f'listings:clusters:{zoom}:{x}:{y}:{digest}'
+
+
+def tile_clusters(queryset, zoom, x, y, filters):
+    """
+    Clusters and markers of one tile of ``queryset``. ``filters`` are the
+    parameters the queryset was built from and only key the cache.
+    """
+    def compute():
+        clusters, markers = compute_tile(queryset, zoom, x, y)
+        return {'clusters': clusters, 'markers': markers}
+
+    return caching.get_or_set(cache_key(zoom, x, y, filters), [caching.CLUSTERS], compute,
+                              CACHE_TIMEOUT, stale=True)
@@ -0,0 +1,145 @@
+# listings/delivery.py
+"""
+Delivery of media files.
+
+Django decides whether a file may be seen and how it is cached; the bytes are
+then sent by the front web server, as MEDIA_ACCEL says:
+
+    'x-accel-redirect'  nginx: the response names an internal location, e.g.
+                        location /internal/media/ { internal; alias <MEDIA_ROOT>/; }
+    'x-sendfile'        Apache mod_xsendfile / lighttpd: the response names the path
+    ''                  no such server: a FileResponse, which WSGI servers with
+                        wsgi.file_wrapper (gunicorn, uWSGI) send with os.sendfile
+
+Photos of listings that are not approved yet are only shown to their owner
+and to staff. Who may see a photo is looked up once and kept in the shared
+cache, tagged with the photo and the listings showing it (see caching.py), so
+a hit on a photo or one of its derivatives costs no query. Other media, such
+as profile pictures, need no check at all, and the web server can serve
+their directories itself, e.g.
+
+    location /media/profile_pics/ { alias <MEDIA_ROOT>/profile_pics/; expires 1d; }
+"""
+import hashlib
+import mimetypes
+import os
+import posixpath
+import urllib.parse
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import caching, images, storage
+
+# Cache-Control of media anyone may see that can change under its name (profile pictures)
+PUBLIC_CACHE_CONTROL = 'public, max-age=86400'
+# Cache-Control of photos only their owner and staff may see
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+# How long who may see a photo is cached, in seconds, if nothing invalidates it
+VIEWERS_TIMEOUT = 24 * 60 * 60
+
+
+def listing_photo_name(name):
+    """The ListingImage name behind a media name (itself or the photo of a derivative), or None"""
+    from .models import ListingImage
+
+    root = ListingImage._meta.get_field('image').upload_to.split('/')[0] + '/'
+    prefix = images.DERIVATIVES_DIR + '/'
+    if name.startswith(prefix):
+        name = name[len(prefix):]
+        return posixpath.dirname(name) if name.startswith(root) else None
+    return posixpath.splitext(name)[0] if name.startswith(root) else None
+
+
+def fetch_viewers(stem):
+    """(listing id, approved, owner id) of every listing showing the photo ``stem``"""
+    from .models import ListingImage
+
+    # The names stem + '.<extension>', as a range the image index can serve;
+    # startswith is a LIKE, which SQLite cannot serve from an index
+    names = ListingImage.objects.filter(image__gte=stem + '.', image__lt=stem + '/').order_by()
+    # A content-addressed photo may be on several
+    return [
+        (listing, approved, owner)
+        for image, listing, approved, owner in names.values_list(
+            'image', 'listing_id', 'listing__is_approved', 'listing__user_id'
+        )
+        if posixpath.splitext(image)[0] == stem
+    ]
+
+
+def photo_viewers(stem):
+    """
+    fetch_viewers(), from the shared cache when possible. The photo's and
+    every listing's tag versions are read before the query, so a change made
+    meanwhile keeps the result out of the cache; names no row has are not
+    cached at all.
+    """
+    key = 'viewers:' + hashlib.sha256(stem.encode()).hexdigest()
+    rows, fresh = caching.lookup(key)
+    if fresh:
+        return rows
+    tag = caching.photo_tag(stem)
+    before = caching.tag_versions({tag, caching.ALL_LISTINGS})
+    rows = fetch_viewers(stem)
+    if rows:
+        tags = {tag} | {caching.listing_tag(listing) for listing, _, _ in rows}
+        versions = caching.tag_versions(tags | {caching.ALL_LISTINGS})
+        if all(versions[name] == version for name, version in before.items()):
+            versions.pop(caching.ALL_LISTINGS)
+            caching.store(key, rows, versions, VIEWERS_TIMEOUT)
+    return rows
+
+
+def cache_control(request, name):
+    """
+    Cache-Control to send a media file with, after checking the request may
+    see it; raises Http404 otherwise
+    """
+    stem = listing_photo_name(name)
+    if stem is None:
+        return PUBLIC_CACHE_CONTROL
+    rows = [(approved, owner) for _, approved, owner in photo_viewers(stem)]
+    if any(approved for approved, _ in rows):
+        return storage.IMMUTABLE_CACHE_CONTROL if storage.is_content_addressed(name) else PUBLIC_CACHE_CONTROL
+    user = request.user
+    if user.is_staff or (user.is_authenticated and any(owner == user.pk for _, owner in rows)):
+        return PRIVATE_CACHE_CONTROL
+    raise Http404("No such file")
+
+
+def send_file(request, root, name, location, cache_control):
+    """
+    Response delivering the file ``name`` under the directory ``root``; the
+    web server finds it under the internal URI ``location``. Raises Http404
+    if there is no such file.
+    """
+    if any(part.startswith('.') for part in name.split('/')):
+        raise Http404("No such file")  # e.g. the quarantine of orphaned media
+    path = safe_join(root, name)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("No such file")
+    if not os.path.isfile(path):
+        raise Http404("No such file")
+
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if settings.MEDIA_ACCEL == 'x-accel-redirect':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = urllib.parse.quote(location + name.replace(os.sep, '/'))
+        elif settings.MEDIA_ACCEL == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = path
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    return response
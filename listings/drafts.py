@@ -0,0 +1,131 @@
+# listings/drafts.py
+"""
+Server-side drafts of the new listing form (ListingDraft).
+
+When a submit fails validation, its field values are stored, and each photo
+that was accepted is kept as a normalized PhotoUpload whose id fills the
+form's <slot>_upload field. The host then fixes the errors without uploading
+the photos again. A form rendered from a draft is marked data-listing-draft,
+and static/js/listing-draft.js then posts only the fields that changed, with
+PARTIAL_FLAG set; merged_data() fills in the rest from the draft.
+
+A draft may be gone by the time the form comes back: expired after
+LISTING_DRAFT_EXPIRY_DAYS, or submitted from another tab. The script asks
+first (views.listing_draft_status) and posts the whole form if so; a partial
+submit that arrives without its draft anyway is refused (is_orphaned()),
+never validated as if the fields it left out were empty.
+"""
+import os
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import QueryDict
+from django.utils import timezone
+
+from .models import ListingDraft, PhotoUpload
+
+PARTIAL_FLAG = 'partial_draft'
+
+# Never stored with a draft
+NOT_STORED = {'csrfmiddlewaretoken', PARTIAL_FLAG}
+
+
+def get(user):
+    """The draft of ``user``, unless it has expired"""
+    if not user.is_authenticated:
+        return None
+    cutoff = timezone.now() - timedelta(days=settings.LISTING_DRAFT_EXPIRY_DAYS)
+    return ListingDraft.objects.filter(user=user, updated_at__gte=cutoff).first()
+
+
+def is_orphaned(draft, post):
+    """A partial submit whose draft is gone: the fields it left out are lost"""
+    return draft is None and post.get(PARTIAL_FLAG) == '1'
+
+
+def as_querydict(draft):
+    data = QueryDict(mutable=True)
+    for name, values in draft.data.items():
+        data.setlist(name, values)
+    for slot, upload_id in draft.photos.items():
+        data[f'{slot}_upload'] = upload_id
+    return data
+
+
+def merged_data(draft, post):
+    """The data of a submit, with the fields a partial submit left out taken from ``draft``"""
+    if draft is None or post.get(PARTIAL_FLAG) != '1':
+        return post
+    data = as_querydict(draft)
+    for name in post:
+        data.setlist(name, post.getlist(name))
+    return data
+
+
+def initial(form_class, draft, **kwargs):
+    """Initial values of a new form showing ``draft``, parsed as its widgets parse posted data"""
+    if draft is None:
+        return {}
+    return parsed(form_class, as_querydict(draft), **kwargs)
+
+
+def parsed(form_class, data, **kwargs):
+    """Initial values of a new form showing posted ``data``"""
+    fields = form_class(**kwargs).fields
+    return {name: field.widget.value_from_datadict(data, {}, name)
+            for name, field in fields.items() if name in data}
+
+
+def keep_photo(user, photo, draft):
+    """A complete, normalized PhotoUpload of ``draft`` holding a copy of a normalized photo"""
+    upload = PhotoUpload(
+        user=user, filename=os.path.basename(photo.name), size=photo.size, received=photo.size,
+        completed_at=timezone.now(), normalized=True, draft=draft,
+    )
+    os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+    photo.seek(0)
+    with open(upload.path, 'wb') as file:
+        shutil.copyfileobj(photo, file)
+    upload.save()
+    return upload
+
+
+def save(form):
+    """
+    Store an invalid ListingSubmissionForm as its user's draft: the posted
+    values and the photos that passed validation. The form's <slot>_upload
+    fields are pointed at the kept photos, for rendering it again.
+    """
+    draft, _ = ListingDraft.objects.get_or_create(user=form.user)
+    photo_fields = set(form.IMAGE_SLOTS) | {f'{slot}_upload' for slot in form.IMAGE_SLOTS}
+    draft.data = {name: form.data.getlist(name) for name in form.data
+                  if name not in NOT_STORED and name not in photo_fields}
+
+    photos = {}
+    for slot, photo in form.new_photos.items():
+        upload = form.chunked_uploads.get(slot)
+        if upload is not None and upload.normalized:
+            if upload.draft_id != draft.pk:
+                upload.draft = draft
+                upload.save(update_fields=['draft', 'updated_at'])
+        else:
+            kept = keep_photo(form.user, photo, draft)
+            if upload is not None:
+                upload.delete()  # the chunked original; the normalized copy replaces it
+            upload = kept
+        photo.close()
+        photos[slot] = str(upload.pk)
+    draft.uploads.exclude(pk__in=photos.values()).delete()
+    draft.photos = photos
+    draft.save()
+
+    form.data = form.data.copy()
+    for slot in form.IMAGE_SLOTS:
+        form.data[f'{slot}_upload'] = photos.get(slot, '')
+    return draft
+
+
+def discard(user):
+    """Delete the draft of ``user`` and the photos it kept"""
+    ListingDraft.objects.filter(user=user).delete()
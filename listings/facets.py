@@ -0,0 +1,190 @@
+# listings/facets.py
+"""
+Counts of approved listings per location, property type and price band.
+
+Every approved listing contributes one to the ListingFacetCount row of each of
+its facet values (plus the catalog-wide ALL row), split by listing type. The
+rows are adjusted by deltas from the Listing signals - save, delete and the
+listings_pre_bulk_update/listings_bulk_updated pair sent by queryset.update()
+- so reading them costs a single small query.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+
+from . import caching
+
+ALL = 'all'
+LOCATION = 'location'
+PROPERTY_TYPE = 'property_type'
+PRICE_BAND = 'price_band'
+
+# Listing fields a facet key is computed from
+FACET_FIELDS = ('is_approved', 'location', 'property_type', 'listing_type', 'effective_price')
+
+# Price bands (KES) over effective_price: (value, lower bound, upper bound exclusive)
+PRICE_BANDS = (
+    ('0-3000', 0, 3000),
+    ('3000-5000', 3000, 5000),
+    ('5000-10000', 5000, 10000),
+    ('10000-20000', 10000, 20000),
+    ('20000+', 20000, None),
+)
+
+
+def price_band(price):
+    if price is None:
+        return None
+    for value, lower, upper in PRICE_BANDS:
+        if price >= lower and (upper is None or price < upper):
+            return value
+    return None
+
+
+def facet_keys(row):
+    """(facet, value, listing_type) keys a listing (dict of FACET_FIELDS) counts towards"""
+    if not row['is_approved']:
+        return []
+    listing_type = row['listing_type']
+    keys = [
+        (ALL, '', listing_type),
+        (LOCATION, row['location'], listing_type),
+        (PROPERTY_TYPE, row['property_type'], listing_type),
+    ]
+    band = price_band(row.get('effective_price'))
+    if band is not None:
+        keys.append((PRICE_BAND, band, listing_type))
+    return keys
+
+
+def listing_row(listing):
+    return {field: getattr(listing, field) for field in FACET_FIELDS}
+
+
+def stored_row(listing):
+    """Facet fields of a listing as currently stored, or None for a new listing"""
+    return (type(listing)._default_manager.filter(pk=listing.pk)
+            .values(*FACET_FIELDS).first())
+
+
+def queryset_counts(queryset):
+    """Counter of facet keys over a Listing queryset, aggregated by the database"""
+    counts = Counter()
+    # Historical models in earlier migrations may predate some of the fields
+    fields = [field for field in FACET_FIELDS
+              if any(f.name == field for f in queryset.model._meta.concrete_fields)]
+    groups = (queryset.filter(is_approved=True).order_by()
+              .values(*fields).annotate(listings=Count('pk')))
+    for group in groups:
+        for key in facet_keys(group):
+            counts[key] += group['listings']
+    return counts
+
+
+def apply(deltas):
+    """Add the non-zero deltas of a {key: delta} mapping to the stored counts"""
+    from .models import ListingFacetCount
+
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        ListingFacetCount.objects.bulk_create(
+            [ListingFacetCount(facet=facet, value=value, listing_type=listing_type)
+             for facet, value, listing_type in deltas],
+            ignore_conflicts=True,
+        )
+        matches = [(Q(facet=facet, value=value, listing_type=listing_type), delta)
+                   for (facet, value, listing_type), delta in deltas.items()]
+        condition = Q()
+        for match, delta in matches:
+            condition |= match
+        ListingFacetCount.objects.filter(condition).update(count=F('count') + Case(
+            *[When(match, then=Value(delta)) for match, delta in matches], default=Value(0),
+        ))
+    caching.invalidate_on_commit([caching.FACETS])
+
+
+def move(old_row, new_row):
+    """Move a listing's contribution from its old facet values to its new ones"""
+    deltas = Counter()
+    if old_row is not None:
+        deltas.subtract(facet_keys(old_row))
+    if new_row is not None:
+        deltas.update(facet_keys(new_row))
+    apply(deltas)
+
+
+def rebuild(queryset, ListingFacetCount=None):
+    """
+    Recount every facet from scratch, returning the number of rows stored.
+    Migrations pass their historical ListingFacetCount model.
+    """
+    if ListingFacetCount is None:
+        from .models import ListingFacetCount
+
+    counts = queryset_counts(queryset)
+    with transaction.atomic():
+        ListingFacetCount.objects.all().delete()
+        ListingFacetCount.objects.bulk_create(
+            ListingFacetCount(facet=facet, value=value, listing_type=listing_type, count=count)
+            for (facet, value, listing_type), count in counts.items()
+        )
+    caching.invalidate_on_commit([caching.FACETS])
+    return len(counts)
+
+
+class FacetCounts:
+    """All stored counts, read with one query"""
+
+    def __init__(self, rows):
+        self.rows = {(facet, value, listing_type): count for facet, value, listing_type, count in rows}
+
+    @classmethod
+    def load(cls):
+        from .models import ListingFacetCount
+
+        return cls(ListingFacetCount.objects.filter(count__gt=0)
+                   .values_list('facet', 'value', 'listing_type', 'count'))
+
+    def count(self, facet=ALL, value='', listing_type=None):
+        """Approved listings with the facet value, optionally of one listing type"""
+        return sum(count for (row_facet, row_value, row_type), count in self.rows.items()
+                   if row_facet == facet and row_value == value
+                   and (listing_type is None or row_type == listing_type))
+
+    def by_value(self, facet):
+        """{value: count} of one facet, over all listing types"""
+        counts = Counter()
+        for (row_facet, value, listing_type), count in self.rows.items():
+            if row_facet == facet:
+                counts[value] += count
+        return dict(counts)
+
+    def by_listing_type(self):
+        return {listing_type: count for (facet, value, listing_type), count in self.rows.items()
+                if facet == ALL}
+
+    def totals(self, filters):
+        """
+        (total, featured) for resolved listing filters (see views.get_filter_values),
+        or None when the combination is not covered by a single facet
+        """
+        if filters['min_price'] or filters['max_price'] or filters['amenities']:
+            return None
+        if filters['location'] and filters['property_type']:
+            return None
+        if filters['location']:
+            facet, value = LOCATION, filters['location']
+        elif filters['property_type']:
+            facet, value = PROPERTY_TYPE, filters['property_type']
+        else:
+            facet, value = ALL, ''
+
+        listing_type = filters['listing_type']
+        featured = self.count(facet, value, 'featured')
+        if listing_type:
+            total = self.count(facet, value, listing_type)
+            return total, featured if listing_type == 'featured' else 0
+        return self.count(facet, value), featured
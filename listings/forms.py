@@ -1,11 +1,28 @@
 from django import forms
-from .models import Booking, Listing
+from django.core.exceptions import ValidationError
+from .models import Booking, Listing, ListingImage
+from . import uploads
 import re
 from datetime import date
 from django.contrib.auth.models import User
 
 
+class ListingPhotoField(forms.ImageField):
+    """
+    Photo upload slot. Uploads refused while streaming fail here; decoding is
+    left to ListingSubmissionForm.clean(), which normalizes all photos at once.
+    """
+
+    def to_python(self, data):
+        if isinstance(data, uploads.RejectedUpload):
+            raise ValidationError(data.error, code='upload_limit')
+        return forms.FileField.to_python(self, data)
+
+
 class ListingSubmissionForm(forms.ModelForm):
+    # Photo upload fields, one per ListingImage position (main_image is position 0)
+    IMAGE_SLOTS = ('main_image', 'image_2', 'image_3', 'image_4', 'image_5', 'image_6', 'image_7', 'image_8')
+
     # Add listing_type field as a radio select
     listing_type = forms.ChoiceField(
         choices=Listing.LISTING_TYPE_CHOICES,
@@ -55,8 +72,7 @@ class ListingSubmissionForm(forms.ModelForm):
             'price', 'service_charge', 'deposit_required', 'utilities_included', 'title_deed', 'loan_available',
             # Availability
             'available_from', 'available_to', 'minimum_stay', 'maximum_stay',
-            # Media
-            'main_image', 'image_2', 'image_3', 'image_4', 'image_5', 'image_6', 'image_7', 'image_8',
+            # Media (photos are the IMAGE_SLOTS fields below)
             'virtual_tour_url', 'youtube_video_id',
             # Map
             'latitude', 'longitude',
@@ -168,16 +184,6 @@ class ListingSubmissionForm(forms.ModelForm):
             'minimum_stay': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'value': 1}),
             'maximum_stay': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'value': 365}),
 
-            # Media
-            'main_image': forms.FileInput(attrs={'class': 'form-control', 'required': True}),
-            'image_2': forms.FileInput(attrs={'class': 'form-control'}),
-            'image_3': forms.FileInput(attrs={'class': 'form-control'}),
-            'image_4': forms.FileInput(attrs={'class': 'form-control'}),
-            'image_5': forms.FileInput(attrs={'class': 'form-control'}),
-            'image_6': forms.FileInput(attrs={'class': 'form-control'}),
-            'image_7': forms.FileInput(attrs={'class': 'form-control'}),
-            'image_8': forms.FileInput(attrs={'class': 'form-control'}),
-
             # Virtual tour
             'virtual_tour_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'https://...'}),
             'youtube_video_id': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., dQw4w9WgXcQ'}),
@@ -209,6 +215,17 @@ class ListingSubmissionForm(forms.ModelForm):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
 
+        # Photos are ListingImage rows; an existing photo is the slot's initial value
+        slots = self.instance.image_slots if self.instance.pk else [None] * len(self.IMAGE_SLOTS)
+        for name, image in zip(self.IMAGE_SLOTS, slots):
+            self.fields[name] = ListingPhotoField(
+                required=False,
+                initial=image.image if image else None,
+                widget=forms.FileInput(attrs={'class': 'form-control'}),
+            )
+            # Or the id of a photo uploaded in chunks ahead of the submit (see listings/uploads.py)
+            self.fields[f'{name}_upload'] = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
         # Mark required fields
         required_fields = [
             'title', 'property_type', 'transaction_type', 'location', 'specific_location',
@@ -223,6 +240,10 @@ class ListingSubmissionForm(forms.ModelForm):
                     self.fields[field_name].label = field_name.replace('_', ' ').title()
                 self.fields[field_name].widget.attrs['required'] = True
 
+        for name in self.IMAGE_SLOTS:
+            if self.data.get(f'{name}_upload'):
+                self.fields[name].required = False
+
         # Pre-fill contact info from user profile
         if self.user and hasattr(self.user, 'profile'):
             profile = self.user.profile
@@ -273,6 +294,30 @@ class ListingSubmissionForm(forms.ModelForm):
             self.save_m2m()
         return instance
 
+    def _save_m2m(self):
+        # Runs from save() and from save_m2m() after save(commit=False), once the listing has a pk
+        super()._save_m2m()
+        self.save_images()
+
+    def save_images(self):
+        """Store new uploads in their slots and delete the photos marked for deletion"""
+        slots = self.instance.image_slots
+        for position, name in enumerate(self.IMAGE_SLOTS):
+            image = slots[position]
+            if name in self.new_photos:
+                photo = self.new_photos[name]
+                if image is None:
+                    ListingImage.objects.create(listing=self.instance, position=position, image=photo)
+                else:
+                    image.replace_image(photo)
+                # Normalized photos aren't in request.FILES, which Django closes itself
+                photo.close()
+            elif image is not None and self.data.get(f'delete_{name}') == 'true':
+                # Its file is collected once nothing refers to it (see listings/storage.py)
+                image.delete()
+        for upload in self.chunked_uploads.values():
+            upload.delete()
+
     def clean(self):
         cleaned_data = super().clean()
         transaction_type = cleaned_data.get('transaction_type')
@@ -287,6 +332,32 @@ class ListingSubmissionForm(forms.ModelForm):
             elif transaction_type == 'sale' and price < 500000:
                 self.add_error('price', 'Sale price should be at least KES 500,000')
 
+        # Photos uploaded in chunks or kept by a draft; a file posted with the form takes precedence
+        self.chunked_uploads = {}
+        self.new_photos = {}
+        photos = {name: cleaned_data[name] for name in self.IMAGE_SLOTS
+                  if name in self.changed_data and cleaned_data.get(name)}
+        for name in self.IMAGE_SLOTS:
+            upload_id = cleaned_data.get(f'{name}_upload')
+            if upload_id and name not in photos and name not in self.errors:
+                try:
+                    photo = uploads.completed_file(self.user, upload_id)
+                except ValidationError as error:
+                    self.add_error(name, error)
+                    continue
+                self.chunked_uploads[name] = photo.upload
+                if photo.upload.normalized:
+                    cleaned_data[name] = self.new_photos[name] = photo
+                else:
+                    photos[name] = photo
+
+        # Verify and normalize the new photos together, in the shared worker pool
+        for name, result in uploads.normalize_all(photos).items():
+            if isinstance(result, ValidationError):
+                self.add_error(name, result)
+            else:
+                cleaned_data[name] = self.new_photos[name] = result
+
         return cleaned_data
 
     def clean_price(self):
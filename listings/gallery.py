@@ -0,0 +1,80 @@
+# listings/gallery.py
+"""
+Galleries and modal details of listing cards, as JSON.
+
+The listing grid renders each card with its cover photo only; when a card's
+gallery or the photo modal is opened, the page fetches the rest from
+GET /api/listings/<id>/gallery/, or for several cards at once from
+GET /api/listings/gallery/?ids=1,2,3. Either way it costs two queries: the
+listings' modal fields and their photos.
+"""
+from django.urls import reverse
+
+from .models import Listing, ListingImage
+
+# Listings one batched request may ask for (a page of the grid)
+MAX_BATCH = 99
+
+# How long browsers and proxies may reuse a gallery, in seconds
+MAX_AGE = 300
+
+# Listing columns the modal shows
+FIELDS = ('id', 'slug', 'title', 'description', 'location', 'specific_location', 'property_type',
+          'price_per_night', 'guests', 'bedrooms', 'bathrooms')
+
+
+def parse_ids(value):
+    """Listing ids of a comma-separated ids parameter, in order and without repeats; ValueError if malformed"""
+    ids = []
+    for part in value.split(','):
+        pk = int(part)
+        if pk <= 0:
+            raise ValueError(part)
+        if pk not in ids:
+            ids.append(pk)
+    if len(ids) > MAX_BATCH:
+        raise ValueError(f"at most {MAX_BATCH} ids")
+    return ids
+
+
+def photo(image):
+    """The URLs the page shows a ListingImage with"""
+    return {
+        'thumb': image.variant_url('thumb'),
+        'src': image.variant_url('card'),
+        'srcset': image.srcset(),
+        'srcset_webp': image.srcset('webp'),
+        'detail': image.variant_url('detail'),
+        'color': image.dominant_color,
+    }
+
+
+def galleries(ids):
+    """Gallery of each approved listing in ``ids``, in the order of ``ids``"""
+    rows = {row['id']: row for row in Listing.objects.filter(pk__in=ids, is_approved=True).values(*FIELDS)}
+    photos = {}
+    for image in ListingImage.objects.filter(listing_id__in=list(rows)):
+        photos.setdefault(image.listing_id, []).append(photo(image))
+
+    locations = dict(Listing.LOCATIONS)
+    property_types = dict(Listing.PROPERTY_TYPES)
+    results = []
+    for pk in ids:
+        row = rows.get(pk)
+        if row is None:
+            continue
+        results.append({
+            'id': pk,
+            'url': reverse('listing_detail', kwargs={'slug': row['slug']}),
+            'title': row['title'],
+            'description': row['description'],
+            'location': locations.get(row['location'], row['location']),
+            'specific_location': row['specific_location'],
+            'property_type': property_types.get(row['property_type'], row['property_type']),
+            'price': str(row['price_per_night']) if row['price_per_night'] is not None else None,
+            'guests': row['guests'],
+            'bedrooms': row['bedrooms'],
+            'bathrooms': row['bathrooms'],
+            'images': photos.get(pk, []),
+        })
+    return results
@@ -0,0 +1,184 @@
+# listings/geo.py
+"""
+Radius and bounding-box search over listing coordinates.
+
+On SQLite the coordinates are mirrored into an R*Tree table kept up to date
+by the Listing save/delete signals, and by the bulk signals of bulk_create()
+and queryset.update() once they commit; other databases use the (latitude,
+longitude) index. Nearest-first results are found by querying boxes of
+growing size around the point, so each query only refines (haversine) the
+rows near the page being requested instead of the whole catalog.
+"""
+import math
+
+from django.db import connection, transaction, OperationalError
+from django.db.models.expressions import RawSQL
+
+RTREE_TABLE = 'listings_listing_rtree'
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+# Listing fields the R*Tree entries are made of
+INDEXED_FIELDS = frozenset({'latitude', 'longitude'})
+
+# First ring searched around a point; doubled until the page is full
+INITIAL_RADIUS_KM = 0.25
+
+_rtree_available = None
+
+
+def rtree_available():
+    """Whether the R*Tree table exists on the default database"""
+    global _rtree_available
+    if _rtree_available is None:
+        _rtree_available = (
+            connection.vendor == 'sqlite'
+            and RTREE_TABLE in connection.introspection.table_names()
+        )
+    return _rtree_available
+
+
+def create_index(schema_editor):
+    """Create the R*Tree table; a no-op where R*Tree is not available"""
+    global _rtree_available
+    _rtree_available = None
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} "
+            f"USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+        )
+    except OperationalError:
+        # SQLite compiled without R*Tree - the btree index is used instead
+        return False
+    return True
+
+
+def drop_index(schema_editor):
+    global _rtree_available
+    _rtree_available = None
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {RTREE_TABLE}")
+
+
+def index_listings(listings):
+    """Insert or replace the R*Tree entries of the given listings"""
+    if not rtree_available():
+        return
+    located, missing = [], []
+    for listing in listings:
+        if listing.latitude is None or listing.longitude is None:
+            missing.append((listing.pk,))
+        else:
+            lat, lng = float(listing.latitude), float(listing.longitude)
+            located.append((listing.pk, lat, lat, lng, lng))
+    with connection.cursor() as cursor:
+        if missing:
+            cursor.executemany(f"DELETE FROM {RTREE_TABLE} WHERE id = %s", missing)
+        if located:
+            cursor.executemany(f"INSERT OR REPLACE INTO {RTREE_TABLE} VALUES (%s, %s, %s, %s, %s)", located)
+
+
+def unindex_listing(pk):
+    if not rtree_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {RTREE_TABLE} WHERE id = %s", [pk])
+
+
+def rebuild_index(queryset, batch_size=1000):
+    """Re-index the coordinates of every listing in the queryset"""
+    if not rtree_available():
+        return 0
+    count = 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {RTREE_TABLE}")
+        batch = []
+        for listing in queryset.only('pk', 'latitude', 'longitude').iterator(chunk_size=batch_size):
+            batch.append(listing)
+            if len(batch) >= batch_size:
+                index_listings(batch)
+                count += len(batch)
+                batch = []
+        index_listings(batch)
+    return count + len(batch)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_around(lat, lng, radius_km):
+    """(south, west, north, east) box containing every point within radius_km"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def intersect(box, other):
+    if other is None:
+        return box
+    south, west = max(box[0], other[0]), max(box[1], other[1])
+    north, east = min(box[2], other[2]), min(box[3], other[3])
+    if south > north or west > east:
+        return None
+    return south, west, north, east
+
+
+def within_bbox(queryset, south, west, north, east):
+    """Restrict a Listing queryset to a bounding box through the spatial index"""
+    if rtree_available():
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT id FROM {RTREE_TABLE} "
+            f"WHERE max_lat >= %s AND min_lat <= %s AND max_lng >= %s AND min_lng <= %s",
+            (south, north, west, east),
+        ))
+    return queryset.filter(latitude__range=(south, north), longitude__range=(west, east))
+
+
+def located_rows(queryset, box):
+    """(pk, lat, lng) of the listings inside box, with the exact bounds applied"""
+    south, west, north, east = box
+    rows = within_bbox(queryset, *box).order_by().values_list('pk', 'latitude', 'longitude')
+    # R*Tree coordinates are 32-bit floats rounded outwards; re-check exactly
+    return [
+        (pk, float(lat), float(lng)) for pk, lat, lng in rows
+        if lat is not None and lng is not None
+        and south <= lat <= north and west <= lng <= east
+    ]
+
+
+def nearest(queryset, lat, lng, count, max_radius_km, bbox=None):
+    """
+    Up to ``count`` (pk, distance_km) pairs nearest to (lat, lng), closest first,
+    within max_radius_km and, if given, inside bbox (south, west, north, east).
+    """
+    radius = min(INITIAL_RADIUS_KM, max_radius_km)
+    while True:
+        box = intersect(bbox_around(lat, lng, radius), bbox)
+        hits = []
+        if box is not None:
+            for pk, row_lat, row_lng in located_rows(queryset, box):
+                distance = haversine_km(lat, lng, row_lat, row_lng)
+                if distance <= radius:
+                    hits.append((distance, pk))
+        # Everything within `radius` is inside the box, so once the ring holds
+        # `count` hits the nearest `count` overall are among them
+        if len(hits) >= count or radius >= max_radius_km:
+            break
+        radius = min(radius * 2, max_radius_km)
+    hits.sort()
+    return [(pk, distance) for distance, pk in hits[:count]]
+
+
+def bbox_max_radius_km(lat, lng, bbox):
+    """Distance from (lat, lng) to the farthest corner of bbox"""
+    south, west, north, east = bbox
+    return max(haversine_km(lat, lng, corner_lat, corner_lng)
+               for corner_lat in (south, north) for corner_lng in (west, east))
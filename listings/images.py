@@ -0,0 +1,156 @@
+# listings/images.py
+"""
+Resized derivatives of listing photos.
+
+Every uploaded image gets a thumbnail, a card-size and a detail-size variant,
+each in WebP and JPEG, stored next to each other under derivatives/ with
+names derived from the original's, e.g.
+
+    listings/main/villa.jpg -> derivatives/listings/main/villa/card.webp
+
+and recorded on the ListingImage row along with the original's size and
+dominant colour. The variants are made after an upload is committed (see
+signals.py) in a pool of IMAGE_DERIVATIVE_WORKERS threads of their own, so a
+burst of new photos never holds up the uploads normalized while a request
+waits (uploads.executor()), and for existing media by the
+generate_image_derivatives command.
+"""
+import io
+import posixpath
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import ExifTags, Image, ImageOps
+
+DERIVATIVES_DIR = 'derivatives'
+
+# Variant name: width in pixels (never upscaled)
+VARIANTS = {
+    'thumb': 320,
+    'card': 640,
+    'detail': 1280,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# sizes attribute for each place a listing photo is shown
+SIZES = {
+    'thumb': '80px',
+    'card': '(max-width: 576px) 100vw, (max-width: 992px) 50vw, 33vw',
+    'detail': '(max-width: 992px) 100vw, 66vw',
+}
+
+# Result of generate_derivatives(); derivatives maps 'card.webp' style specs to storage names
+ImageInfo = namedtuple('ImageInfo', 'width height dominant_color derivatives written')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def derivative_name(name, variant, extension='jpg'):
+    """Storage name of one variant of the image stored as ``name``"""
+    stem = posixpath.splitext(name)[0]
+    return f'{DERIVATIVES_DIR}/{stem}/{variant}.{extension}'
+
+
+def derivative_names(name):
+    """{'card.webp': storage name, ...} of every variant of an image"""
+    return {f'{variant}.{extension}': derivative_name(name, variant, extension)
+            for variant in VARIANTS for extension in FORMATS}
+
+
+def srcset(derivatives, extension='jpg'):
+    """srcset attribute value listing the variants in a derivatives mapping"""
+    return ', '.join(
+        f'{default_storage.url(derivatives[spec])} {width}w'
+        for variant, width in VARIANTS.items()
+        if (spec := f'{variant}.{extension}') in derivatives
+    )
+
+
+def open_rgb(file, max_size=max(VARIANTS.values())):
+    """
+    Decode an image upright and in RGB, flattening transparency onto white,
+    at no less than max_size on each side where the format can decode smaller.
+    Returns the image and the upright (width, height) of the original.
+    """
+    image = Image.open(file)
+    width, height = image.size
+    if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+        width, height = height, width
+    # JPEG can decode straight to a fraction of its size when that still covers max_size
+    image.draft('RGB', (max_size, max_size))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background, (width, height)
+    return image.convert('RGB'), (width, height)
+
+
+def dominant_color(image):
+    """Most common colour of an RGB image as #rrggbb, the placeholder shown while it loads"""
+    small = image.copy()
+    small.thumbnail((64, 64))
+    palette = small.quantize(colors=8)
+    count, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def render_variants(original):
+    """{(variant, extension): encoded bytes} for a decoded image"""
+    rendered = {}
+    for variant, width in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+        if original.width > width:
+            height = max(1, round(original.height * width / original.width))
+            image = original.resize((width, height), Image.LANCZOS, reducing_gap=2.0)
+        else:
+            image = original
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, **options)
+            rendered[variant, extension] = buffer.getvalue()
+    return rendered
+
+
+def save_replacing(storage, name, content):
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(content))
+
+
+def generate_derivatives(name, storage=None, force=False):
+    """
+    Write every variant of the image stored as ``name`` in ``storage`` and
+    describe it. Variants go to the default storage under their fixed names;
+    those that already exist are kept unless ``force``. The original is
+    decoded either way for its size and colour.
+    """
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as file:
+        original, (width, height) = open_rgb(file)
+    derivatives = derivative_names(name)
+    written = 0
+    if force or not all(default_storage.exists(derivative) for derivative in derivatives.values()):
+        for (variant, extension), content in render_variants(original).items():
+            save_replacing(default_storage, derivative_name(name, variant, extension), content)
+            written += 1
+    return ImageInfo(width, height, dominant_color(original), derivatives, written)
+
+
+def executor():
+    """The pool that bounds how many photos are resized into derivatives at once"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                                           thread_name_prefix='image-derivatives')
+    return _executor
@@ -0,0 +1,128 @@
+# listings/keyset.py
+"""
+Keyset ("seek") pagination for the sorted listing pages.
+
+A page continues after the last row of the previous one - WHERE (key, id) >
+(last key, last id) in index order - so deep pages cost the same as the
+first and nothing is counted. Featured listings stay pinned to the top: the
+featured and the free listings are read as separate segments (is_featured =
+true, then false), each walking an (is_featured, key, id) index. Sorts that
+rank a flag first (verified_first) split the segments further. The position is
+handed to the client as an opaque cursor, signed so that only positions the
+site handed out are accepted (and cached, see pagecache.py).
+"""
+import base64
+import binascii
+import itertools
+import json
+from collections import namedtuple
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import Listing
+
+# column: the key walked within a segment; flags: boolean columns ranked
+# true-first ahead of it, after is_featured
+Sort = namedtuple('Sort', 'label column descending flags', defaults=((),))
+
+SORTS = {
+    'newest': Sort('Newest', 'created_at', True),
+    'price_asc': Sort('Price: low to high', 'effective_price', False),
+    'price_desc': Sort('Price: high to low', 'effective_price', True),
+    'most_viewed': Sort('Most viewed', 'views_count', True),
+    'verified_first': Sort('Verified first', 'created_at', True, flags=('is_verified',)),
+}
+
+
+class KeysetPage:
+    """One page of rows and the cursor of the next page (None on the last)"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def segment_fields(sort):
+    return ('is_featured', *SORTS[sort].flags)
+
+
+def cursor_signer(sort):
+    return signing.Signer(salt=f'listings.keyset.{sort}')
+
+
+def encode_cursor(sort, segment, value, pk):
+    data = json.dumps([list(segment), None if value is None else str(value), pk], separators=(',', ':'))
+    return cursor_signer(sort).sign(base64.urlsafe_b64encode(data.encode()).decode().rstrip('='))
+
+
+def decode_cursor(cursor, sort):
+    """(segment, value, pk) of a cursor, or None when it is missing, malformed or not ours"""
+    if not cursor:
+        return None
+    field = Listing._meta.get_field(SORTS[sort].column)
+    try:
+        cursor = cursor_signer(sort).unsign(cursor)
+        segment, value, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        segment = tuple(bool(flag) for flag in segment)
+        if len(segment) != len(segment_fields(sort)):
+            return None
+        return segment, field.to_python(value), int(pk)
+    except (signing.BadSignature, binascii.Error, UnicodeDecodeError, ValueError, TypeError, ValidationError):
+        return None
+
+
+def after(queryset, column, descending, value, pk):
+    """Rows following (value, pk) in (column, id) order"""
+    op = 'lt' if descending else 'gt'
+    # The first condition alone is an index range; the second drops the ties already shown
+    return queryset.filter(**{f'{column}__{op}e': value}).filter(
+        Q(**{f'{column}__{op}': value}) | Q(**{f'pk__{op}': pk})
+    )
+
+
+def paginate(queryset, sort, cursor=None, per_page=99):
+    """
+    KeysetPage of ListingCard rows of a Listing queryset in ``sort`` order,
+    starting after ``cursor``. Listings without a value for the sort column
+    (price on request) are left out, as they are by price filters.
+    """
+    column, descending = SORTS[sort].column, SORTS[sort].descending
+    order = (f'-{column}', '-id') if descending else (column, 'id')
+    fields = segment_fields(sort)
+    queryset = queryset.filter(**{f'{column}__isnull': False})
+    position = decode_cursor(cursor, sort)
+
+    rows = []
+    # Segments in display order: (True, True), (True, False), (False, True), ...
+    for segment in itertools.product((True, False), repeat=len(fields)):
+        if position is not None and segment > position[0]:
+            continue  # shown on earlier pages (display order is descending tuple order)
+        # __in rather than exact: SQLite renders boolean equality as "col" / NOT "col",
+        # which cannot be matched against the leading columns of the index
+        segment_rows = queryset.filter(**{f'{field}__in': [flag] for field, flag in zip(fields, segment)})
+        if position is not None and segment == position[0]:
+            segment_rows = after(segment_rows, column, descending, position[1], position[2])
+        rows += segment_rows.order_by(*order).cards()[:per_page + 1 - len(rows)]
+        if len(rows) > per_page:
+            break
+
+    if len(rows) <= per_page:
+        return KeysetPage(rows, None)
+    rows = rows[:per_page]
+    last = rows[-1]
+    segment = tuple(getattr(last, field) for field in fields)
+    return KeysetPage(rows, encode_cursor(sort, segment, getattr(last, column), last.id))
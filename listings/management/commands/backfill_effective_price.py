@@ -0,0 +1,27 @@
+# listings/management/commands/backfill_effective_price.py
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from listings.models import Listing, effective_price_expression
+
+
+class Command(BaseCommand):
+    help = "Recompute the effective price column of every listing from its transaction type and prices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Listings updated per statement (default 5000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Listing.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            self.stdout.write('No listings.')
+            return
+
+        updated = 0
+        # pk ranges keep each UPDATE short on a live database
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            updated += Listing.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(
+                effective_price=effective_price_expression()
+            )
+        self.stdout.write(self.style.SUCCESS(f'Updated the effective price of {updated} listing(s).'))
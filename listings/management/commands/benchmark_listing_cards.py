@@ -0,0 +1,83 @@
+# listings/management/commands/benchmark_listing_cards.py
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from listings.models import Listing, ListingCard
+
+
+class Command(BaseCommand):
+    help = "Compare bytes fetched and render time per listing page: full Listing rows vs card projection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=99, help='Listings per page (default 99)')
+        parser.add_argument('--pages', type=int, default=3, help='Number of pages to measure (default 3)')
+        parser.add_argument('--seed', type=int, default=1, help='Shuffle seed (default 1)')
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        pages = options['pages']
+        queryset = Listing.objects.approved().shuffled(options['seed'])
+
+        if not queryset.exists():
+            raise CommandError('No approved listings to benchmark.')
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        all_fields = [field.attname for field in Listing._meta.concrete_fields]
+        variants = [
+            ('full rows', lambda page: page, all_fields),
+            ('card rows', lambda page: page.cards(), list(ListingCard.FIELDS)),
+        ]
+
+        # Warm the template loader so the first measured page isn't penalised
+        render_to_string('listings/listings.html', {'listings': [], 'selected_location': 'all'}, request=request)
+
+        self.stdout.write(f'{"variant":<10} {"page":>4} {"rows":>5} {"bytes":>10} {"query ms":>9} {"render ms":>10}')
+        totals = {}
+        for name, project, fields in variants:
+            total_bytes = total_query = total_render = 0.0
+            for page in range(pages):
+                page_qs = queryset[page * page_size:(page + 1) * page_size]
+
+                start = time.perf_counter()
+                rows = list(project(page_qs))
+                query_ms = (time.perf_counter() - start) * 1000
+                if not rows:
+                    break
+
+                fetched = self.payload_bytes(page_qs.values_list(*fields))
+
+                start = time.perf_counter()
+                render_to_string('listings/listings.html',
+                                 {'listings': rows, 'selected_location': 'all'},
+                                 request=request)
+                render_ms = (time.perf_counter() - start) * 1000
+
+                total_bytes += fetched
+                total_query += query_ms
+                total_render += render_ms
+                self.stdout.write(f'{name:<10} {page + 1:>4} {len(rows):>5} {fetched:>10} '
+                                  f'{query_ms:>9.2f} {render_ms:>10.2f}')
+            totals[name] = (total_bytes, total_query, total_render)
+
+        full, cards = totals['full rows'], totals['card rows']
+        if full[0]:
+            self.stdout.write(self.style.SUCCESS(
+                f'Card projection fetches {cards[0] / full[0]:.0%} of the bytes; '
+                f'query {full[1]:.1f} -> {cards[1]:.1f} ms, render {full[2]:.1f} -> {cards[2]:.1f} ms'
+            ))
+
+    @staticmethod
+    def payload_bytes(rows):
+        """Approximate size of the values returned by the database"""
+        total = 0
+        for row in rows:
+            for value in row:
+                if value is not None:
+                    total += len(str(value).encode())
+        return total
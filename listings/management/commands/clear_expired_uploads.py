@@ -0,0 +1,50 @@
+# listings/management/commands/clear_expired_uploads.py
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from listings.models import ListingDraft, PhotoUpload
+
+
+class Command(BaseCommand):
+    help = ("Delete chunked photo uploads untouched for CHUNKED_UPLOAD_EXPIRY_HOURS and listing drafts "
+            "untouched for LISTING_DRAFT_EXPIRY_DAYS, with their files. "
+            "Meant to run hourly, e.g. from cron: 0 * * * * python manage.py clear_expired_uploads")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = now - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+        # Deleting a PhotoUpload deletes its file (see listings/signals.py); a draft takes its photos along
+        deleted = PhotoUpload.objects.filter(draft__isnull=True, updated_at__lt=cutoff).delete()[1]
+        uploads = deleted.get(PhotoUpload._meta.label, 0)
+        deleted = ListingDraft.objects.filter(
+            updated_at__lt=now - timedelta(days=settings.LISTING_DRAFT_EXPIRY_DAYS)
+        ).delete()[1]
+        expired_drafts = deleted.get(ListingDraft._meta.label, 0)
+        uploads += deleted.get(PhotoUpload._meta.label, 0)
+
+        # Files whose row is gone without them, e.g. after a crash
+        stale = {}
+        try:
+            with os.scandir(settings.CHUNKED_UPLOAD_DIR) as entries:
+                for entry in entries:
+                    stem, extension = os.path.splitext(entry.name)
+                    if extension == '.part' and entry.stat().st_mtime < cutoff.timestamp():
+                        try:
+                            stale[uuid.UUID(stem)] = entry.path
+                        except ValueError:
+                            continue
+        except FileNotFoundError:
+            pass
+        for pk in PhotoUpload.objects.filter(pk__in=list(stale)).values_list('pk', flat=True):
+            del stale[pk]
+        for path in stale.values():
+            os.remove(path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {expired_drafts} draft(s), {uploads} upload(s) and {len(stale)} stray file(s).'
+        ))
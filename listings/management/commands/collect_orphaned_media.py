@@ -0,0 +1,74 @@
+# listings/management/commands/collect_orphaned_media.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from listings import orphans
+
+
+class Command(BaseCommand):
+    help = ("Quarantine media files no listing photo or profile picture refers to, and purge "
+            "those quarantined long enough ago. Meant to run daily, e.g. from cron: "
+            "15 3 * * * python manage.py collect_orphaned_media")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be quarantined, restored and purged without moving anything')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Media directory to walk, relative to MEDIA_ROOT (repeatable; '
+                                 'default: every upload directory and the derivatives)')
+        parser.add_argument('--min-age', type=float, default=24,
+                            help='Hours since a file was written before it can be an orphan (default 24)')
+        parser.add_argument('--quarantine-days', type=float, default=7,
+                            help='Days orphans stay in quarantine before they are purged (default 7)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Threads listing directories')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Orphans checked against the database and moved at once')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        now = timezone.now()
+        references = orphans.References()
+        self.stdout.write(f'{len(references.names)} referenced file(s).')
+
+        # Before quarantining, so this run's batch is neither restored nor purged by itself
+        deleted, restored = orphans.purge(
+            references, now - timedelta(days=options['quarantine_days']), dry_run=dry_run
+        )
+
+        batch = now.strftime(orphans.QUARANTINE_STAMP)
+        found = quarantined = size = 0
+        pending = []
+        for orphan in orphans.find_orphans(references, roots=options['paths'],
+                                           min_age=timedelta(hours=options['min_age']),
+                                           workers=options['workers']):
+            found += 1
+            size += orphan.size
+            if dry_run:
+                self.stdout.write(orphan.name)
+                continue
+            pending.append(orphan.name)
+            if len(pending) >= options['batch_size']:
+                quarantined += self.quarantine(pending, batch)
+                pending = []
+        if pending:
+            quarantined += self.quarantine(pending, batch)
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'Would quarantine {found} orphaned file(s) ({filesizeformat(size)}), '
+                f'purge {deleted} and restore {restored}.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Quarantined {quarantined} orphaned file(s) ({filesizeformat(size)}) '
+                f'in {orphans.QUARANTINE_DIR}/{batch}; purged {deleted}, restored {restored}.'
+            ))
+
+    def quarantine(self, names, batch):
+        # Referenced since the scan began
+        names = set(names) - orphans.still_referenced(names)
+        return orphans.quarantine(sorted(names), batch)
@@ -0,0 +1,60 @@
+# listings/management/commands/content_address_photos.py
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from listings import storage
+from listings.models import ListingImage
+
+
+class Command(BaseCommand):
+    help = ("Move listing photos still stored under their upload names into content-addressed "
+            "storage, keeping one copy of each distinct image")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many files would be merged without changing anything')
+
+    def handle(self, *args, **options):
+        photo_storage = storage.photo_storage()
+        names = sorted({name for name in ListingImage.objects.values_list('image', flat=True)
+                        if name and not storage.is_content_addressed(name)})
+        self.stdout.write(f'{len(names)} photo file(s) stored under upload names.')
+
+        targets = set()
+        size_before = size_after = moved = missing = 0
+        for name in names:
+            if not photo_storage.exists(name):
+                missing += 1
+                self.stderr.write(f'{name}: file is missing')
+                continue
+            size = photo_storage.size(name)
+            with photo_storage.open(name, 'rb') as file:
+                if options['dry_run']:
+                    target = storage.content_addressed_name(name, File(file, name))
+                else:
+                    target = photo_storage.save(name, File(file, name))
+            size_before += size
+            if target not in targets and not (options['dry_run'] and photo_storage.exists(target)):
+                size_after += size
+            targets.add(target)
+            if options['dry_run']:
+                continue
+
+            with transaction.atomic():
+                # Same bytes, new name: the variants are regenerated (or found) under it
+                count = ListingImage.objects.filter(image=name).update(image=target, derivatives={})
+                storage.acquire([target] * count)
+                # The old file and its variants are deleted once the commit is done
+                storage.release([name] * count)
+            moved += 1
+
+        verb = 'would take' if options['dry_run'] else 'now take'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names) - missing} file(s) ({size_before:,} bytes) {verb} '
+            f'{len(targets)} file(s) ({size_after:,} bytes).'
+        ))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{missing} file(s) are missing.'))
+        if moved:
+            self.stdout.write('Run generate_image_derivatives to restore the resized variants.')
@@ -0,0 +1,117 @@
+# listings/management/commands/explain_listing_queries.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.test import RequestFactory
+
+from listings import geo, keyset
+from listings.models import Listing, ListingFacetCount, ListingImage
+from listings.views import get_filtered_listings
+
+
+class Command(BaseCommand):
+    help = "Print EXPLAIN output for each public listing query and flag full scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location', default='kilimani', help='Location code to explain with')
+        parser.add_argument('--property-type', default='one_bedroom_staycation',
+                            help='Property type code to explain with')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Run EXPLAIN ANALYZE (PostgreSQL only)')
+
+    def get_queries(self, location, property_type):
+        """(label, queryset) pairs of the queries the public pages and sitemaps run"""
+        factory = RequestFactory()
+
+        def filtered(**params):
+            kwargs = {key: params.pop(key) for key in ('location', 'property_type') if key in params}
+            return get_filtered_listings(factory.get('/', params), **kwargs)
+
+        def ids(queryset):
+            # The shuffled ids of the filters, read once per seed (results.py)
+            return queryset.shuffled(1).values_list('pk', 'listing_type')
+
+        def count(queryset):
+            # COUNT(*) takes the same access path as selecting the ids
+            return queryset.order_by().values('pk')
+
+        approved = Listing.objects.approved()
+        sample = approved.values_list('slug', flat=True).first() or 'sample-slug'
+        sample_ids = list(approved.values_list('pk', flat=True)[:99]) or [0]
+        cover = ListingImage.objects.filter(listing_id=OuterRef('listing_id')).order_by('position', 'id')
+
+        return [
+            # Counts of single facets come from the facet table (facets.py)
+            ('facet counts', ListingFacetCount.objects.filter(count__gt=0)
+             .values_list('facet', 'value', 'listing_type', 'count')),
+            ('home: ids', ids(approved)),
+            ('location: ids', ids(filtered(location=location))),
+            ('property type: ids', ids(filtered(property_type=property_type))),
+            ('listing type filter: ids', ids(filtered(listing_type='featured'))),
+            ('property type + location: ids', ids(filtered(property_type=property_type, location=location))),
+            ('price range: ids', ids(filtered(min_price='2000', max_price='8000'))),
+            ('amenity filter: ids', ids(filtered(amenities='wifi,pool,generator'))),
+            # A page's cards are then fetched by primary key
+            ('shuffled: page', approved.filter(pk__in=sample_ids).order_by().cards()),
+            ('card cover photos', ListingImage.objects.filter(
+                listing_id__in=sample_ids, pk=Subquery(cover.values('pk')[:1]))),
+            *[(f'sort {sort}: free segment', self.sort_segment(approved, spec)) for sort, spec in keyset.SORTS.items()],
+            ('search: listing types', approved.filter(pk__in=sample_ids).values_list('pk', 'listing_type')),
+            ('search: page', Listing.objects.filter(pk__in=sample_ids).order_by().cards()),
+            ('gallery: photos', ListingImage.objects.filter(listing_id__in=sample_ids)),
+            ('geo: bounding box', geo.within_bbox(approved, -1.30, 36.78, -1.27, 36.82).order_by()
+             .values_list('pk', 'latitude', 'longitude')),
+            ('listing detail', approved.filter(slug=sample)),
+            ('sitemap: listings', approved.order_by('-created_at')),
+            ('sitemap: location lastmod', approved.filter(location=location).order_by('-updated_at')[:1]),
+            ('sitemap: location priority', count(approved.filter(location=location))),
+            ('sitemap: property type lastmod',
+             approved.filter(property_type=property_type).order_by('-updated_at')[:1]),
+            ('sitemap: listing type lastmod', approved.filter(listing_type='featured').order_by('-updated_at')[:1]),
+            ('sitemap: transaction type lastmod',
+             approved.filter(transaction_type='shortlet').order_by('-updated_at')[:1]),
+            ('my listings', Listing.objects.filter(user_id=1).order_by('-created_at')),
+        ]
+
+    @staticmethod
+    def sort_segment(queryset, spec):
+        """The query keyset.paginate() runs for the free listings of a sorted page"""
+        segment = {f'{field}__in': [False] for field in ('is_featured', *spec.flags)}
+        order = (f'-{spec.column}', '-id') if spec.descending else (spec.column, 'id')
+        return queryset.filter(**segment).order_by(*order).cards()[:100]
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options['analyze'] = True
+
+        full_scans = []
+        for label, queryset in self.get_queries(options['location'], options['property_type']):
+            plan = queryset.explain(**explain_options)
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(plan)
+            self.stdout.write('')
+            if self.is_full_scan(plan, bounded=queryset.query.high_mark is not None):
+                full_scans.append(label)
+
+        if full_scans:
+            self.stdout.write(self.style.WARNING(
+                'Full scans (every matching row of the table or index is read): ' + ', '.join(full_scans)))
+        else:
+            self.stdout.write(self.style.SUCCESS('Every query searches an index.'))
+
+    @staticmethod
+    def is_full_scan(plan, bounded):
+        """
+        Whether a plan reads a whole table or index. SQLite's SCAN walks all of
+        it, even "USING INDEX"; only a covering index under a LIMIT stops early.
+        """
+        for line in plan.splitlines():
+            # PostgreSQL
+            if 'Seq Scan' in line:
+                return True
+            # SQLite; virtual tables (R*Tree, FTS5) search their own index
+            if 'SCAN' in line and 'VIRTUAL TABLE INDEX' not in line:
+                if not (bounded and 'COVERING INDEX' in line):
+                    return True
+        return False
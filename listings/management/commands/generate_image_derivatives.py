@@ -0,0 +1,76 @@
+# listings/management/commands/generate_image_derivatives.py
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from listings import images
+from listings.models import ListingImage
+from listings.storage import photo_storage
+
+UPDATE_FIELDS = ['width', 'height', 'dominant_color', 'derivatives']
+
+
+def generate(name, force):
+    """Worker: (name, ImageInfo or None, error message)"""
+    try:
+        return name, images.generate_derivatives(name, photo_storage(), force=force), None
+    except Exception as exc:
+        return name, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = ("Generate the resized WebP/JPEG variants of listing photos and record their "
+            "size and colour, in parallel")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (default: one per CPU core)')
+        parser.add_argument('--force', action='store_true',
+                            help='Process every photo and regenerate variants that already exist '
+                                 '(by default only photos without recorded variants)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Photos saved per UPDATE batch')
+
+    def handle(self, *args, **options):
+        photos = ListingImage.objects.all()
+        if not options['force']:
+            photos = photos.filter(derivatives={})
+        # Several listings may share one stored file; process it once
+        pks_by_name = {}
+        for pk, name in photos.values_list('pk', 'image').iterator():
+            if name:
+                pks_by_name.setdefault(name, []).append(pk)
+        self.stdout.write(f'{len(pks_by_name)} image(s) to process.')
+
+        # Workers only touch storage; don't hand them the open database connection
+        connections.close_all()
+
+        written = failed = 0
+        pending = []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            futures = [pool.submit(generate, name, options['force']) for name in pks_by_name]
+            for done, future in enumerate(as_completed(futures), 1):
+                name, info, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                written += info.written
+                pending += [
+                    ListingImage(pk=pk, width=info.width, height=info.height,
+                                 dominant_color=info.dominant_color, derivatives=info.derivatives)
+                    for pk in pks_by_name[name]
+                ]
+                if len(pending) >= options['batch_size']:
+                    ListingImage.objects.bulk_update(pending, UPDATE_FIELDS)
+                    pending = []
+                if done % 500 == 0:
+                    self.stdout.write(f'{done}/{len(pks_by_name)} image(s) processed')
+        ListingImage.objects.bulk_update(pending, UPDATE_FIELDS)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} variant file(s).'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} image(s) could not be processed.'))
@@ -0,0 +1,13 @@
+# listings/management/commands/rebuild_facet_counts.py
+from django.core.management.base import BaseCommand
+
+from listings import facets
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Recount the per-location, property type and price band listing counts from scratch"
+
+    def handle(self, *args, **options):
+        count = facets.rebuild(Listing.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} facet count(s).'))
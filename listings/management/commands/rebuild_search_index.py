@@ -0,0 +1,31 @@
+# listings/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from listings import geo, search
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text and geo listing search indexes from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Listings indexed per batch (default 1000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if search.fts_available():
+            count = search.rebuild_index(Listing.objects.all(), batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Full-text index: {count} listing(s).'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                'FTS5 index not available on this database; searches use the fallback matcher.'
+            ))
+
+        if geo.rtree_available():
+            count = geo.rebuild_index(Listing.objects.all(), batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Geo index: {count} listing(s).'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                'R*Tree index not available on this database; geo searches use the coordinate index.'
+            ))
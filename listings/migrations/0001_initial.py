@@ -0,0 +1,209 @@
+# Generated by Django 6.0 on 2026-10-18 02:38
+
+import django.core.validators
+import django.db.models.deletion
+import listings.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Listing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('property_type', models.CharField(choices=[('studio_staycation', 'Bnb | studio'), ('one_bedroom_staycation', 'Bnb | One Bedroom staycation'), ('two_bedroom_staycation', 'Bnb | Two Bedroom staycation'), ('three_bedroom_staycation', ' Bnb | Three Bedroom staycation'), ('Own_compound_staycation', 'Bnb | Own compound/villa staycation'), ('beach_house_staycation', 'Bnb| beach house staycation'), ('studio', ' Furnished Houses for rent | Studio  '), ('one_bedroom', 'Furnished Houses for rent | One Bedroom '), ('two_bedroom', 'Furnished Houses for rent | Two Bedroom '), ('three_bedroom', 'Furnished Houses for rent | Three Bedroom  '), ('Own_compound', 'Furnished Houses for rent | Own compound'), ('beach_house', 'Furnished Houses for rent | beach house ')], max_length=50)),
+                ('transaction_type', models.CharField(choices=[('shortlet', 'Bnb / staycation'), ('rent', 'For Rent'), ('sale', 'For Sale')], default='shortlet', max_length=20)),
+                ('location', models.CharField(choices=[('dubai', 'Dubai'), ('usa', 'usa'), ('Kenya', 'Kenya'), ('westlands', 'Westlands'), ('kilimani', 'Kilimani'), ('kileleshwa', 'Kileleshwa'), ('pangani', 'Pangani'), ('parklands', 'Parklands'), ('ngara', 'Ngara'), ('garden_city', 'Garden City'), ('roysambu', 'Roysambu'), ('roasters', 'Roasters'), ('mirema', 'Mirema'), ('Trm_drive', 'Trm drive'), ('Lumumba_drive', 'Lumumba drive'), ('kitisuru', 'Kitisuru'), ('lavington', 'Lavington'), ('loresho', 'Loresho'), ('zimmerman', 'Zimmerman'), ('kahawa_sukari', 'Kahawa Sukari'), ('kahawa_wendani', 'Kahawa Wendani'), ('kasarani', 'Kasarani'), ('bypass', 'Bypass'), ('Membley', 'Membley'), ('ruiru', 'Ruiru'), ('kiambu', 'Kiambu'), ('thome', 'Thome'), ('kiambu_road', 'Kiambu Road'), ('ngong', 'Ngong'), ('rongai', 'Rongai'), ('gwakairu', 'Gwakairu'), ('kimbo', 'Kimbo'), ('k_road', 'K Road'), ('juja', 'Juja'), ('thika', 'Thika'), ('kahawa_west', 'Kahawa West'), ('kitengela', 'Kitengela'), ('watamu', 'Watamu'), ('diani', 'Diani'), ('embakasi', 'Embakasi'), ('fedha', 'Fedha'), ('south_b', 'South B'), ('south_c', 'South C'), ('utawala', 'Utawala'), ('mombasa', 'Mombasa'), ('eldoret', 'Eldoret'), ('nakuru', 'Nakuru'), ('naivasha', 'Naivasha'), ('homeland', 'Homeland'), ('hurlingham', 'Hurlingham'), ('kabete', 'Kabete'), ('kangemi', 'Kangemi'), ('karen', 'Karen'), ('kawangware', 'Kawangware'), ('milimani', 'Milimani'), ('muthaiga', 'Muthaiga'), ('mwiki', 'Mwiki'), ('nairobi_west', 'Nairobi West'), ('ongata_rongai', 'Ongata Rongai'), ('ruai', 'Ruai'), ('ruaka', 'Ruaka'), ('ruaraka', 'Ruaraka'), ('runda', 'Runda'), ('saika', 'Saika'), ('syokimau', 'Syokimau'), ('thogoto', 'Thogoto'), ('upper_hill', 'Upper Hill'), ('uthiru', 'Uthiru'), ('athiriver', 'Athiriver'), ('kisumu', 'Kisumu'), ('machakos', 'Machakos'), ('meru_town', 'Meru Town'), ('nanyuki', 'Nanyuki'), ('nyeri_town', 'Nyeri Town'), ('embu_town', 'Embu Town'), ('narok_town', 'Narok Town'), ('kisii_town', 'Kisii Town'), ('voi', 'Voi'), ('isiolo_town', 'Isiolo Town'), ('bomet', 'Bomet'), ('kakamega_town', 'Kakamega Town'), ('limuru', 'Limuru'), ('malindi', 'Malindi'), ('nyahururu', 'Nyahururu'), ('migori_town', 'Migori Town'), ('kitui_town', 'Kitui Town'), ('bungoma_town', 'Bungoma Town'), ('kilifi_town', 'Kilifi Town'), ('wangige', 'Wangige'), ('kericho_town', 'Kericho Town')], max_length=100)),
+                ('specific_location', models.CharField(help_text='Specific area/estate', max_length=200)),
+                ('address', models.CharField(blank=True, help_text='Full address (optional)', max_length=300, null=True)),
+                ('host_name', models.CharField(max_length=100)),
+                ('host_email', models.EmailField(blank=True, max_length=255, null=True)),
+                ('host_phone', models.CharField(max_length=15, validators=[django.core.validators.RegexValidator(message="Phone number must be entered in the format: '+254712345678'", regex='^\\+?1?\\d{9,15}$')])),
+                ('host_whatsapp', models.CharField(max_length=15, validators=[django.core.validators.RegexValidator(message="Phone number must be entered in the format: '+254712345678'", regex='^\\+?1?\\d{9,15}$')])),
+                ('admin_contact', models.CharField(default='+254798246467', help_text='Default admin contact number', max_length=15, validators=[django.core.validators.RegexValidator(message="Phone number must be entered in the format: '+254712345678'", regex='^\\+?1?\\d{9,15}$')])),
+                ('listing_type', models.CharField(choices=[('free', 'Free Listing'), ('featured', 'Featured Listing')], default='free', max_length=20, verbose_name='Listing Type')),
+                ('featured_payment_amount', models.DecimalField(decimal_places=2, default=1000.0, max_digits=10, verbose_name='Featured Payment Amount')),
+                ('land_size', models.DecimalField(blank=True, decimal_places=2, help_text='Land size (in acres or sq meters)', max_digits=10, null=True)),
+                ('land_size_unit', models.CharField(blank=True, choices=[('sqm', 'Square Meters'), ('acres', 'Acres'), ('sqft', 'Square Feet')], default='sqm', max_length=20, null=True)),
+                ('floor_area', models.DecimalField(blank=True, decimal_places=2, help_text='Floor area / built-up area (in sq meters)', max_digits=10, null=True)),
+                ('guests', models.PositiveIntegerField(default=1)),
+                ('bedrooms', models.PositiveIntegerField(default=1)),
+                ('beds', models.PositiveIntegerField(default=1)),
+                ('bathrooms', models.PositiveIntegerField(default=1)),
+                ('en_suites', models.PositiveIntegerField(blank=True, default=0, help_text='Number of en-suite bathrooms', null=True)),
+                ('living_rooms', models.PositiveIntegerField(blank=True, default=1, null=True)),
+                ('dining_rooms', models.PositiveIntegerField(blank=True, default=1, null=True)),
+                ('kitchens', models.PositiveIntegerField(blank=True, default=1, null=True)),
+                ('servant_quarters', models.BooleanField(default=False)),
+                ('store_rooms', models.BooleanField(default=False)),
+                ('total_floors', models.PositiveIntegerField(blank=True, default=1, help_text='Total floors in building', null=True)),
+                ('floor_number', models.PositiveIntegerField(blank=True, default=1, help_text='Floor number (for apartments)', null=True)),
+                ('year_built', models.PositiveIntegerField(blank=True, help_text='Year property was built', null=True)),
+                ('condition', models.CharField(blank=True, choices=[('new', 'New Construction'), ('excellent', 'Excellent'), ('good', 'Good'), ('fair', 'Fair'), ('renovated', 'Recently Renovated'), ('under_construction', 'Under Construction')], default='good', max_length=20, null=True)),
+                ('furnishing', models.CharField(blank=True, choices=[('unfurnished', 'Unfurnished'), ('semi_furnished', 'Semi-Furnished'), ('fully_furnished', 'Fully Furnished')], default='unfurnished', max_length=20, null=True)),
+                ('parking_spots', models.PositiveIntegerField(blank=True, default=0, help_text='Number of parking spots', null=True)),
+                ('covered_parking', models.BooleanField(default=False)),
+                ('visitor_parking', models.BooleanField(default=False)),
+                ('wifi', models.BooleanField(default=False)),
+                ('parking', models.BooleanField(default=False)),
+                ('kitchen', models.BooleanField(default=False)),
+                ('gym', models.BooleanField(default=False)),
+                ('pool', models.BooleanField(default=False)),
+                ('spa', models.BooleanField(default=False)),
+                ('sauna', models.BooleanField(default=False)),
+                ('steam_room', models.BooleanField(default=False)),
+                ('ac', models.BooleanField(default=False)),
+                ('heating', models.BooleanField(default=False)),
+                ('ceiling_fans', models.BooleanField(default=False)),
+                ('fireplace', models.BooleanField(default=False)),
+                ('tv', models.BooleanField(default=False)),
+                ('sound_system', models.BooleanField(default=False)),
+                ('home_theater', models.BooleanField(default=False)),
+                ('balcony', models.BooleanField(default=False)),
+                ('terrace', models.BooleanField(default=False)),
+                ('garden', models.BooleanField(default=False)),
+                ('roof_terrace', models.BooleanField(default=False)),
+                ('bbq_area', models.BooleanField(default=False)),
+                ('outdoor_shower', models.BooleanField(default=False)),
+                ('cctv', models.BooleanField(default=False)),
+                ('security_guards', models.BooleanField(default=False)),
+                ('electric_fence', models.BooleanField(default=False)),
+                ('secure_compound', models.BooleanField(default=False)),
+                ('alarm_system', models.BooleanField(default=False)),
+                ('generator', models.BooleanField(default=False)),
+                ('solar_panels', models.BooleanField(default=False)),
+                ('water_tank', models.BooleanField(default=False)),
+                ('borehole', models.BooleanField(default=False)),
+                ('backup_water', models.BooleanField(default=False)),
+                ('internet_fiber', models.BooleanField(default=False)),
+                ('elevator', models.BooleanField(default=False, help_text='Lift/Elevator')),
+                ('wheelchair_accessible', models.BooleanField(default=False)),
+                ('reception', models.BooleanField(default=False)),
+                ('lobby', models.BooleanField(default=False)),
+                ('concierge', models.BooleanField(default=False)),
+                ('laundry_room', models.BooleanField(default=False)),
+                ('play_area', models.BooleanField(default=False, help_text="Children's play area")),
+                ('pet_friendly', models.BooleanField(default=False)),
+                ('house_staff', models.BooleanField(default=False, help_text='Includes house help/gardener')),
+                ('askari', models.BooleanField(default=False, help_text='Watchman/Security guard included')),
+                ('caretaker', models.BooleanField(default=False)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, help_text='Price (KES)', max_digits=12, null=True)),
+                ('price_per_night', models.DecimalField(blank=True, decimal_places=2, default=None, max_digits=10, null=True)),
+                ('price_per_month', models.DecimalField(blank=True, decimal_places=2, default=None, max_digits=12, null=True)),
+                ('price_per_sqm', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('service_charge', models.DecimalField(blank=True, decimal_places=2, help_text='Monthly service charge (KES)', max_digits=10, null=True)),
+                ('deposit_required', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('utilities_included', models.BooleanField(default=False, help_text='Are utilities included in rent?')),
+                ('title_deed', models.BooleanField(default=False, help_text='Title deed available')),
+                ('loan_available', models.BooleanField(default=False, help_text='Financing/Loan available')),
+                ('main_image', models.ImageField(upload_to='listings/main/')),
+                ('image_2', models.ImageField(blank=True, null=True, upload_to='listings/extra/')),
+                ('image_3', models.ImageField(blank=True, null=True, upload_to='listings/extra/')),
+                ('image_4', models.ImageField(blank=True, null=True, upload_to='listings/extra/')),
+                ('image_5', models.ImageField(blank=True, null=True, upload_to='listings/extra/')),
+                ('image_6', models.ImageField(blank=True, null=True, upload_to='listings/extra/')),
+                ('image_7', models.ImageField(blank=True, null=True, upload_to='listings/extra/')),
+                ('image_8', models.ImageField(blank=True, null=True, upload_to='listings/extra/')),
+                ('virtual_tour_url', models.URLField(blank=True, help_text='Link to 3D tour/video walkthrough', null=True)),
+                ('youtube_video_id', models.CharField(blank=True, help_text='YouTube video ID', max_length=50, null=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('whatsapp_group_link', models.URLField(blank=True, help_text='Link to WhatsApp group for inquiries', null=True)),
+                ('is_approved', models.BooleanField(default=False)),
+                ('is_featured', models.BooleanField(default=False)),
+                ('is_verified', models.BooleanField(default=False, help_text='Property has been physically verified')),
+                ('views_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('available_from', models.DateField(blank=True, null=True)),
+                ('available_to', models.DateField(blank=True, null=True)),
+                ('minimum_stay', models.PositiveIntegerField(blank=True, default=1, help_text='Minimum number of nights/days', null=True)),
+                ('maximum_stay', models.PositiveIntegerField(blank=True, default=365, help_text='Maximum number of nights/days', null=True)),
+                ('slug', models.SlugField(blank=True, unique=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='user_listings', to=settings.AUTH_USER_MODEL, verbose_name='Property Owner')),
+            ],
+            options={
+                'verbose_name': 'Property Listing',
+                'verbose_name_plural': 'Property Listings',
+                'ordering': ['-is_featured', '-created_at'],
+            },
+            bases=(listings.models.ListingDisplayMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='Booking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('guest_name', models.CharField(max_length=100)),
+                ('guest_email', models.EmailField(max_length=254)),
+                ('guest_phone', models.CharField(max_length=20)),
+                ('message', models.TextField(blank=True, help_text="Guest's message or inquiry")),
+                ('inquiry_type', models.CharField(choices=[('general', 'General Inquiry'), ('booking', 'Booking Request'), ('viewing', 'Schedule Viewing'), ('price', 'Price Negotiation'), ('other', 'Other')], default='general', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled'), ('completed', 'Completed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('price_at_inquiry', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='user_bookings', to=settings.AUTH_USER_MODEL, verbose_name='Guest Account')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='listings.listing')),
+            ],
+            options={
+                'verbose_name': 'Property Inquiry',
+                'verbose_name_plural': 'Property Inquiries',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['-is_featured', '-created_at'], name='listing_approved_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['location', 'property_type', 'is_featured'], name='listing_approved_loc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['property_type', 'is_featured'], name='listing_approved_ptype_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_approved', 'listing_type'], name='listing_approved_ltype_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['price_per_night'], name='listing_approved_night_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['-created_at'], name='listing_approved_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['location', '-updated_at'], name='listing_approved_loc_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['property_type', '-updated_at'], name='listing_approved_pt_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['listing_type', '-updated_at'], name='listing_approved_lt_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['transaction_type', '-updated_at'], name='listing_approved_tt_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['user', '-created_at'], name='listing_user_created_idx'),
+        ),
+    ]
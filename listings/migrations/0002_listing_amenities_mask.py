@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 02:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Bit layout of amenities_mask at the time of this migration (Listing.AMENITY_GROUPS)
+AMENITY_FIELDS = (
+    'wifi', 'parking', 'kitchen',
+    'gym', 'pool', 'spa', 'sauna', 'steam_room',
+    'ac', 'heating', 'ceiling_fans', 'fireplace',
+    'tv', 'sound_system', 'home_theater',
+    'balcony', 'terrace', 'garden', 'roof_terrace', 'bbq_area', 'outdoor_shower',
+    'cctv', 'security_guards', 'electric_fence', 'secure_compound', 'alarm_system',
+    'generator', 'solar_panels', 'water_tank', 'borehole', 'backup_water', 'internet_fiber',
+    'elevator', 'wheelchair_accessible', 'reception', 'lobby', 'concierge',
+    'laundry_room', 'play_area', 'pet_friendly',
+    'house_staff', 'askari', 'caretaker',
+)
+
+
+def backfill_amenities_mask(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    mask = models.Value(0, output_field=models.BigIntegerField())
+    for index, name in enumerate(AMENITY_FIELDS):
+        mask = mask + models.Case(
+            models.When(**{name: True}, then=models.Value(1 << index)),
+            default=models.Value(0),
+            output_field=models.BigIntegerField(),
+        )
+    Listing.objects.update(amenities_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='amenities_mask',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Packed amenity flags, kept in sync on save'),
+        ),
+        migrations.RunPython(backfill_amenities_mask, migrations.RunPython.noop),
+    ]
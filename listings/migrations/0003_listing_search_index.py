@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 02:55
+
+from django.db import migrations
+
+from listings import search
+
+
+def create_search_index(apps, schema_editor):
+    if not search.create_index(schema_editor):
+        return
+    Listing = apps.get_model('listings', 'Listing')
+    search.rebuild_index(Listing.objects.all())
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_listing_amenities_mask'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+from listings import geo
+
+
+def create_geo_index(apps, schema_editor):
+    if not geo.create_index(schema_editor):
+        return
+    Listing = apps.get_model('listings', 'Listing')
+    geo.rebuild_index(Listing.objects.all())
+
+
+def drop_geo_index(apps, schema_editor):
+    geo.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_listing_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['latitude', 'longitude'], name='listing_approved_latlng_idx'),
+        ),
+        migrations.RunPython(create_geo_index, drop_geo_index),
+    ]
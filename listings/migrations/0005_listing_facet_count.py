@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+from listings import facets
+
+
+def count_facets(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    facets.rebuild(Listing.objects.all(), apps.get_model('listings', 'ListingFacetCount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_listing_geo_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(blank=True, max_length=100)),
+                ('listing_type', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value', 'listing_type'), name='listing_facet_count_unique')],
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
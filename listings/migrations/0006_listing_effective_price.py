@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-18 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+from listings import facets
+
+# Listing.PRICE_FIELDS at the time of this migration
+PRICE_FIELDS = {
+    'shortlet': 'price_per_night',
+    'rent': 'price_per_month',
+    'sale': 'price',
+}
+
+
+def backfill_effective_price(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Listing.objects.update(effective_price=models.Case(
+        *[models.When(transaction_type=transaction_type, then=models.F(field))
+          for transaction_type, field in PRICE_FIELDS.items()],
+        default=models.Value(None),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    ))
+    # Price bands are counted on the new column from now on
+    facets.rebuild(Listing.objects.all(), apps.get_model('listings', 'ListingFacetCount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_facet_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_approved_night_idx',
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='effective_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, help_text='The price for the transaction type (night, month or sale), kept in sync on save', max_digits=12, null=True),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['effective_price'], name='listing_approved_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['is_featured', 'effective_price', 'id'], name='listing_approved_price_ord_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 04:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_listing_effective_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['is_featured', 'created_at', 'id'], name='listing_approved_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['is_featured', 'views_count', 'id'], name='listing_approved_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['is_featured', 'is_verified', 'created_at', 'id'], name='listing_approved_verified_idx'),
+        ),
+    ]
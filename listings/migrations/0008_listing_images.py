@@ -0,0 +1,112 @@
+# Generated by Django 6.0 on 2026-10-18 05:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The image columns of Listing before this migration, in gallery order
+IMAGE_FIELDS = ('main_image', 'image_2', 'image_3', 'image_4', 'image_5', 'image_6', 'image_7', 'image_8')
+BATCH_SIZE = 1000
+
+
+def copy_images_to_rows(apps, schema_editor):
+    """One ListingImage per filled image column, at the column's position"""
+    Listing = apps.get_model('listings', 'Listing')
+    ListingImage = apps.get_model('listings', 'ListingImage')
+
+    def flush(images, counts):
+        ListingImage.objects.bulk_create(images)
+        for count in set(counts.values()):
+            Listing.objects.filter(pk__in=[pk for pk, n in counts.items() if n == count]).update(image_count=count)
+
+    images, counts = [], {}
+    for pk, *names in Listing.objects.order_by('pk').values_list('pk', *IMAGE_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        filled = [(position, name) for position, name in enumerate(names) if name]
+        images += [ListingImage(listing_id=pk, image=name, position=position) for position, name in filled]
+        counts[pk] = len(filled)
+        if len(counts) >= BATCH_SIZE:
+            flush(images, counts)
+            images, counts = [], {}
+    flush(images, counts)
+
+
+def copy_rows_to_images(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    ListingImage = apps.get_model('listings', 'ListingImage')
+    columns = {}
+    for listing_id, position, name in (ListingImage.objects.filter(position__lt=len(IMAGE_FIELDS))
+                                       .values_list('listing_id', 'position', 'image').iterator()):
+        columns.setdefault(listing_id, {})[IMAGE_FIELDS[position]] = name
+    listings = [Listing(pk=pk, **values) for pk, values in columns.items()]
+    Listing.objects.bulk_update(listings, IMAGE_FIELDS, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_listing_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='image_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ListingImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='listings/photos/')),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('width', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('dominant_color', models.CharField(blank=True, editable=False, help_text='#rrggbb placeholder shown while the photo loads', max_length=7)),
+                ('derivatives', models.JSONField(blank=True, default=dict, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('listing', 'position'), name='listing_image_position_unique')],
+            },
+        ),
+        migrations.RunPython(copy_images_to_rows, copy_rows_to_images),
+        migrations.RemoveField(
+            model_name='listing',
+            name='image_2',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='image_3',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='image_4',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='image_5',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='image_6',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='image_7',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='image_8',
+        ),
+        # With a default the column can be added back when migrating backwards
+        migrations.AlterField(
+            model_name='listing',
+            name='main_image',
+            field=models.ImageField(default='', upload_to='listings/main/'),
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='main_image',
+        ),
+    ]
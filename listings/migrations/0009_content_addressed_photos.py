@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 06:40
+
+import listings.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    """Existing photos keep their names; each is counted once per row using it"""
+    ListingImage = apps.get_model('listings', 'ListingImage')
+    StoredFile = apps.get_model('listings', 'StoredFile')
+    StoredFile.objects.bulk_create(
+        (StoredFile(name=row['image'], references=row['references'])
+         for row in ListingImage.objects.exclude(image='').order_by()
+         .values('image').annotate(references=Count('id')).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='listingimage',
+            name='image',
+            field=models.ImageField(storage=listings.storage.photo_storage, upload_to='listings/photos/'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
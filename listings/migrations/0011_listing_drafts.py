@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_photo_uploads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photoupload',
+            name='normalized',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ListingDraft',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(default=dict)),
+                ('photos', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='listing_draft', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='photoupload',
+            name='draft',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='listings.listingdraft'),
+        ),
+        migrations.AddIndex(
+            model_name='listingdraft',
+            index=models.Index(fields=['updated_at'], name='listing_draft_updated_idx'),
+        ),
+    ]
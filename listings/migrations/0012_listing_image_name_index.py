@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 13:20
+
+import listings.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_listing_drafts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listingimage',
+            name='image',
+            field=models.ImageField(db_index=True, storage=listings.storage.photo_storage, upload_to='listings/photos/'),
+        ),
+    ]
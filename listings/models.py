@@ -1,11 +1,242 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
 from django.core.validators import RegexValidator
 from django.utils import timezone
 from django.conf import settings
+from django.db.models import F, Case, OuterRef, Subquery, When, Value
+from django.db.models.functions import Mod
+from django.db.models.query import ValuesIterable
+from django.dispatch import Signal
+from dataclasses import dataclass
+from typing import Optional
+from datetime import datetime
+from decimal import Decimal
+import hashlib
+import os
+import uuid
+
+from . import images
+from .storage import photo_storage
+
+
+# Sent by ListingQuerySet.update() with the pks and field names it changes,
+# before and after the UPDATE and in the same transaction; queryset updates
+# (e.g. the admin bulk actions) bypass pre_save/post_save
+listings_pre_bulk_update = Signal()
+listings_bulk_updated = Signal()
+# Sent by ListingQuerySet.bulk_create() with the created listings
+listings_bulk_created = Signal()
+
+# Receivers filter by the pks of an update in slices of this size, which keeps
+# each pk__in list under SQLite's limit on bound variables
+PK_BATCH_SIZE = 500
+
+
+def pk_batches(pks, size=None):
+    """Consecutive slices of a pk list, for pk__in filters"""
+    size = size or PK_BATCH_SIZE
+    for start in range(0, len(pks), size):
+        yield pks[start:start + size]
+
+
+class ListingQuerySet(models.QuerySet):
+    # Primes for the two rounds of the seeded shuffle key
+    SHUFFLE_PRIMES = (1000003, 2147483647)
+
+    def approved(self):
+        """Listings visible on the public pages"""
+        return self.filter(is_approved=True)
+
+    def shuffled(self, seed):
+        """
+        Featured first, then a pseudo-random order that is stable for a given seed.
+        The order key is computed by the database, so pages can be sliced with
+        LIMIT/OFFSET without loading the whole catalog into Python.
+        """
+        digest = hashlib.blake2b(str(seed).encode(), digest_size=16).digest()
+        first, second = self.SHUFFLE_PRIMES
+        a, b, c, d = (int.from_bytes(digest[i:i + 4], 'big') for i in range(0, 16, 4))
+        # Two affine rounds over different moduli scramble sequential ids
+        key = Mod(F('id') * (a % (first - 1) + 1) + b % first, first)
+        key = Mod(key * (c % (second - 1) + 1) + d % second, second)
+        return self.annotate(shuffle_key=key).order_by('-is_featured', 'shuffle_key', 'id')
+
+    def with_amenities(self, names):
+        """
+        Listings having every named amenity, matched with one bitwise test.
+        No B-tree can serve `mask & X = X`, so this reads every row the other
+        filters leave, scanning the approved partial index when there are none.
+        """
+        mask = amenities_to_mask(names)
+        if not mask:
+            return self
+        return self.alias(matched_amenities=F('amenities_mask').bitand(mask)).filter(matched_amenities=mask)
+
+    def update(self, **kwargs):
+        """
+        Bulk updates that touch amenity flags or prices also rewrite
+        amenities_mask/effective_price, and listings_pre_bulk_update and
+        listings_bulk_updated are sent so caches and counters can follow along.
+        """
+        changed = {name: value for name, value in kwargs.items() if name in AMENITY_BITS}
+        reprice = bool(set(kwargs) & EFFECTIVE_PRICE_SOURCES) and 'effective_price' not in kwargs
+        fields = (frozenset(kwargs) | ({'amenities_mask'} if changed else set())
+                  | ({'effective_price'} if reprice else set()))
+        recompute_mask = (changed and 'amenities_mask' not in kwargs
+                          and not all(isinstance(value, bool) for value in changed.values()))
+
+        with transaction.atomic(using=self.db):
+            pks = None
+            if (recompute_mask or reprice or listings_pre_bulk_update.has_listeners(self.model)
+                    or listings_bulk_updated.has_listeners(self.model)):
+                # Read and locked in the transaction, so the rows cannot change
+                # between the signals and the UPDATE (SQLite has no row locks,
+                # but fails a write whose earlier reads another writer outdated)
+                locked = self.model._default_manager.filter(pk__in=self.values('pk')).select_for_update()
+                pks = list(locked.order_by().values_list('pk', flat=True))
+            if pks:
+                listings_pre_bulk_update.send(sender=self.model, pks=pks, fields=fields)
+            if changed and 'amenities_mask' not in kwargs and not recompute_mask:
+                kwargs['amenities_mask'] = amenities_mask_expression(changed)
+            updated = super().update(**kwargs)
+            # Derived columns that depend on expressions or on several columns
+            # are recomputed from the stored values once the UPDATE has run
+            derived = {}
+            if recompute_mask:
+                derived['amenities_mask'] = amenities_mask_expression()
+            if reprice:
+                derived['effective_price'] = effective_price_expression()
+            if derived and pks:
+                for batch in pk_batches(pks):
+                    rows = self.model._default_manager.filter(pk__in=batch)
+                    super(ListingQuerySet, rows).update(**derived)
+            if pks:
+                listings_bulk_updated.send(sender=self.model, pks=pks, fields=fields)
+        return updated
+
+    update.alters_data = True
+
+    def count_view(self):
+        """
+        Add one to views_count, atomically. A plain UPDATE without the bulk
+        update signals: nothing cached depends on the exact count, and a page
+        view must not invalidate the pages showing the listing.
+        """
+        return super().update(views_count=F('views_count') + 1)
+
+    count_view.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.amenities_mask = obj.compute_amenities_mask()
+            obj.effective_price = obj.compute_effective_price()
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            listings_bulk_created.send(sender=self.model, objs=created)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if set(fields) & set(AMENITY_BITS):
+            for obj in objs:
+                obj.amenities_mask = obj.compute_amenities_mask()
+            fields = [*fields, 'amenities_mask']
+        if set(fields) & EFFECTIVE_PRICE_SOURCES:
+            for obj in objs:
+                obj.effective_price = obj.compute_effective_price()
+            fields = [*fields, 'effective_price']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    bulk_update.alters_data = True
+
+    def cards(self):
+        """
+        Fetch only the columns a listing card renders, yielding ListingCard rows
+        instead of full ~100-column Listing instances.
+        """
+        clone = self.values(*ListingCard.FIELDS)
+        clone._iterable_class = ListingCardIterable
+        return clone
+
+    def cards_by_ids(self, ids):
+        """ListingCard rows for ``ids``, returned in the order of ``ids``"""
+        ids = list(ids)
+        cards = {card.id: card for card in self.filter(pk__in=ids).order_by().cards()}
+        return [cards[pk] for pk in ids if pk in cards]
+
+
+class ListingCardIterable(ValuesIterable):
+    """
+    Yield a ListingCard for each row of a values() queryset, with the cover
+    photos of all the rows fetched by one extra query. The rest of a gallery
+    is loaded by the page when it is opened (see listings/gallery.py).
+    """
+
+    def __iter__(self):
+        rows = list(super().__iter__())
+        covers = {}
+        with_images = [row['id'] for row in rows if row['image_count']]
+        if with_images:
+            first = ListingImage.objects.filter(listing_id=OuterRef('listing_id')).order_by('position', 'id')
+            covers = {
+                image.listing_id: image
+                for image in ListingImage.objects.filter(
+                    listing_id__in=with_images, pk=Subquery(first.values('pk')[:1])
+                )
+            }
+        for row in rows:
+            yield ListingCard(**row, cover_image=covers.get(row['id']))
+
+
+class ListingDisplayMixin:
+    """
+    Display helpers shared by full Listing rows and ListingCard projections.
+    Relies only on the card fields and the get_*_display() methods.
+    """
+    __slots__ = ()
 
+    def admin_whatsapp_link(self):
+        """WhatsApp link with admin number and booking message"""
+        message = f"Hello! I'd like to inquire about this property:\n"
+        message += f"Property: {self.title}\n"
+        message += f"Location: {self.get_location_display()} - {self.specific_location}\n"
+        message += f"Host: {self.host_name}\n"
+
+        if self.transaction_type == 'shortlet' and self.price_per_night:
+            message += f"Price: KSh {self.price_per_night}/night\n"
+        elif self.transaction_type == 'rent' and self.price_per_month:
+            message += f"Price: KSh {self.price_per_month}/month\n"
+        elif self.price:
+            message += f"Price: KSh {self.price}\n"
+
+        message += f"Property Type: {self.get_property_type_display()}\n"
+        message += f"Listing Type: {self.get_listing_type_display()}\n\n"
+
+        import urllib.parse
+        encoded_message = urllib.parse.quote(message)
+
+        return f"https://wa.me/{self.admin_contact.replace('+', '')}?text={encoded_message}"
+
+    def admin_call_link(self):
+        """Direct call link to admin number"""
+        return f"tel:{self.admin_contact}"
+
+    @property
+    def formatted_price(self):
+        """Get formatted price based on transaction type"""
+        if self.transaction_type == 'shortlet' and self.price_per_night:
+            return f"KES {self.price_per_night:,.0f}/night"
+        elif self.transaction_type == 'rent' and self.price_per_month:
+            return f"KES {self.price_per_month:,.0f}/month"
+        elif self.transaction_type == 'sale' and self.price:
+            return f"KES {self.price:,.0f}"
+        else:
+            return "Price on request"
 
-class Listing(models.Model):
+
+class Listing(ListingDisplayMixin, models.Model):
     # Property Types
     PROPERTY_TYPES = [
         ('studio_staycation', 'Bnb | studio'),
@@ -127,6 +358,13 @@ class Listing(models.Model):
         ('sale', 'For Sale'),
     ]
 
+    # Price column that applies to each transaction type
+    PRICE_FIELDS = {
+        'shortlet': 'price_per_night',
+        'rent': 'price_per_month',
+        'sale': 'price',
+    }
+
     PROPERTY_CONDITION_CHOICES = [
         ('new', 'New Construction'),
         ('excellent', 'Excellent'),
@@ -142,6 +380,21 @@ class Listing(models.Model):
         ('fully_furnished', 'Fully Furnished'),
     ]
 
+    # Amenity groups as shown in the admin. Flattened in this order they are the
+    # bit layout of amenities_mask - only ever append, never reorder or remove.
+    AMENITY_GROUPS = (
+        ('Basic Amenities', ('wifi', 'parking', 'kitchen')),
+        ('Fitness & Wellness', ('gym', 'pool', 'spa', 'sauna', 'steam_room')),
+        ('Climate Control', ('ac', 'heating', 'ceiling_fans', 'fireplace')),
+        ('Entertainment', ('tv', 'sound_system', 'home_theater')),
+        ('Outdoor Features', ('balcony', 'terrace', 'garden', 'roof_terrace', 'bbq_area', 'outdoor_shower')),
+        ('Security', ('cctv', 'security_guards', 'electric_fence', 'secure_compound', 'alarm_system')),
+        ('Utilities', ('generator', 'solar_panels', 'water_tank', 'borehole', 'backup_water', 'internet_fiber')),
+        ('Building Amenities', ('elevator', 'wheelchair_accessible', 'reception', 'lobby', 'concierge',
+                                'laundry_room', 'play_area', 'pet_friendly')),
+        ('Staff', ('house_staff', 'askari', 'caretaker')),
+    )
+
     # Property Details
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -308,6 +561,11 @@ class Listing(models.Model):
     askari = models.BooleanField(default=False, help_text="Watchman/Security guard included")
     caretaker = models.BooleanField(default=False)
 
+    # All of the amenities above packed into one column (see AMENITY_GROUPS);
+    # deliberately not indexed, see ListingQuerySet.with_amenities()
+    amenities_mask = models.BigIntegerField(default=0, editable=False,
+                                            help_text="Packed amenity flags, kept in sync on save")
+
     # Pricing
     price = models.DecimalField(
         max_digits=12,
@@ -330,6 +588,14 @@ class Listing(models.Model):
         null=True,
         default=None
     )
+    effective_price = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="The price for the transaction type (night, month or sale), kept in sync on save"
+    )
     price_per_sqm = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -358,14 +624,8 @@ class Listing(models.Model):
     loan_available = models.BooleanField(default=False, help_text="Financing/Loan available")
 
     # Images
-    main_image = models.ImageField(upload_to='listings/main/')
-    image_2 = models.ImageField(upload_to='listings/extra/', blank=True, null=True)
-    image_3 = models.ImageField(upload_to='listings/extra/', blank=True, null=True)
-    image_4 = models.ImageField(upload_to='listings/extra/', blank=True, null=True)
-    image_5 = models.ImageField(upload_to='listings/extra/', blank=True, null=True)
-    image_6 = models.ImageField(upload_to='listings/extra/', blank=True, null=True)
-    image_7 = models.ImageField(upload_to='listings/extra/', blank=True, null=True)
-    image_8 = models.ImageField(upload_to='listings/extra/', blank=True, null=True)
+    # Photos are ListingImage rows (listing.images); the count is kept here for grids
+    image_count = models.PositiveSmallIntegerField(default=0, editable=False)
 
     # Virtual Tour
     virtual_tour_url = models.URLField(blank=True, null=True, help_text="Link to 3D tour/video walkthrough")
@@ -405,6 +665,8 @@ class Listing(models.Model):
     # Meta
     slug = models.SlugField(unique=True, blank=True)
 
+    objects = ListingQuerySet.as_manager()
+
     def __str__(self):
         listing_type_display = "Featured" if self.is_featured else "Free"
         return f"[{listing_type_display}] {self.title} - {self.location}"
@@ -413,6 +675,12 @@ class Listing(models.Model):
         # Automatically set is_featured based on listing_type
         self.is_featured = (self.listing_type == 'featured')
 
+        # Keep the packed amenity column in sync with the individual flags
+        self.amenities_mask = self.compute_amenities_mask()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(AMENITY_BITS):
+            kwargs['update_fields'] = {*update_fields, 'amenities_mask'}
+
         # Auto-fill host_email from user if not set
         if self.user and not self.host_email:
             self.host_email = self.user.email
@@ -430,91 +698,81 @@ class Listing(models.Model):
         elif self.transaction_type == 'sale' and self.price and not self.price:
             self.price = self.price
 
+        # One indexed column for price filters and sorting across transaction types
+        self.effective_price = self.compute_effective_price()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & EFFECTIVE_PRICE_SOURCES:
+            kwargs['update_fields'] = {*update_fields, 'effective_price'}
+
         if not self.slug:
             from django.utils.text import slugify
             import uuid
             self.slug = slugify(f"{self.title}-{uuid.uuid4().hex[:8]}")
         super().save(*args, **kwargs)
+        saved = self._meta.concrete_fields
+        if kwargs.get('update_fields') is not None:
+            saved = [self._meta.get_field(name) for name in kwargs['update_fields']]
+        loaded = getattr(self, '_loaded_values', None) or {}
+        loaded.update((field.attname, getattr(self, field.attname))
+                      for field in saved if field.attname in self.__dict__)
+        self._loaded_values = loaded
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so save handlers can tell what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def changed_fields(self, *fields):
+        """
+        Which of ``fields`` (attnames) differ from the values loaded from the
+        database. Every field counts as changed on an instance not loaded from it.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return set(fields)
+        return {name for name in fields
+                if name not in loaded or loaded[name] != getattr(self, name)}
 
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('listing_detail', kwargs={'slug': self.slug})
 
+    def compute_amenities_mask(self):
+        """Pack the amenity flags of this instance into an integer"""
+        return amenities_to_mask(name for name in AMENITY_BITS if getattr(self, name))
+
+    def compute_effective_price(self):
+        """The price column matching the transaction type, as formatted_price shows it"""
+        field = self.PRICE_FIELDS.get(self.transaction_type)
+        return getattr(self, field) if field else None
+
     def whatsapp_link(self):
         return f"https://wa.me/{self.host_whatsapp.replace('+', '')}"
 
     def call_link(self):
         return f"tel:{self.host_phone}"
 
-    def admin_whatsapp_link(self):
-        """WhatsApp link with admin number and booking message"""
-        message = f"Hello! I'd like to inquire about this property:\n"
-        message += f"Property: {self.title}\n"
-        message += f"Location: {self.get_location_display()} - {self.specific_location}\n"
-        message += f"Host: {self.host_name}\n"
-
-        if self.transaction_type == 'shortlet' and self.price_per_night:
-            message += f"Price: KSh {self.price_per_night}/night\n"
-        elif self.transaction_type == 'rent' and self.price_per_month:
-            message += f"Price: KSh {self.price_per_month}/month\n"
-        elif self.price:
-            message += f"Price: KSh {self.price}\n"
-
-        message += f"Property Type: {self.get_property_type_display()}\n"
-        message += f"Listing Type: {self.get_listing_type_display()}\n\n"
-
-        import urllib.parse
-        encoded_message = urllib.parse.quote(message)
-
-        return f"https://wa.me/{self.admin_contact.replace('+', '')}?text={encoded_message}"
-
-    def admin_call_link(self):
-        """Direct call link to admin number"""
-        return f"tel:{self.admin_contact}"
-
     @property
     def all_images(self):
-        """Get all images for this listing as a list"""
-        images = []
-        if self.main_image:
-            images.append(self.main_image)
-        if self.image_2:
-            images.append(self.image_2)
-        if self.image_3:
-            images.append(self.image_3)
-        if self.image_4:
-            images.append(self.image_4)
-        if self.image_5:
-            images.append(self.image_5)
-        if self.image_6:
-            images.append(self.image_6)
-        if self.image_7:
-            images.append(self.image_7)
-        if self.image_8:
-            images.append(self.image_8)
-        return images
+        """Photos in gallery order; use prefetch_related('images') when listing many"""
+        return list(self.images.all())
+
+    @property
+    def main_image(self):
+        """The cover photo, or None"""
+        images = self.all_images
+        return images[0] if images else None
 
     @property
-    def image_count(self):
-        """Get the total number of images for this listing"""
-        count = 0
-        if self.main_image:
-            count += 1
-        if self.image_2:
-            count += 1
-        if self.image_3:
-            count += 1
-        if self.image_4:
-            count += 1
-        if self.image_5:
-            count += 1
-        if self.image_6:
-            count += 1
-        if self.image_7:
-            count += 1
-        if self.image_8:
-            count += 1
-        return count
+    def image_slots(self):
+        """The photo in each upload slot of the listing form, None where it is empty"""
+        slots = [None] * ListingImage.MAX_PER_LISTING
+        for image in self.all_images:
+            if image.position < len(slots):
+                slots[image.position] = image
+        return slots
 
     @property
     def has_multiple_images(self):
@@ -536,22 +794,341 @@ class Listing(models.Model):
         """Display formatted featured price"""
         return f"KES {self.featured_payment_amount:,.2f}"
 
-    @property
-    def formatted_price(self):
-        """Get formatted price based on transaction type"""
-        if self.transaction_type == 'shortlet' and self.price_per_night:
-            return f"KES {self.price_per_night:,.0f}/night"
-        elif self.transaction_type == 'rent' and self.price_per_month:
-            return f"KES {self.price_per_month:,.0f}/month"
-        elif self.transaction_type == 'sale' and self.price:
-            return f"KES {self.price:,.0f}"
-        else:
-            return "Price on request"
-
     class Meta:
         ordering = ['-is_featured', '-created_at']
         verbose_name = "Property Listing"
         verbose_name_plural = "Property Listings"
+        # Partial indexes cover only approved rows - the public pages never read the rest
+        indexes = [
+            models.Index(fields=['-is_featured', '-created_at'], name='listing_approved_order_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['location', 'property_type', 'is_featured'], name='listing_approved_loc_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['property_type', 'is_featured'], name='listing_approved_ptype_idx',
+                         condition=models.Q(is_approved=True)),
+            # Not partial: lets approved / featured COUNTs be answered from the index alone
+            models.Index(fields=['is_approved', 'listing_type'], name='listing_approved_ltype_idx'),
+            # Price range filters (index-only) and price-sorted pages
+            models.Index(fields=['effective_price'], name='listing_approved_price_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['is_featured', 'effective_price', 'id'], name='listing_approved_price_ord_idx',
+                         condition=models.Q(is_approved=True)),
+            # Keyset-paginated sort modes (listings/keyset.py)
+            models.Index(fields=['is_featured', 'created_at', 'id'], name='listing_approved_newest_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['is_featured', 'views_count', 'id'], name='listing_approved_views_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['is_featured', 'is_verified', 'created_at', 'id'],
+                         name='listing_approved_verified_idx', condition=models.Q(is_approved=True)),
+            # Bounding-box fallback where the R*Tree table is not available
+            models.Index(fields=['latitude', 'longitude'], name='listing_approved_latlng_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['-created_at'], name='listing_approved_created_idx',
+                         condition=models.Q(is_approved=True)),
+            # Sitemap lastmod lookups: latest update per location / property type
+            models.Index(fields=['location', '-updated_at'], name='listing_approved_loc_upd_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['property_type', '-updated_at'], name='listing_approved_pt_upd_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['listing_type', '-updated_at'], name='listing_approved_lt_upd_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['transaction_type', '-updated_at'], name='listing_approved_tt_upd_idx',
+                         condition=models.Q(is_approved=True)),
+            # My listings
+            models.Index(fields=['user', '-created_at'], name='listing_user_created_idx'),
+        ]
+
+
+AMENITY_FIELDS = tuple(name for _, names in Listing.AMENITY_GROUPS for name in names)
+AMENITY_BITS = {name: 1 << index for index, name in enumerate(AMENITY_FIELDS)}
+
+
+def amenities_to_mask(names):
+    """Pack amenity field names into an amenities_mask value, ignoring unknown names"""
+    mask = 0
+    for name in names:
+        mask |= AMENITY_BITS.get(name, 0)
+    return mask
+
+
+def mask_to_amenities(mask):
+    """Amenity field names set in an amenities_mask value, in AMENITY_GROUPS order"""
+    return [name for name, bit in AMENITY_BITS.items() if mask & bit]
+
+
+def amenities_mask_expression(values=None):
+    """
+    SQL expression computing amenities_mask from the amenity columns.
+    ``values`` overrides columns with literal booleans, e.g. the kwargs of an update().
+    """
+    values = values or {}
+    mask = Value(amenities_to_mask(name for name in AMENITY_BITS if values.get(name)),
+                 output_field=models.BigIntegerField())
+    for name, bit in AMENITY_BITS.items():
+        if name not in values:
+            mask = mask + Case(When(**{name: True}, then=Value(bit)), default=Value(0),
+                               output_field=models.BigIntegerField())
+    return mask
+
+
+EFFECTIVE_PRICE_SOURCES = {'transaction_type', *Listing.PRICE_FIELDS.values()}
+
+
+def effective_price_expression():
+    """SQL expression computing effective_price from the stored price columns"""
+    return Case(
+        *[When(transaction_type=transaction_type, then=F(field))
+          for transaction_type, field in Listing.PRICE_FIELDS.items()],
+        default=Value(None),
+        output_field=Listing._meta.get_field('effective_price'),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class ListingCard(ListingDisplayMixin):
+    """
+    Lightweight read-only row for listing grids and the featured slider.
+    Built by Listing.objects.cards(); exposes the same attribute and display
+    method names the templates use on a full Listing.
+    """
+    LOCATION_NAMES = dict(Listing.LOCATIONS)
+    PROPERTY_TYPE_NAMES = dict(Listing.PROPERTY_TYPES)
+    LISTING_TYPE_NAMES = dict(Listing.LISTING_TYPE_CHOICES)
+
+    id: int
+    slug: str
+    title: str
+    property_type: str
+    transaction_type: str
+    location: str
+    specific_location: str
+    host_name: str
+    host_phone: str
+    admin_contact: str
+    listing_type: str
+    is_approved: bool
+    is_featured: bool
+    is_verified: bool
+    views_count: int
+    price: Optional[Decimal]
+    price_per_night: Optional[Decimal]
+    price_per_month: Optional[Decimal]
+    effective_price: Optional[Decimal]
+    guests: int
+    bedrooms: int
+    bathrooms: int
+    amenities_mask: int
+    latitude: Optional[Decimal]
+    longitude: Optional[Decimal]
+    image_count: int
+    created_at: datetime
+    updated_at: datetime
+    # The first ListingImage of the gallery, attached by ListingCardIterable
+    cover_image: Optional['ListingImage'] = None
+
+    def __getattr__(self, name):
+        # Amenity flags (listing.wifi, listing.pool, ...) are read from the packed mask
+        if name in AMENITY_BITS:
+            return bool(self.amenities_mask & AMENITY_BITS[name])
+        raise AttributeError(name)
+
+    @property
+    def amenities(self):
+        """Names of the amenities this listing has, for badges"""
+        return mask_to_amenities(self.amenities_mask)
+
+    def get_location_display(self):
+        return self.LOCATION_NAMES.get(self.location, self.location)
+
+    def get_property_type_display(self):
+        return self.PROPERTY_TYPE_NAMES.get(self.property_type, self.property_type)
+
+    def get_listing_type_display(self):
+        return self.LISTING_TYPE_NAMES.get(self.listing_type, self.listing_type)
+
+    def get_absolute_url(self):
+        from django.urls import reverse
+        return reverse('listing_detail', kwargs={'slug': self.slug})
+
+    @property
+    def main_image(self):
+        """The cover photo, or None"""
+        return self.cover_image
+
+    @property
+    def has_multiple_images(self):
+        return self.image_count > 1
+
+
+# Columns selected by cards(); the cover photo is loaded separately
+ListingCard.FIELDS = tuple(name for name in ListingCard.__dataclass_fields__ if name != 'cover_image')
+
+
+class ListingImage(models.Model):
+    """
+    One photo of a listing. position orders the gallery (0 is the cover
+    photo); the size, dominant colour and resized variants are filled in by
+    listings/images.py once the upload is committed. Files are stored by
+    content hash and shared between rows (see listings/storage.py).
+    """
+    # Upload slots of the listing form
+    MAX_PER_LISTING = 8
+
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='images')
+    # Indexed for delivery.fetch_viewers(), which looks photos up by name
+    image = models.ImageField(upload_to='listings/photos/', storage=photo_storage, db_index=True)
+    position = models.PositiveSmallIntegerField(default=0)
+    width = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    height = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    dominant_color = models.CharField(max_length=7, blank=True, editable=False,
+                                      help_text="#rrggbb placeholder shown while the photo loads")
+    # {'card.webp': storage name, ...}; empty until the variants have been generated
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['position', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'position'], name='listing_image_position_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} #{self.position}: {self.image.name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The file referenced as loaded, released by the signals when it is replaced
+        instance._loaded_name = dict(zip(field_names, values)).get('image')
+        return instance
+
+    @property
+    def name(self):
+        return self.image.name
+
+    @property
+    def url(self):
+        return self.image.url
+
+    def variant_url(self, spec='card'):
+        """URL of a resized variant ('thumb', 'card.webp', ...), the original until it exists"""
+        if '.' not in spec:
+            spec += '.jpg'
+        if spec in self.derivatives:
+            return default_storage.url(self.derivatives[spec])
+        return self.image.url
+
+    def srcset(self, extension='jpg'):
+        return images.srcset(self.derivatives, extension)
+
+    def generate_derivatives(self, force=False):
+        """Write the resized variants and store them with the photo's size and colour"""
+        info = images.generate_derivatives(self.image.name, self.image.storage, force=force)
+        self.width, self.height = info.width, info.height
+        self.dominant_color, self.derivatives = info.dominant_color, info.derivatives
+        type(self).objects.filter(pk=self.pk).update(
+            width=info.width, height=info.height,
+            dominant_color=info.dominant_color, derivatives=info.derivatives,
+        )
+        return info
+
+    def replace_image(self, file):
+        """Put a new upload in this photo's slot; its variants are made again"""
+        self.image = file
+        self.width = self.height = None
+        self.dominant_color, self.derivatives = '', {}
+        self.save()
+
+
+class StoredFile(models.Model):
+    """
+    A file in content-addressed storage and how many ListingImage rows refer
+    to it. Maintained through listings/storage.py acquire() and release().
+    """
+    name = models.CharField(max_length=255, unique=True)
+    references = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+
+class PhotoUpload(models.Model):
+    """
+    A photo uploaded in chunks, resumable after a dropped connection (see
+    listings/uploads.py). The listing form names it by id once it is complete.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='photo_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Checksum of the whole file, if the client sent one")
+    received = models.PositiveBigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Already through uploads.normalize(), e.g. kept from a submit that failed validation
+    normalized = models.BooleanField(default=False)
+    # Kept as long as the draft it belongs to rather than CHUNKED_UPLOAD_EXPIRY_HOURS
+    draft = models.ForeignKey('ListingDraft', on_delete=models.CASCADE, null=True, blank=True, related_name='uploads')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['updated_at'], name='photo_upload_updated_idx')]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+    @property
+    def path(self):
+        """Where the received bytes are assembled"""
+        return os.path.join(os.fspath(settings.CHUNKED_UPLOAD_DIR), f'{self.id}.part')
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+
+class ListingDraft(models.Model):
+    """
+    What a host entered on the new listing form when it failed validation:
+    the field values, and the photos that were accepted as PhotoUploads, so
+    the next submit needs neither the photos again nor the unchanged fields.
+    Deleted when the listing is submitted; abandoned ones expire after
+    LISTING_DRAFT_EXPIRY_DAYS.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='listing_draft')
+    # {field name: [values]}, as in request.POST
+    data = models.JSONField(default=dict)
+    # {photo slot: PhotoUpload id}
+    photos = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['updated_at'], name='listing_draft_updated_idx')]
+
+    def __str__(self):
+        return f"Draft of {self.user}"
+
+
+class ListingFacetCount(models.Model):
+    """
+    Number of approved listings per facet value (location, property type,
+    price band) and listing type. Maintained by listings/facets.py so pages
+    can show filter counts without counting the listings table.
+    """
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=100, blank=True)
+    listing_type = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value', 'listing_type'], name='listing_facet_count_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value} [{self.listing_type}]: {self.count}"
 
 
 class Booking(models.Model):
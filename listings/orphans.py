@@ -0,0 +1,200 @@
+# listings/orphans.py
+"""
+Garbage collection of media files nothing refers to.
+
+Every FileField of every model (listing photos, profile pictures) names the
+files in use; derivatives belong to the photo they were made from (see
+images.py). The media tree is walked with os.scandir by a pool of threads, a
+directory per task, and each file is looked up in the set of referenced names
+as its directory comes in, so the walk never holds more than a few directory
+listings. Orphans are not deleted straight away: they are moved (a rename)
+into QUARANTINE_DIR/<timestamp>/, and only purged from there on a later run,
+once they have stayed unreferenced for the whole quarantine period. Files
+referenced again in the meantime are put back.
+"""
+import os
+import posixpath
+import shutil
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from . import images
+
+# Under MEDIA_ROOT; never walked for orphans
+QUARANTINE_DIR = '.orphaned'
+QUARANTINE_STAMP = '%Y%m%d%H%M%S'
+
+# Directories being listed at once, per worker
+DIRECTORIES_IN_FLIGHT = 4
+
+Orphan = namedtuple('Orphan', 'name size')
+
+
+def file_fields():
+    """(model, field name) of every concrete FileField in the project"""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def media_roots():
+    """
+    Top-level media directories files are uploaded to, plus the derivatives,
+    which is where orphans can appear
+    """
+    roots = {images.DERIVATIVES_DIR}
+    for model, name in file_fields():
+        upload_to = model._meta.get_field(name).upload_to
+        if isinstance(upload_to, str) and upload_to.strip('/'):
+            roots.add(upload_to.strip('/').split('/')[0])
+    return sorted(roots)
+
+
+class References:
+    """The media names in use, loaded from the database in one pass"""
+
+    def __init__(self):
+        from .models import StoredFile
+
+        self.names = set()
+        for model, field in file_fields():
+            queryset = model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            self.names.update(queryset.values_list(field, flat=True).iterator(chunk_size=10000))
+        # Counted but not saved on a row yet: an upload in the middle of its transaction
+        self.names.update(
+            StoredFile.objects.filter(references__gt=0).values_list('name', flat=True).iterator(chunk_size=10000)
+        )
+        self.stems = {posixpath.splitext(name)[0] for name in self.names}
+
+    def __contains__(self, name):
+        if name in self.names:
+            return True
+        # derivatives/<stem of the original>/<variant>.<ext>
+        prefix = images.DERIVATIVES_DIR + '/'
+        return name.startswith(prefix) and posixpath.dirname(name[len(prefix):]) in self.stems
+
+
+def list_directory(path):
+    """(files, subdirectories) of a directory as DirEntry lists; symlinks are left alone"""
+    files, directories = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append(entry)
+    except FileNotFoundError:
+        pass
+    return files, directories
+
+
+def find_orphans(references, roots=None, min_age=timedelta(hours=24), workers=None):
+    """
+    Yield an Orphan for every file under the media ``roots`` that is not in
+    ``references`` and was last modified more than ``min_age`` ago (uploads
+    are written before the row naming them is committed).
+    """
+    media_root = os.path.normpath(os.fspath(settings.MEDIA_ROOT))
+    cutoff = (timezone.now() - min_age).timestamp()
+    strip = len(media_root) + len(os.sep)
+    pending = [os.path.join(media_root, root) for root in (roots or media_roots())]
+    # Listing directories waits on the disk, not the GIL
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-scan') as pool:
+        in_flight = set()
+        while pending or in_flight:
+            while pending and len(in_flight) < workers * DIRECTORIES_IN_FLIGHT:
+                in_flight.add(pool.submit(list_directory, pending.pop()))
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, directories = future.result()
+                pending += directories
+                for entry in files:
+                    name = entry.path[strip:]
+                    if os.sep != '/':
+                        name = name.replace(os.sep, '/')
+                    if name in references:
+                        continue
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    if stat.st_mtime < cutoff:
+                        yield Orphan(name, stat.st_size)
+
+
+def still_referenced(names):
+    """The subset of ``names`` some row refers to, or an upload has counted, now"""
+    from .models import StoredFile
+
+    found = set()
+    for model, field in file_fields():
+        found.update(model._default_manager.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    found.update(StoredFile.objects.filter(name__in=names, references__gt=0).values_list('name', flat=True))
+    return found
+
+
+def quarantine(names, batch):
+    """Move media files into the quarantine batch directory, keeping their paths"""
+    media_root = os.fspath(settings.MEDIA_ROOT)
+    moved = 0
+    for name in names:
+        target = os.path.join(media_root, QUARANTINE_DIR, batch, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(os.path.join(media_root, name), target)
+        except FileNotFoundError:
+            continue
+        moved += 1
+    return moved
+
+
+def quarantine_batches():
+    """{batch name: datetime} of the quarantine directory"""
+    path = os.path.join(os.fspath(settings.MEDIA_ROOT), QUARANTINE_DIR)
+    batches = {}
+    for directory in list_directory(path)[1]:
+        batch = os.path.basename(directory)
+        try:
+            batches[batch] = datetime.strptime(batch, QUARANTINE_STAMP).replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue
+    return batches
+
+
+def purge(references, older_than, dry_run=False):
+    """
+    Put back the quarantined files that are in ``references`` again, and
+    delete the rest of the batches made before ``older_than``. Returns
+    (deleted, restored) counts.
+    """
+    media_root = os.fspath(settings.MEDIA_ROOT)
+    deleted = restored = 0
+    for batch, made in sorted(quarantine_batches().items()):
+        expired = made < older_than
+        batch_root = os.path.join(media_root, QUARANTINE_DIR, batch)
+        for directory, _, filenames in os.walk(batch_root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, batch_root).replace(os.sep, '/')
+                original = os.path.join(media_root, name)
+                if name in references and not os.path.exists(original):
+                    restored += 1
+                    if not dry_run:
+                        os.makedirs(os.path.dirname(original), exist_ok=True)
+                        os.replace(path, original)
+                elif expired:
+                    deleted += 1
+        if expired and not dry_run:
+            shutil.rmtree(batch_root, ignore_errors=True)
+    return deleted, restored
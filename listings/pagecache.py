@@ -0,0 +1,157 @@
+# listings/pagecache.py
+"""
+Whole public pages kept in the shared cache.
+
+The listing pages, listing details, the WhatsApp booking page and the sitemap
+render the same for every visitor, so a rendered page is stored under its
+host, path and normalized query string (empty and tracking parameters
+dropped, the rest sorted) and served to whoever asks next, headers and all.
+Only the parameters a view reads, with values from a small set, make a page
+cacheable: anything else (a search, a price, a made-up parameter or seed) is
+rendered without the cache, so a client cannot fill it with pages of its own
+choosing. Each page is
+stored with the cache tags of what it shows (see caching.py), so approving,
+editing or deleting a listing purges exactly the pages it appears on;
+PAGE_CACHE_TIMEOUT only bounds how long a page keeps its shuffled order.
+
+Nothing on these pages may depend on the visitor. The few per-visitor bits
+are filled in by the page itself (the owner's edit link on a listing comes
+from the listing_visitor view), and a request with flash messages waiting is
+rendered afresh so they are shown to the right person.
+
+Only one worker renders a page that is missing or stale (caching.single_flight);
+meanwhile the others serve the stale page, marked X-Page-Cache: stale, or
+with none to serve wait briefly for the fresh one.
+"""
+import hashlib
+import urllib.parse
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpResponse
+
+from . import caching
+
+# Query parameters that never change a page
+IGNORED_PARAMETERS = {'fbclid', 'gclid', 'msclkid', 'ref'}
+IGNORED_PREFIXES = ('utm_',)
+
+# Response headers that are not replayed from a cached page
+UNCACHED_HEADERS = {'content-length', 'x-page-cache'}
+
+
+def choice(values):
+    """Parameter cleaner accepting only ``values``"""
+    values = frozenset(values)
+
+    def clean(value):
+        if value not in values:
+            raise ValueError(value)
+        return value
+    return clean
+
+
+def positive_int(maximum):
+    """Parameter cleaner accepting the whole numbers 1 to ``maximum``"""
+    def clean(value):
+        number = int(value)
+        if not 1 <= number <= maximum:
+            raise ValueError(value)
+        return str(number)
+    return clean
+
+
+def normalized_query(request, parameters):
+    """
+    The query string of a cacheable request, its values cleaned by
+    ``parameters`` ({name: cleaner}) and sorted, or None when a parameter is
+    not one of them, is repeated, or a cleaner rejects its value (ValueError)
+    """
+    cleaned = []
+    for name, values in request.GET.lists():
+        values = [value for value in values if value]
+        if not values or name in IGNORED_PARAMETERS or name.startswith(IGNORED_PREFIXES):
+            continue
+        if name not in parameters or len(values) > 1:
+            return None
+        try:
+            cleaned.append((name, parameters[name](values[0])))
+        except ValueError:
+            return None
+    return urllib.parse.urlencode(sorted(cleaned))
+
+
+def page_key(request, query):
+    url = f'{request.get_host()}{request.path}?{query}'
+    return 'page:' + hashlib.sha256(url.encode()).hexdigest()
+
+
+def is_cacheable_request(request):
+    return request.method in ('GET', 'HEAD') and not len(messages.get_messages(request))
+
+
+def is_cacheable_response(request, response):
+    """A complete page that sets nothing for this visitor"""
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and not getattr(getattr(request, 'session', None), 'modified', False)
+    )
+
+
+def cached_headers(response):
+    return [(name, value) for name, value in response.items() if name.lower() not in UNCACHED_HEADERS]
+
+
+def cached_response(entry, state):
+    content, headers = entry
+    response = HttpResponse(content, headers=headers)
+    response['X-Page-Cache'] = state
+    return response
+
+
+def cached_page(tags, parameters=None):
+    """
+    Serve a view's pages from the cache. ``tags(request, *args, **kwargs)``
+    returns the cache tags of the page about to be rendered, or None when it
+    must not be cached. ``parameters`` ({name: cleaner}, see normalized_query)
+    are the query parameters the view reads; a request with any other is
+    rendered without the cache.
+    """
+    parameters = parameters or {}
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            query = normalized_query(request, parameters) if is_cacheable_request(request) else None
+            page_tags = tags(request, *args, **kwargs) if query is not None else None
+            if page_tags is None:
+                return view(request, *args, **kwargs)
+
+            key = page_key(request, query)
+            entry, fresh = caching.lookup(key)
+            if fresh:
+                return cached_response(entry, 'hit')
+
+            with caching.single_flight(key) as rendering:
+                if not rendering:
+                    if entry is not caching.MISSING:
+                        return cached_response(entry, 'stale')
+                    entry = caching.wait_for(key)
+                    if entry is not caching.MISSING:
+                        return cached_response(entry, 'hit')
+
+                versions = caching.tag_versions(page_tags)
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+                if is_cacheable_response(request, response):
+                    caching.store(key, (response.content, cached_headers(response)), versions,
+                                  settings.PAGE_CACHE_TIMEOUT)
+                    response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
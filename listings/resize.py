@@ -0,0 +1,154 @@
+# listings/resize.py
+"""
+Media images resized on request: MEDIA_URL r/<width>x<height>/<path>.
+
+Only the sizes in MEDIA_RESIZE_SIZES are made, so the cache cannot be filled
+with arbitrary ones. A resize is rendered once and kept in
+MEDIA_RESIZE_CACHE_DIR, sharded by the hash of its key,
+
+    <cache dir>/3f/a2/3fa2...c9.jpg
+
+and the key covers the original's modification time and size, so replacing an
+original gives new cache entries rather than stale ones. Concurrent misses for
+one entry are coalesced: the threads of a process wait on one lock per entry,
+and processes on a striped file lock, and whoever gets it second finds the
+file already there. The cache holds nothing else and can be emptied at any time.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+
+from . import images
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesced within a process only
+    fcntl = None
+
+# Output format by the original's extension; anything else becomes a JPEG
+FORMATS = {
+    '.png': ('PNG', '.png', {'optimize': True}),
+    '.webp': ('WEBP', '.webp', {'quality': 82, 'method': 4}),
+}
+JPEG = ('JPEG', '.jpg', {'quality': 82, 'optimize': True, 'progressive': True})
+EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+
+# Files locked by processes rendering the same entry (one of 256 by key)
+LOCK_STRIPES = 256
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def parse_size(size):
+    """(width, height, mode) of an allowed 'WxH' size; ValueError for others"""
+    if size not in settings.MEDIA_RESIZE_SIZES:
+        raise ValueError(f"{size!r} is not in MEDIA_RESIZE_SIZES")
+    width, height = size.split('x')
+    return int(width), int(height), settings.MEDIA_RESIZE_SIZES[size]
+
+
+def resized_url(name, size):
+    """URL of the media file ``name`` resized to ``size``"""
+    parse_size(size)
+    return f'{settings.MEDIA_URL}r/{size}/{name}'
+
+
+def original_path(name):
+    """Filesystem path of a resizable media image; FileNotFoundError unless there is one"""
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in EXTENSIONS or any(part.startswith('.') for part in name.split('/')):
+        raise FileNotFoundError(name)
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise FileNotFoundError(name)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(name)
+    return path
+
+
+def cache_path(name, size, stat):
+    extension = FORMATS.get(os.path.splitext(name)[1].lower(), JPEG)[1]
+    key = hashlib.sha256(f'{size}\0{name}\0{stat.st_mtime_ns}\0{stat.st_size}'.encode()).hexdigest()
+    return os.path.join(os.fspath(settings.MEDIA_RESIZE_CACHE_DIR), key[:2], key[2:4], key + extension)
+
+
+@contextmanager
+def coalesced(path):
+    """Hold the lock of one cache entry, shared by this process's threads and other processes"""
+    with _locks_guard:
+        lock, waiting = _locks.get(path, (None, 0))
+        lock = lock or threading.Lock()
+        _locks[path] = (lock, waiting + 1)
+    try:
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            stripe = int(os.path.basename(path)[:2], 16) % LOCK_STRIPES
+            lock_dir = os.path.join(os.fspath(settings.MEDIA_RESIZE_CACHE_DIR), 'locks')
+            os.makedirs(lock_dir, exist_ok=True)
+            with open(os.path.join(lock_dir, f'{stripe:02x}.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        with _locks_guard:
+            lock, waiting = _locks[path]
+            if waiting == 1:
+                del _locks[path]
+            else:
+                _locks[path] = (lock, waiting - 1)
+
+
+def render(original, size, path):
+    """Resize the image file ``original`` to ``size`` and write it atomically to ``path``"""
+    width, height, mode = parse_size(size)
+    image_format, _, options = FORMATS.get(os.path.splitext(original)[1].lower(), JPEG)
+    with open(original, 'rb') as file:
+        if image_format == 'JPEG':
+            image, _ = images.open_rgb(file, max_size=max(width, height))
+        else:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+    if mode == 'crop':
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    else:
+        image.thumbnail((width, height), Image.LANCZOS)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as output:
+        try:
+            image.save(output, image_format, **options)
+        except BaseException:
+            os.unlink(output.name)
+            raise
+    os.chmod(output.name, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+    os.replace(output.name, path)
+
+
+def resized(name, size):
+    """
+    Path of the cached resize of the media image ``name``, rendering it on a
+    miss. Raises FileNotFoundError when there is no such image.
+    """
+    parse_size(size)
+    original = original_path(name)
+    path = cache_path(name, size, os.stat(original))
+    if os.path.exists(path):
+        return path
+    with coalesced(path):
+        # Rendered by whoever held the lock before us
+        if not os.path.exists(path):
+            render(original, size, path)
+    return path
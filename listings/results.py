@@ -0,0 +1,87 @@
+# listings/results.py
+"""
+Shuffled ids of the approved listings matching a set of filters, kept in the shared cache.
+
+The listing pages ask for the same few filter combinations over and over,
+each in one of views.SHUFFLE_SEEDS shuffles. The ids a combination matches,
+in the order queryset.shuffled(seed) gives them (featured first), are read
+once per seed, by a query returning two columns of the matching rows, and
+stored under the canonical filters (defaults dropped, prices as numbers,
+amenities sorted) and the seed, so a combination has at most SHUFFLE_SEEDS
+entries. A page then only fetches its own 99 cards by primary key
+(ListingQuerySet.cards_by_ids) and its counts come from the stored ids.
+
+An entry is tagged with the narrowest tag covering every listing it could
+hold: its location, else its property type, else every listing; a listing
+moving in or out invalidates both its old and new location and property type
+(see caching.listing_tags).
+"""
+import hashlib
+import json
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from . import caching
+
+# How long an entry nothing invalidates is kept, in seconds
+TIMEOUT = 60 * 60
+# Cards of a page shown in the slider, featured ones if there are any
+SLIDER_SIZE = 3
+
+# ids of the matching listings in shuffled order; featured_count is how many are
+# of listing_type 'featured' and slider_ids the first SLIDER_SIZE of those
+Results = namedtuple('Results', 'ids featured_count slider_ids')
+
+
+def canonical_price(value):
+    if not value:
+        return None
+    try:
+        return str(Decimal(value).normalize())
+    except InvalidOperation:
+        return value  # the query rejects it as it always has
+
+
+def canonical(filters):
+    """Filter values (see views.get_filter_values) that select the same listings compare equal"""
+    return (
+        filters['location'],
+        filters['property_type'],
+        canonical_price(filters['min_price']),
+        canonical_price(filters['max_price']),
+        filters['listing_type'],
+        sorted(set(filters['amenities'])),
+    )
+
+
+def results_key(filters, seed):
+    return f'results:{seed}:' + hashlib.sha256(json.dumps(canonical(filters)).encode()).hexdigest()
+
+
+def results_tags(filters):
+    if filters['location']:
+        return {caching.location_tag(filters['location'])}
+    if filters['property_type']:
+        return {caching.property_type_tag(filters['property_type'])}
+    return {caching.ALL_LISTINGS}
+
+
+def fetch(queryset, seed):
+    ids, featured = [], []
+    for pk, listing_type in queryset.shuffled(seed).values_list('pk', 'listing_type'):
+        ids.append(pk)
+        if listing_type == 'featured':
+            featured.append(pk)
+    return Results(ids, len(featured), featured[:SLIDER_SIZE] or ids[:SLIDER_SIZE])
+
+
+def get(filters, seed, queryset):
+    """
+    Results of ``queryset`` shuffled with ``seed``. ``filters`` are the values
+    get_filtered_listings() built ``queryset`` from; without them (None)
+    nothing is cached.
+    """
+    if filters is None:
+        return fetch(queryset, seed)
+    return caching.get_or_set(results_key(filters, seed), results_tags(filters),
+                              lambda: fetch(queryset, seed), TIMEOUT)
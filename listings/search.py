@@ -0,0 +1,205 @@
+# listings/search.py
+"""
+Keyword search over listings.
+
+On SQLite the listings are indexed in an FTS5 table (one row per listing,
+rowid = listing id) kept up to date by the Listing save/delete signals, and
+by the bulk signals of bulk_create() and queryset.update() once they
+commit, and ranked with bm25(). Other databases, or SQLite builds without
+FTS5, fall back to token-wise icontains matching with a weighted score.
+
+Every listing is indexed, approved or not, for the admin; a search runs
+within a queryset (the approved listings a page's filters leave), joined in
+the same SQL before results are cut to MAX_RESULTS, so filtering afterwards
+never leaves a short page.
+"""
+import re
+
+from django.db import connection, transaction, OperationalError
+from django.db.models import Case, IntegerField, Q, Value, When
+
+FTS_TABLE = 'listings_listing_fts'
+
+# Indexed columns and their bm25 weights - estate names rank highest
+COLUMNS = ('title', 'specific_location', 'location', 'description', 'address', 'host')
+WEIGHTS = {
+    'title': 5.0,
+    'specific_location': 10.0,
+    'location': 4.0,
+    'description': 1.0,
+    'address': 2.0,
+    'host': 1.0,
+}
+# Listing fields the indexed columns are made of (see document_for)
+INDEXED_FIELDS = frozenset({
+    'title', 'specific_location', 'location', 'description', 'address', 'host_name', 'host_email', 'user', 'user_id',
+})
+
+# Host names and emails are searchable from the admin only
+PUBLIC_COLUMNS = ('title', 'specific_location', 'location', 'description', 'address')
+
+# Model fields used by the fallback search, per indexed column
+FALLBACK_FIELDS = {
+    'title': ('title',),
+    'specific_location': ('specific_location',),
+    'location': ('location',),
+    'description': ('description',),
+    'address': ('address',),
+    'host': ('host_name', 'host_email', 'user__username', 'user__email'),
+}
+
+MAX_RESULTS = 1000
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_fts_available = None
+
+
+def tokenize(query):
+    """Lower-cased word tokens of a search query"""
+    return [token.lower() for token in TOKEN_RE.findall(query or '')][:10]
+
+
+def fts_available():
+    """Whether the FTS5 index table exists on the default database"""
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+def create_index(schema_editor):
+    """Create the FTS5 table; a no-op where FTS5 is not available"""
+    global _fts_available
+    _fts_available = None
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(COLUMNS)}, "
+            f"tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except OperationalError:
+        # SQLite compiled without FTS5 - the fallback search is used instead
+        return False
+    return True
+
+
+def drop_index(schema_editor):
+    global _fts_available
+    _fts_available = None
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def document_for(listing):
+    """Column values indexed for a listing (a Listing or historical model instance)"""
+    locations = dict(listing._meta.get_field('location').choices)
+    user = getattr(listing, 'user', None)
+    host = [listing.host_name, listing.host_email]
+    if user is not None:
+        host += [user.username, user.email]
+    return (
+        listing.title,
+        listing.specific_location,
+        f"{locations.get(listing.location, listing.location)} {listing.location}",
+        listing.description or '',
+        listing.address or '',
+        ' '.join(value for value in host if value),
+    )
+
+
+def index_listings(listings):
+    """Insert or replace the index rows of the given listings"""
+    if not fts_available():
+        return
+    rows = [(listing.pk, *document_for(listing)) for listing in listings]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(COLUMNS)}) "
+            f"VALUES (%s, {', '.join(['%s'] * len(COLUMNS))})",
+            rows,
+        )
+
+
+def unindex_listing(pk):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def rebuild_index(queryset, batch_size=1000):
+    """Re-index every listing in the queryset, returning the number indexed"""
+    if not fts_available():
+        return 0
+    count = 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        batch = []
+        for listing in queryset.select_related('user').iterator(chunk_size=batch_size):
+            batch.append(listing)
+            if len(batch) >= batch_size:
+                index_listings(batch)
+                count += len(batch)
+                batch = []
+        index_listings(batch)
+        count += len(batch)
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def match_expression(tokens, columns):
+    """FTS5 MATCH string: every token must match, the last one as a prefix"""
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return f"{{{' '.join(columns)}}} : ({' '.join(terms)})"
+
+
+def search_listing_ids(query, queryset, limit=MAX_RESULTS, admin=False):
+    """
+    Ids of the listings of ``queryset`` matching every word of ``query``, best
+    match first. Public searches skip the host contact columns.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    columns = COLUMNS if admin else PUBLIC_COLUMNS
+    if fts_available():
+        weights = ', '.join(str(WEIGHTS[column]) for column in COLUMNS)
+        within, within_params = queryset.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({within}) "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+                [match_expression(tokens, columns), *within_params, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    return fallback_search_ids(tokens, columns, limit, queryset)
+
+
+def fallback_search_ids(tokens, columns, limit, queryset):
+    """icontains search scored with the same column weights as bm25"""
+    score = Value(0, output_field=IntegerField())
+    for token in tokens:
+        token_match = Q()
+        for column in columns:
+            for field in FALLBACK_FIELDS[column]:
+                lookup = Q(**{f'{field}__icontains': token})
+                token_match |= lookup
+                score = score + Case(When(lookup, then=Value(int(WEIGHTS[column] * 10))),
+                                     default=Value(0), output_field=IntegerField())
+        queryset = queryset.filter(token_match)
+    return list(
+        queryset.annotate(search_score=score)
+        .order_by('-search_score', '-created_at')
+        .values_list('pk', flat=True)[:limit]
+    )
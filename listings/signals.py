@@ -0,0 +1,298 @@
+# listings/signals.py
+import logging
+import os
+import posixpath
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import (Booking, Listing, ListingImage, PhotoUpload, listings_pre_bulk_update, listings_bulk_updated,
+                     listings_bulk_created, pk_batches)
+from . import caching, clusters, facets, geo, images, search, storage
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Listing)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """Re-index a listing whenever it is saved"""
+    if raw:
+        return
+    search.index_listings([instance])
+    geo.index_listings([instance])
+
+
+@receiver(post_delete, sender=Listing)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Drop deleted listings from the search indexes"""
+    search.unindex_listing(instance.pk)
+    geo.unindex_listing(instance.pk)
+
+
+def reindex_on_commit(pks, indexes):
+    """
+    Re-index listings written in bulk in the ``indexes`` (the search and geo
+    modules), as stored once the transaction commits
+    """
+    pks = [pk for pk in pks if pk is not None]
+
+    def reindex():
+        for batch in pk_batches(pks):
+            listings = list(Listing.objects.filter(pk__in=batch).select_related('user'))
+            for index in indexes:
+                index.index_listings(listings)
+
+    if pks and indexes:
+        transaction.on_commit(reindex)
+
+
+@receiver(listings_bulk_created, sender=Listing)
+def index_bulk_created(sender, objs, **kwargs):
+    reindex_on_commit([listing.pk for listing in objs], [search, geo])
+
+
+@receiver(listings_bulk_updated, sender=Listing)
+def index_bulk_updated(sender, pks, fields, **kwargs):
+    reindex_on_commit(pks, [index for index in (search, geo) if fields & index.INDEXED_FIELDS])
+
+
+@receiver(post_save, sender=Listing)
+def invalidate_map_clusters(sender, instance, created=False, raw=False, **kwargs):
+    """Cached map tiles go stale when a listing moves or changes visibility"""
+    if raw:
+        return
+    if created or instance.changed_fields(*clusters.CLUSTER_FIELDS):
+        clusters.invalidate()
+
+
+@receiver(post_delete, sender=Listing)
+def invalidate_map_clusters_on_delete(sender, instance, **kwargs):
+    clusters.invalidate()
+
+
+@receiver(listings_bulk_updated, sender=Listing)
+def invalidate_map_clusters_on_update(sender, pks, fields, **kwargs):
+    """Admin actions and other queryset.update() calls"""
+    if fields & clusters.CLUSTER_FIELDS:
+        clusters.invalidate()
+
+
+def facet_row_before(instance):
+    """Facet fields of a listing as last loaded, falling back to the stored row"""
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if all(field in loaded for field in facets.FACET_FIELDS):
+        return {field: loaded[field] for field in facets.FACET_FIELDS}
+    return facets.stored_row(instance)
+
+
+@receiver(pre_save, sender=Listing)
+def remember_facet_row(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._facet_row = None if instance._state.adding else facet_row_before(instance)
+
+
+@receiver(post_save, sender=Listing)
+def update_facet_counts(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Move a saved listing's contribution between facet values"""
+    if raw:
+        return
+    old_row = getattr(instance, '_facet_row', None)
+    if update_fields is None or old_row is None:
+        new_row = facets.listing_row(instance)
+    else:
+        new_row = {**old_row, **{field: getattr(instance, field)
+                                 for field in facets.FACET_FIELDS if field in update_fields}}
+    facets.move(old_row, new_row)
+
+
+@receiver(pre_delete, sender=Listing)
+def remember_deleted_facet_row(sender, instance, **kwargs):
+    if set(facets.FACET_FIELDS) & instance.get_deferred_fields():
+        instance._facet_row = facets.stored_row(instance)
+    else:
+        instance._facet_row = facets.listing_row(instance)
+
+
+@receiver(post_delete, sender=Listing)
+def remove_from_facet_counts(sender, instance, **kwargs):
+    facets.move(getattr(instance, '_facet_row', None), None)
+
+
+def bulk_facet_counts(pks):
+    counts = Counter()
+    for batch in pk_batches(pks):
+        counts.update(facets.queryset_counts(Listing.objects.filter(pk__in=batch)))
+    return counts
+
+
+@receiver(listings_pre_bulk_update, sender=Listing)
+def remove_bulk_updated_from_facet_counts(sender, pks, fields, **kwargs):
+    """queryset.update(): take the rows out before the UPDATE..."""
+    if fields & set(facets.FACET_FIELDS):
+        counts = bulk_facet_counts(pks)
+        facets.apply({key: -count for key, count in counts.items()})
+
+
+@receiver(listings_bulk_updated, sender=Listing)
+def add_bulk_updated_to_facet_counts(sender, pks, fields, **kwargs):
+    """...and count them again afterwards"""
+    if fields & set(facets.FACET_FIELDS):
+        facets.apply(bulk_facet_counts(pks))
+
+
+@receiver(listings_bulk_created, sender=Listing)
+def add_bulk_created_to_facet_counts(sender, objs, **kwargs):
+    counts = Counter()
+    for listing in objs:
+        counts.update(facets.facet_keys(facets.listing_row(listing)))
+    facets.apply(counts)
+
+
+def cache_row(instance, row=None):
+    """(pk, location, property_type) of a listing, or as in a remembered facet row"""
+    row = row or {'location': instance.location, 'property_type': instance.property_type}
+    return instance.pk, row['location'], row['property_type']
+
+
+@receiver(post_save, sender=Listing)
+def invalidate_cached_listing(sender, instance, raw=False, **kwargs):
+    """Cached entries of the listing, and of the location and property type it is (or was) in"""
+    if raw:
+        return
+    rows = [cache_row(instance)]
+    old_row = getattr(instance, '_facet_row', None)  # see remember_facet_row
+    if old_row is not None:
+        rows.append(cache_row(instance, old_row))
+    caching.invalidate_on_commit(caching.listing_tags(*rows))
+
+
+@receiver(post_delete, sender=Listing)
+def invalidate_cached_deleted_listing(sender, instance, **kwargs):
+    caching.invalidate_on_commit(caching.listing_tags(cache_row(instance, getattr(instance, '_facet_row', None))))
+
+
+@receiver(listings_pre_bulk_update, sender=Listing)
+def invalidate_cached_listings_before_update(sender, pks, fields, **kwargs):
+    """queryset.update() (the admin bulk actions): where the rows were..."""
+    if fields & {'location', 'property_type'}:
+        caching.invalidate_on_commit(caching.stored_listing_tags(pks))
+
+
+@receiver(listings_bulk_updated, sender=Listing)
+def invalidate_cached_listings_on_update(sender, pks, fields, **kwargs):
+    """...and where they are now"""
+    caching.invalidate_on_commit(caching.stored_listing_tags(pks))
+
+
+@receiver(listings_bulk_created, sender=Listing)
+def invalidate_cached_bulk_created(sender, objs, **kwargs):
+    caching.invalidate_on_commit(caching.listing_tags(*(cache_row(listing) for listing in objs)))
+
+
+@receiver(post_save, sender=ListingImage)
+@receiver(post_delete, sender=ListingImage)
+def invalidate_cached_listing_photos(sender, instance, raw=False, **kwargs):
+    """Pages showing the listing, and who may see the photo (and the one it replaced)"""
+    if raw:
+        return
+    listing_id = instance.listing_id
+    names = {instance.image.name, getattr(instance, '_loaded_name', None)}
+    photo_tags = {caching.photo_tag(posixpath.splitext(name)[0]) for name in names if name}
+    transaction.on_commit(lambda: caching.invalidate(caching.stored_listing_tags([listing_id]) | photo_tags))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_cached_booked_listing(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    caching.invalidate_on_commit([caching.listing_tag(instance.listing_id)])
+
+
+def generate_image_derivatives(pk):
+    image = ListingImage.objects.filter(pk=pk).first()
+    if image is None:
+        return
+    try:
+        image.generate_derivatives(force=True)
+    except Exception:
+        # A bad upload must not fail the save; the original is still served
+        logger.exception("Could not generate image derivatives for %s", image.image.name)
+        return
+    # Saved with update(), which sends no signals; pages now link the variants
+    caching.invalidate(caching.stored_listing_tags([image.listing_id]))
+
+
+def generate_image_derivatives_in_background(pk):
+    try:
+        generate_image_derivatives(pk)
+    finally:
+        # The pool's threads outlive any request, which is what closes connections
+        connection.close()
+
+
+@receiver(post_save, sender=ListingImage)
+def make_image_derivatives(sender, instance, raw=False, **kwargs):
+    """
+    Resize a newly uploaded photo once it is committed, in the derivatives
+    pool (images.executor()) rather than before the response is sent; until
+    then its pages show the original
+    """
+    if raw or instance.derivatives or not instance.image:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: images.executor().submit(generate_image_derivatives_in_background, pk))
+
+
+@receiver(post_save, sender=ListingImage)
+def count_added_image(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        Listing.objects.filter(pk=instance.listing_id).update(image_count=F('image_count') + 1)
+
+
+@receiver(post_delete, sender=ListingImage)
+def count_removed_image(sender, instance, **kwargs):
+    Listing.objects.filter(pk=instance.listing_id, image_count__gt=0).update(image_count=F('image_count') - 1)
+
+
+@receiver(pre_save, sender=ListingImage)
+def remember_stored_name(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or hasattr(instance, '_loaded_name'):
+        return
+    instance._loaded_name = (ListingImage.objects.filter(pk=instance.pk)
+                             .values_list('image', flat=True).first())
+
+
+@receiver(post_save, sender=ListingImage)
+def count_file_references(sender, instance, created=False, raw=False, **kwargs):
+    """A new or replaced photo takes a reference to its file and drops the old one"""
+    if raw:
+        return
+    old_name = None if created else instance._loaded_name
+    if instance.image.name != old_name:
+        storage.acquire([instance.image.name])
+        storage.release([old_name])
+    instance._loaded_name = instance.image.name
+
+
+@receiver(post_delete, sender=ListingImage)
+def release_file_reference(sender, instance, **kwargs):
+    storage.release([instance.image.name])
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@receiver(post_delete, sender=PhotoUpload)
+def remove_chunked_upload_file(sender, instance, **kwargs):
+    """Delete the assembled bytes of a chunked upload once it is gone for good"""
+    path = instance.path
+    transaction.on_commit(lambda: remove_file(path))
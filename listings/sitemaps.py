@@ -1,6 +1,8 @@
 from django.contrib.sitemaps import Sitemap
 from django.urls import reverse
+from django.utils.functional import cached_property
 from .models import Listing
+from . import facets
 from django.utils import timezone
 
 
@@ -70,9 +72,13 @@ class LocationSitemap(Sitemap):
             return latest_listing.updated_at
         return None
 
+    @cached_property
+    def listing_counts(self):
+        return facets.FacetCounts.load().by_value(facets.LOCATION)
+
     def priority(self, location_code):
         # Higher priority for locations with more listings
-        count = Listing.objects.filter(location=location_code, is_approved=True).count()
+        count = self.listing_counts.get(location_code, 0)
         if count > 50:
             return 0.9
         elif count > 20:
@@ -137,9 +143,13 @@ class PropertyTypeSitemap(Sitemap):
             return latest_listing.updated_at
         return None
 
+    @cached_property
+    def listing_counts(self):
+        return facets.FacetCounts.load().by_value(facets.PROPERTY_TYPE)
+
     def priority(self, property_code):
         # Higher priority for property types with more listings
-        count = Listing.objects.filter(property_type=property_code, is_approved=True).count()
+        count = self.listing_counts.get(property_code, 0)
         if count > 50:
             return 0.8
         elif count > 20:
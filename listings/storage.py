@@ -0,0 +1,113 @@
+# listings/storage.py
+"""
+Content-addressed storage for listing photos.
+
+A photo is stored under the SHA-256 of its bytes, e.g.
+
+    listings/photos/3f/3fa2...c9.jpg
+
+so a host uploading the same picture to several listings, or again while
+editing one, stores it once. StoredFile counts the ListingImage rows that
+refer to each file (see signals.py). A file whose last reference is gone is
+not deleted then: an upload of the same bytes in another transaction may
+already have found it on disk and be about to take a reference, so it is
+left to collect_orphaned_media, which quarantines it once nothing refers to
+it and puts it back if something does again (see orphans.py). A name always
+stands for the same bytes, so these files can be served with far-future
+immutable cache headers.
+"""
+import hashlib
+import posixpath
+import re
+from collections import Counter
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}\.[A-Za-z0-9]+$')
+
+# Cache-Control of content-addressed files
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def content_hash(content):
+    """SHA-256 hex digest of a File, read in chunks"""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def content_addressed_name(name, content):
+    """Name the bytes of ``content`` are stored under, for a file uploaded as ``name``"""
+    digest = content_hash(content)
+    extension = posixpath.splitext(name)[1].lower()
+    return posixpath.join(posixpath.dirname(name), digest[:2], digest + extension)
+
+
+def is_content_addressed(name):
+    return CONTENT_ADDRESSED_NAME.search(name) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage naming files by content: <upload_to>/<2 hex>/<sha256><ext>.
+    Saving bytes that are already stored writes nothing.
+    """
+
+    def __init__(self, **kwargs):
+        # Two uploads of the same bytes racing to one name may both write it
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = content_addressed_name(name, content)
+        if not self.exists(name):
+            name = self._save(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+
+def photo_storage():
+    """Storage of ListingImage.image (a callable, so settings are read lazily)"""
+    return ContentAddressedStorage()
+
+
+def acquire(names):
+    """Count one more reference per occurrence of a name in ``names``"""
+    from .models import StoredFile
+
+    counts = Counter(name for name in names if name)
+    if not counts:
+        return
+    with transaction.atomic():
+        StoredFile.objects.bulk_create([StoredFile(name=name) for name in counts], ignore_conflicts=True)
+        StoredFile.objects.filter(name__in=counts).update(references=F('references') + Case(
+            *[When(name=name, then=Value(count)) for name, count in counts.items()], default=Value(0),
+        ))
+
+
+def release(names):
+    """
+    Count one reference less per occurrence of a name in ``names``. The files
+    left without references stay until collect_orphaned_media quarantines them.
+    """
+    from .models import StoredFile
+
+    counts = Counter(name for name in names if name)
+    if not counts:
+        return
+    with transaction.atomic():
+        StoredFile.objects.filter(name__in=counts).update(references=F('references') - Case(
+            *[When(name=name, then=Value(count)) for name, count in counts.items()], default=Value(0),
+        ))
+        StoredFile.objects.filter(name__in=counts, references__lte=0).delete()
@@ -0,0 +1,35 @@
+from django import template
+
+from listings import images, resize
+
+register = template.Library()
+
+
+@register.filter
+def variant(image, spec='card'):
+    """URL of a resized variant of a ListingImage: {{ img|variant:'thumb' }} or {{ img|variant:'card.webp' }}"""
+    if not image:
+        return ''
+    return image.variant_url(spec)
+
+
+@register.filter
+def srcset(image, extension='jpg'):
+    """srcset of the variants of a ListingImage: {{ img|srcset }} or {{ img|srcset:'webp' }}"""
+    if not image:
+        return ''
+    return image.srcset(extension)
+
+
+@register.filter
+def resized(image, size):
+    """URL of an image resized on request to one of MEDIA_RESIZE_SIZES: {{ img|resized:'1200x630' }}"""
+    if not image:
+        return ''
+    return resize.resized_url(getattr(image, 'name', image), size)
+
+
+@register.simple_tag
+def image_sizes(name):
+    """sizes attribute for a layout slot: {% image_sizes 'card' %}"""
+    return images.SIZES[name]
@@ -1,3 +1,765 @@
-from django.test import TestCase
+import hashlib
+import io
+import math
+import posixpath
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.db.models import F, Value
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import clusters, delivery, drafts, facets, geo, images, keyset, results, search, signals, storage, uploads
+from .models import Listing, ListingDraft, ListingImage, StoredFile
+from .views import get_filter_values
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_listing(title, **fields):
+    fields = {
+        'description': 'A nice place',
+        'property_type': Listing.PROPERTY_TYPES[0][0],
+        'location': Listing.LOCATIONS[0][0],
+        'specific_location': 'Estate',
+        'host_name': 'Host',
+        'host_phone': '+254712345678',
+        'host_whatsapp': '+254712345678',
+        'price_per_night': 5000,
+        'is_approved': True,
+        'slug': title.lower().replace(' ', '-'),
+        **fields,
+    }
+    return Listing.objects.create(title=title, **fields)
+
+
+def jpeg(color=(200, 100, 50)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def submission(**fields):
+    """POST data of a valid new listing form, photo included"""
+    return {
+        'title': 'Garden Flat',
+        'property_type': Listing.PROPERTY_TYPES[0][0],
+        'transaction_type': 'shortlet',
+        'location': Listing.LOCATIONS[0][0],
+        'specific_location': 'Estate',
+        'host_phone': '+254712345678',
+        'host_whatsapp': '+254712345678',
+        'guests': 2, 'bedrooms': 1, 'beds': 1, 'bathrooms': 1,
+        'price': 5000,
+        'listing_type': 'free',
+        'main_image': SimpleUploadedFile('main.jpg', jpeg(), content_type='image/jpeg'),
+        **fields,
+    }
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class PageCacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_editing_a_listing_evicts_its_page(self):
+        listing = make_listing('Quiet Cottage')
+        url = reverse('listing_detail', args=[listing.slug])
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.title = 'Loud Cottage'
+            listing.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Loud Cottage')
+
+    def test_approving_a_listing_evicts_the_pages_listing_it(self):
+        make_listing('Shown Villa')
+        hidden = make_listing('Hidden Villa', is_approved=False)
+        self.assertNotContains(self.client.get('/'), 'Hidden Villa')
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'hit')
+
+        # As the admin's bulk approval does
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.filter(pk=hidden.pk).update(is_approved=True)
+
+        response = self.client.get('/')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Hidden Villa')
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class MovedListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_location_pages_follow_a_moved_listing(self):
+        (old, _), (new, new_name) = Listing.LOCATIONS[:2]
+        make_listing('Anchor House', location=new, specific_location='Anchor Estate')
+        moving = make_listing('Wandering Villa', location=old, specific_location='Wandering Estate')
+        old_url = reverse('listings_by_location', args=[old.lower()])
+        new_url = reverse('listings_by_location', args=[new.lower()])
+        self.assertContains(self.client.get(old_url), 'Wandering Villa')
+        self.assertEqual(self.client.get(new_url).context['total_listings'], 1)
+
+        # update() leaves updated_at, and so the card's key, as it was
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.filter(pk=moving.pk).update(location=new)
+
+        self.assertNotContains(self.client.get(old_url), 'Wandering Villa')
+        response = self.client.get(new_url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual(response.context['total_listings'], 2)
+        self.assertContains(response, f'{new_name} • Wandering Estate')
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class KeysetCursorTests(TestCase):
+    def setUp(self):
+        for number, price in enumerate([3000, 1000, 5000, 2000, 4000, 2000, 6000]):
+            make_listing(f'Listing {number}', price_per_night=price,
+                         listing_type='featured' if number == 4 else 'free')
+
+    def test_pages_follow_their_cursors(self):
+        expected = list(Listing.objects.order_by('-is_featured', 'effective_price', 'id').values_list('pk', flat=True))
+        seen, cursor = [], None
+        while True:
+            page = keyset.paginate(Listing.objects.all(), 'price_asc', cursor, per_page=3)
+            seen += [listing.id for listing in page]
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+            self.assertEqual(keyset.decode_cursor(cursor, 'price_asc')[2], seen[-1])
+        self.assertEqual(seen, expected)
+
+    def test_tampered_cursors_are_rejected(self):
+        cursor = keyset.paginate(Listing.objects.all(), 'price_asc', per_page=3).next_cursor
+        value, signature = cursor.rsplit(':', 1)
+        forged = keyset.encode_cursor('price_asc', (False,), 1, 1).rsplit(':', 1)[0] + ':' + signature
+        self.assertIsNone(keyset.decode_cursor(forged, 'price_asc'))
+        self.assertIsNone(keyset.decode_cursor(value, 'price_asc'))
+        # Signed for another sort
+        self.assertIsNone(keyset.decode_cursor(cursor, 'price_desc'))
+
+        first_page = keyset.paginate(Listing.objects.all(), 'price_asc', per_page=3)
+        self.assertEqual([listing.id for listing in keyset.paginate(Listing.objects.all(), 'price_asc', forged, 3)],
+                         [listing.id for listing in first_page])
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class StoredFileTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def test_acquire_and_release_count_references(self):
+        storage.acquire(['listings/photos/a.jpg', 'listings/photos/a.jpg', 'listings/photos/b.jpg'])
+        self.assertEqual(StoredFile.objects.get(name='listings/photos/a.jpg').references, 2)
+        self.assertEqual(StoredFile.objects.get(name='listings/photos/b.jpg').references, 1)
+
+        storage.release(['listings/photos/a.jpg', 'listings/photos/b.jpg'])
+        self.assertEqual(StoredFile.objects.get(name='listings/photos/a.jpg').references, 1)
+        self.assertFalse(StoredFile.objects.filter(name='listings/photos/b.jpg').exists())
+
+    def test_photos_share_one_file_until_the_last_goes(self):
+        first = ListingImage.objects.create(listing=make_listing('First'), position=0,
+                                            image=SimpleUploadedFile('one.jpg', jpeg()))
+        second = ListingImage.objects.create(listing=make_listing('Second'), position=0,
+                                             image=SimpleUploadedFile('two.jpg', jpeg()))
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(StoredFile.objects.get(name=name).references, 2)
+
+        first.delete()
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+        second.delete()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        # Left for collect_orphaned_media, not deleted under a racing upload
+        self.assertTrue(storage.photo_storage().exists(name))
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False, UPLOAD_MAX_FILE_SIZE=1024)
+class UploadLimitTests(TestCase):
+    def test_oversize_photo_is_a_form_error(self):
+        user = User.objects.create_user('host', password='password')
+        self.client.force_login(user)
+        photo = SimpleUploadedFile('big.jpg', jpeg() + b'\0' * 2048, content_type='image/jpeg')
+
+        response = self.client.post(reverse('advertise_bnb'), {'title': 'Too Big', 'main_image': photo})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Files can be at most', response.context['form'].errors['main_image'][0])
+        self.assertFalse(Listing.objects.exists())
+
+    def test_other_uploads_keep_the_default_handlers(self):
+        photo = SimpleUploadedFile('big.jpg', jpeg() + b'\0' * 2048, content_type='image/jpeg')
+        request = RequestFactory().post('/', {'picture': photo})
+        self.assertNotIsInstance(request.FILES['picture'], uploads.RejectedUpload)
+        self.assertGreater(request.FILES['picture'].size, 1024)
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+@mock.patch('listings.models.PK_BATCH_SIZE', 2)
+class BulkUpdateTests(TestCase):
+    def setUp(self):
+        for number in range(5):
+            make_listing(f'Bulk {number}', price_per_night=1000 * (number + 1))
+
+    def test_derived_columns_follow_an_update_in_batches(self):
+        Listing.objects.update(pool=Value(True), price_per_night=F('price_per_night') + 500)
+        self.assertEqual(Listing.objects.with_amenities(['pool']).count(), 5)
+        self.assertEqual(sorted(Listing.objects.values_list('effective_price', flat=True)),
+                         [1500, 2500, 3500, 4500, 5500])
+
+    def test_facet_counts_follow_an_update_in_batches(self):
+        (old, _), (new, _) = Listing.LOCATIONS[:2]
+        Listing.objects.exclude(title='Bulk 0').update(location=new)
+        counts = facets.FacetCounts.load().by_value(facets.LOCATION)
+        self.assertEqual((counts.get(old, 0), counts.get(new, 0)), (1, 4))
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class SearchTests(TestCase):
+    def test_saved_listings_are_found_by_estate_first(self):
+        in_title = make_listing('Runda Gardens Flat', specific_location='Kileleshwa')
+        in_estate = make_listing('Garden Flat', specific_location='Runda')
+        self.assertEqual(search.search_listing_ids('runda', Listing.objects.all()), [in_estate.pk, in_title.pk])
+
+    def test_bulk_created_listings_are_found(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.bulk_create([
+                Listing(title=f'Lakeside Cabin {number}', slug=f'lakeside-{number}', description='By the water',
+                        property_type=Listing.PROPERTY_TYPES[0][0], location=Listing.LOCATIONS[0][0],
+                        specific_location='Naivasha', host_name='Host', host_phone='+254712345678',
+                        host_whatsapp='+254712345678', is_approved=True)
+                for number in range(3)
+            ])
+        self.assertEqual(len(search.search_listing_ids('lakeside', Listing.objects.all())), 3)
+        response = self.client.get('/', {'q': 'lakeside'})
+        self.assertEqual(response.context['total_listings'], 3)
+
+    def test_updated_listings_are_found_by_their_new_text(self):
+        listing = make_listing('Plain House')
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.filter(pk=listing.pk).update(title='Baobab Lodge')
+        self.assertEqual(search.search_listing_ids('baobab', Listing.objects.all()), [listing.pk])
+        self.assertEqual(search.search_listing_ids('plain', Listing.objects.all()), [])
+
+    def test_results_are_capped_within_the_queryset(self):
+        make_listing('Coral Villa Coral Villa', is_approved=False)
+        approved = make_listing('Coral Villa')
+        self.assertEqual(search.search_listing_ids('coral', Listing.objects.approved(), limit=1), [approved.pk])
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class GeoSearchTests(TestCase):
+    CENTRE = {'lat': -1.2921, 'lng': 36.8219}
+
+    def nearby(self, **params):
+        response = self.client.get(reverse('nearby_listings'), {**self.CENTRE, **params})
+        return [result['id'] for result in response.json()['results']]
+
+    def test_nearest_first_within_the_radius(self):
+        far = make_listing('Far Flat', latitude=-1.3121, longitude=36.8219)
+        near = make_listing('Near Flat', latitude=-1.2931, longitude=36.8219)
+        make_listing('Mombasa Flat', latitude=-4.0435, longitude=39.6682)
+        self.assertEqual(self.nearby(radius_km=5), [near.pk, far.pk])
+        self.assertEqual(self.nearby(radius_km=1), [near.pk])
+
+    def test_bulk_created_listings_are_found(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            created = Listing.objects.bulk_create([
+                Listing(title=f'Bulk Flat {number}', slug=f'bulk-flat-{number}', description='Central',
+                        property_type=Listing.PROPERTY_TYPES[0][0], location=Listing.LOCATIONS[0][0],
+                        specific_location='CBD', host_name='Host', host_phone='+254712345678',
+                        host_whatsapp='+254712345678', is_approved=True,
+                        latitude=-1.2921 + number / 1000, longitude=36.8219)
+                for number in range(3)
+            ])
+        self.assertEqual(self.nearby(), [listing.pk for listing in created])
+
+    def test_moved_listings_follow_their_coordinates(self):
+        listing = make_listing('Moving Flat', latitude=-1.2921, longitude=36.8219)
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.filter(pk=listing.pk).update(latitude=-4.0435, longitude=39.6682)
+        self.assertEqual(self.nearby(), [])
+        self.assertEqual([pk for pk, _ in geo.nearest(Listing.objects.all(), -4.0435, 39.6682, 10, 5)],
+                         [listing.pk])
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class ClusterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tile(self, zoom, lat=-1.2921, lng=36.8219):
+        n = 2 ** zoom
+        x = int((lng + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+        return self.client.get(reverse('listing_clusters', args=[zoom, x, y])).json()
+
+    def test_close_listings_are_clustered_below_the_marker_zoom(self):
+        first = make_listing('First Flat', latitude=-1.2921, longitude=36.8219)
+        make_listing('Second Flat', latitude=-1.2922, longitude=36.8220)
+        tile = self.tile(10)
+        self.assertEqual([cluster['count'] for cluster in tile['clusters']], [2])
+        self.assertEqual(tile['markers'], [])
+        self.assertIn(first.pk, [marker['id'] for marker in self.tile(clusters.MAX_CLUSTER_ZOOM)['markers']])
+
+    def test_tiles_expire_once_the_move_commits(self):
+        listing = make_listing('Moving Flat', latitude=-1.2921, longitude=36.8219)
+        self.assertEqual([marker['id'] for marker in self.tile(12)['markers']], [listing.pk])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            listing.latitude, listing.longitude = -4.0435, 39.6682
+            listing.save()
+            # Readers keep the cached tile until the move is visible to them
+            self.assertEqual([marker['id'] for marker in self.tile(12)['markers']], [listing.pk])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.tile(12)['markers'], [])
+
+    def test_tiles_expire_after_update(self):
+        listing = make_listing('Hidden Flat', latitude=-1.2921, longitude=36.8219)
+        self.assertEqual([marker['id'] for marker in self.tile(12)['markers']], [listing.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.filter(pk=listing.pk).update(is_approved=False)
+        self.assertEqual(self.tile(12)['markers'], [])
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False, MEDIA_ACCEL='')
+class ProtectedMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('host', password='password')
+        self.listing = make_listing('Pending Flat', is_approved=False, user=self.owner)
+        self.photo = ListingImage.objects.create(listing=self.listing, position=0,
+                                                 image=SimpleUploadedFile('photo.jpg', jpeg()))
+
+    def get(self, name):
+        response = self.client.get(reverse('media', args=[name]))
+        response.close()
+        return response
+
+    def test_photos_of_pending_listings_are_only_shown_to_their_owner(self):
+        self.assertEqual(self.get(self.photo.image.name).status_code, 404)
+        self.client.force_login(self.owner)
+        response = self.get(self.photo.image.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], delivery.PRIVATE_CACHE_CONTROL)
+
+    def test_approving_the_listing_publishes_its_photos(self):
+        self.assertEqual(self.get(self.photo.image.name).status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.is_approved = True
+            self.listing.save()
+        response = self.get(self.photo.image.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], storage.IMMUTABLE_CACHE_CONTROL)
+
+    def test_derivatives_share_the_check_of_their_photo(self):
+        name = images.derivative_name(self.photo.image.name, 'card', 'webp')
+        request = RequestFactory().get('/')
+        request.user = self.owner
+        self.assertEqual(delivery.cache_control(request, name), delivery.PRIVATE_CACHE_CONTROL)
+        request.user = User.objects.create_user('visitor')
+        with self.assertRaises(Http404):
+            delivery.cache_control(request, name)
+
+    def test_viewers_are_matched_by_the_exact_stem(self):
+        stem = posixpath.splitext(self.photo.image.name)[0]
+        self.assertEqual(delivery.fetch_viewers(stem), [(self.listing.pk, False, self.owner.pk)])
+        self.assertEqual(delivery.fetch_viewers(stem[:-1]), [])
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class ImageDerivativeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def test_derivatives_are_made_in_their_own_pool_after_commit(self):
+        with mock.patch.object(images, 'executor') as derivative_pool, \
+                mock.patch.object(uploads, 'executor') as upload_pool:
+            with self.captureOnCommitCallbacks(execute=True):
+                photo = ListingImage.objects.create(listing=make_listing('Fresh Flat'), position=0,
+                                                    image=SimpleUploadedFile('photo.jpg', jpeg()))
+                derivative_pool.return_value.submit.assert_not_called()
+        derivative_pool.return_value.submit.assert_called_once_with(
+            signals.generate_image_derivatives_in_background, photo.pk)
+        upload_pool.assert_not_called()
+
+    def test_derivatives_are_recorded_on_the_photo(self):
+        photo = ListingImage.objects.create(listing=make_listing('Fresh Flat'), position=0,
+                                            image=SimpleUploadedFile('photo.jpg', jpeg()))
+        signals.generate_image_derivatives(photo.pk)
+        photo.refresh_from_db()
+        self.assertEqual((photo.width, photo.height), (64, 48))
+        self.assertEqual(photo.derivatives, images.derivative_names(photo.image.name))
+        self.assertTrue(all(default_storage.exists(name) for name in photo.derivatives.values()))
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class SubmitListingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('host', password='password'))
+
+    def test_a_valid_submission_is_saved(self):
+        response = self.client.post(reverse('submit_listing'), submission())
+        self.assertRedirects(response, reverse('my_bnb_listings'), fetch_redirect_response=False)
+        self.assertEqual(Listing.objects.get().images.count(), 1)
+
+    def test_save_errors_are_logged_not_shown(self):
+        with mock.patch.object(Listing, 'save', side_effect=DatabaseError('no such table: listings_secret')), \
+                self.assertLogs('listings.views', 'ERROR'):
+            response = self.client.post(reverse('submit_listing'), submission())
+        self.assertEqual(response.status_code, 200)
+        shown = [str(message) for message in response.context['messages']]
+        self.assertEqual(shown, ['Your listing could not be saved. Please try again.'])
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class ShuffledResultsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.featured = make_listing('Featured Flat', listing_type='featured', is_featured=True)
+        self.free = [make_listing(f'Free Flat {number}') for number in range(4)]
+        self.filters = get_filter_values(RequestFactory().get('/'))
+
+    def test_featured_first_in_the_database_shuffle(self):
+        matching = results.get(self.filters, 7, Listing.objects.approved())
+        self.assertEqual(matching.ids, list(Listing.objects.approved().shuffled(7).values_list('pk', flat=True)))
+        self.assertEqual(matching.ids[0], self.featured.pk)
+        self.assertEqual((matching.featured_count, matching.slider_ids), (1, [self.featured.pk]))
+
+    def test_each_seed_is_read_once(self):
+        first = results.get(self.filters, 3, Listing.objects.approved())
+        with self.assertNumQueries(0):
+            self.assertEqual(results.get(self.filters, 3, Listing.objects.approved()), first)
+        with self.assertNumQueries(1):
+            results.get(self.filters, 4, Listing.objects.approved())
+
+    def test_a_new_listing_joins_once_it_commits(self):
+        results.get(self.filters, 3, Listing.objects.approved())
+        with self.captureOnCommitCallbacks(execute=True):
+            added = make_listing('New Flat')
+        self.assertIn(added.pk, results.get(self.filters, 3, Listing.objects.approved()).ids)
+
+    def test_pages_show_the_cached_order(self):
+        response = self.client.get(reverse('home'), {'page': 1, 'seed': 5})
+        self.assertEqual(response.context['total_listings'], 5)
+        self.assertEqual([listing.id for listing in response.context['page_obj']],
+                         results.get(self.filters, 5, Listing.objects.approved()).ids)
+
+    def test_pages_only_show_cards_still_matching(self):
+        results.get(self.filters, 5, Listing.objects.approved())
+        # Not committed yet, so the cached order still holds it
+        Listing.objects.filter(pk=self.free[0].pk).update(is_approved=False)
+        response = self.client.get(reverse('home'), {'page': 1, 'seed': 5})
+        self.assertNotIn(self.free[0].pk, [listing.id for listing in response.context['page_obj']])
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class ViewCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('host', password='password')
+        self.quiet = make_listing('Quiet Flat', user=self.owner)
+        self.popular = make_listing('Popular Flat')
+
+    def visit(self, listing):
+        return self.client.get(reverse('listing_visitor', args=[listing.pk])).json()
+
+    def test_visits_are_counted_without_invalidating_pages(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.visit(self.popular)
+            self.visit(self.popular)
+        self.assertEqual(callbacks, [])
+        self.popular.refresh_from_db()
+        self.assertEqual(self.popular.views_count, 2)
+
+    def test_owners_are_not_counted(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.visit(self.quiet), {'is_owner': True})
+        self.quiet.refresh_from_db()
+        self.assertEqual(self.quiet.views_count, 0)
+
+    def test_most_viewed_follows_the_visits(self):
+        # Ties go to the newer listing
+        self.visit(self.quiet)
+        response = self.client.get(reverse('home'), {'sort': 'most_viewed'})
+        self.assertEqual([listing.id for listing in response.context['page_obj']], [self.quiet.pk, self.popular.pk])
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class FacetCountTests(TestCase):
+    def assertCountsMatchListings(self):
+        recounted = {key: count for key, count in facets.queryset_counts(Listing.objects.all()).items() if count}
+        self.assertEqual(facets.FacetCounts.load().rows, recounted)
+
+    def test_counts_follow_saves_and_deletes(self):
+        (first, _), (second, _) = Listing.LOCATIONS[:2]
+        listing = make_listing('Counted Flat', location=first, price_per_night=2500)
+        hidden = make_listing('Hidden Flat', is_approved=False)
+        self.assertCountsMatchListings()
+
+        listing.location, listing.price_per_night, listing.listing_type = second, 12000, 'featured'
+        listing.save()
+        self.assertCountsMatchListings()
+        self.assertEqual(facets.FacetCounts.load().by_value(facets.PRICE_BAND), {'10000-20000': 1})
+
+        hidden.is_approved = True
+        hidden.save()
+        listing.delete()
+        self.assertCountsMatchListings()
+        self.assertEqual(facets.FacetCounts.load().count(), 1)
+
+    def test_totals_of_single_facet_filters(self):
+        (location, _), (other, _) = Listing.LOCATIONS[:2]
+        make_listing('Free Flat', location=location)
+        make_listing('Featured Flat', location=location, listing_type='featured')
+        make_listing('Elsewhere Flat', location=other)
+        counts = facets.FacetCounts.load()
+        filters = get_filter_values(RequestFactory().get('/', {'location': location}))
+        self.assertEqual(counts.totals(filters), (2, 1))
+        filters = get_filter_values(RequestFactory().get('/', {'location': location, 'min_price': '1000'}))
+        self.assertIsNone(counts.totals(filters))
+
+    def test_reading_the_counts_is_one_query(self):
+        make_listing('Counted Flat')
+        with self.assertNumQueries(1):
+            facets.FacetCounts.load().by_value(facets.LOCATION)
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False, MEDIA_ACCEL='')
+class ResizeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root,
+                                                MEDIA_RESIZE_CACHE_DIR=f'{cls.media_root}/.resized'))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        default_storage.save('profile_pics/wide.jpg', io.BytesIO(self.image(400, 300)))
+        self.addCleanup(default_storage.delete, 'profile_pics/wide.jpg')
+
+    @staticmethod
+    def image(width, height):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), (20, 120, 200)).save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+    def get(self, size, name='profile_pics/wide.jpg'):
+        return self.client.get(reverse('resized_media', args=[size, name]))
+
+    def size_of(self, response):
+        content = b''.join(response.streaming_content)
+        response.close()
+        return Image.open(io.BytesIO(content)).size
+
+    def test_allowed_sizes_crop_or_fit(self):
+        self.assertEqual(self.size_of(self.get('192x192')), (192, 192))
+        # Never upscaled
+        self.assertEqual(self.size_of(self.get('2048x2048')), (400, 300))
+
+    def test_other_sizes_and_names_are_not_found(self):
+        self.assertEqual(self.get('100x100').status_code, 404)
+        self.assertEqual(self.get('192x192', 'profile_pics/missing.jpg').status_code, 404)
+        self.assertEqual(self.get('192x192', 'profile_pics/../../etc/passwd.jpg').status_code, 404)
+
+    def test_resizes_are_rendered_once(self):
+        self.get('192x192').close()
+        with mock.patch('listings.resize.render') as render:
+            response = self.get('192x192')
+        render.assert_not_called()
+        self.assertEqual(self.size_of(response), (192, 192))
+
+    def test_photos_of_pending_listings_stay_hidden(self):
+        photo = ListingImage.objects.create(listing=make_listing('Pending Flat', is_approved=False), position=0,
+                                            image=SimpleUploadedFile('photo.jpg', jpeg()))
+        self.assertEqual(self.get('192x192', photo.image.name).status_code, 404)
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root,
+                                                CHUNKED_UPLOAD_DIR=f'{cls.media_root}/.uploads'))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user('host', password='password')
+        self.client.force_login(self.user)
+        self.photo = jpeg()
+
+    def start(self, **params):
+        params = {'filename': 'photo.jpg', 'size': len(self.photo), **params}
+        return self.client.post(reverse('start_photo_upload'), params)
+
+    def send(self, url, offset, data, **headers):
+        return self.client.patch(url, data, content_type='application/octet-stream',
+                                 headers={'Upload-Offset': str(offset), **headers})
+
+    def test_an_upload_resumes_from_its_offset(self):
+        started = self.start(sha256=hashlib.sha256(self.photo).hexdigest()).json()
+        url, half = started['url'], len(self.photo) // 2
+        self.assertEqual(self.send(url, 0, self.photo[:half]).json()['offset'], half)
+
+        # A retry of the first chunk is refused with where to carry on from
+        response = self.send(url, 0, self.photo[:half])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, half))
+        self.assertEqual(self.client.get(url).json()['offset'], half)
+
+        status = self.send(url, half, self.photo[half:]).json()
+        self.assertEqual((status['offset'], status['complete']), (len(self.photo), True))
+
+    def test_a_chunk_not_matching_its_checksum_is_discarded(self):
+        url = self.start().json()['url']
+        response = self.send(url, 0, self.photo[:100], **{'Upload-Checksum': '0' * 64})
+        self.assertEqual((response.status_code, response.json()['offset']), (400, 0))
+
+    def test_a_file_not_matching_its_checksum_starts_over(self):
+        url = self.start(sha256='0' * 64).json()['url']
+        response = self.send(url, 0, self.photo)
+        self.assertEqual((response.status_code, response.json()['offset']), (400, 0))
+        self.assertFalse(self.client.get(url).json()['complete'])
+
+    def test_oversize_uploads_are_refused_up_front(self):
+        with override_settings(UPLOAD_MAX_FILE_SIZE=1024):
+            self.assertEqual(self.start(size=2048).status_code, 413)
+
+    def test_uploads_belong_to_their_user(self):
+        url = self.start().json()['url']
+        self.client.force_login(User.objects.create_user('other'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_the_form_takes_a_completed_upload(self):
+        url = self.start().json()['url']
+        upload_id = self.send(url, 0, self.photo).json()['id']
+        data = submission(main_image_upload=upload_id)
+        del data['main_image']
+        response = self.client.post(reverse('submit_listing'), data)
+        self.assertRedirects(response, reverse('my_bnb_listings'), fetch_redirect_response=False)
+        self.assertEqual(Listing.objects.get().images.count(), 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE, CACHE_LOCKS=False)
+class DraftTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root,
+                                                CHUNKED_UPLOAD_DIR=f'{cls.media_root}/.uploads'))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user('host', password='password')
+        self.client.force_login(self.user)
+
+    def submit(self, data):
+        return self.client.post(reverse('submit_listing'), data)
+
+    def test_a_failed_submit_keeps_its_values_and_photos(self):
+        data = submission(title='Drafted Flat')
+        del data['price']
+        response = self.submit(data)
+        self.assertEqual(response.status_code, 200)
+        draft = ListingDraft.objects.get(user=self.user)
+        self.assertEqual(draft.data['title'], ['Drafted Flat'])
+        self.assertEqual(set(draft.photos), {'main_image'})
+        self.assertEqual(response.context['form'].data['main_image_upload'], draft.photos['main_image'])
+
+    def test_a_partial_submit_completes_the_draft(self):
+        data = submission(title='Drafted Flat')
+        del data['price']
+        self.submit(data)
+
+        response = self.submit({drafts.PARTIAL_FLAG: '1', 'price': 6000})
+        self.assertRedirects(response, reverse('my_bnb_listings'), fetch_redirect_response=False)
+        listing = Listing.objects.get()
+        self.assertEqual((listing.title, listing.price, listing.images.count()), ('Drafted Flat', 6000, 1))
+        self.assertFalse(ListingDraft.objects.exists())
+
+    def test_a_partial_submit_without_its_draft_is_refused(self):
+        response = self.submit({drafts.PARTIAL_FLAG: '1', 'price': 6000})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Listing.objects.exists())
+
+    def test_drafts_expire(self):
+        data = submission()
+        del data['price']
+        self.submit(data)
+        self.assertEqual(self.client.get(reverse('listing_draft_status')).json(), {'exists': True})
+
+        expired = timezone.now() - timedelta(days=settings.LISTING_DRAFT_EXPIRY_DAYS + 1)
+        ListingDraft.objects.update(updated_at=expired)
+        self.assertEqual(self.client.get(reverse('listing_draft_status')).json(), {'exists': False})
+        self.assertEqual(self.submit({drafts.PARTIAL_FLAG: '1', 'price': 6000}).status_code, 409)
@@ -0,0 +1,311 @@
+# listings/uploads.py
+"""
+Memory-bounded handling of photo uploads.
+
+LimitedUploadHandler, installed by the listing form views through
+limited_uploads(), streams their uploads to a temporary file - never to
+memory - and refuses each as soon as it grows past
+UPLOAD_MAX_FILE_SIZE, or as soon as its header shows more than
+UPLOAD_MAX_IMAGE_PIXELS, without reading the rest into a file. Listing photos
+are then normalized in a process-wide pool of LISTING_PHOTO_WORKERS threads
+(Pillow releases the GIL while decoding, resizing and encoding): decoded in
+full to prove they are intact, turned upright, stripped of their metadata
+(EXIF, GPS) and scaled down to LISTING_PHOTO_MAX_DIMENSION. Their derivatives
+are made once they are saved, in a pool of their own (see images.py). Memory
+use therefore depends on the pool sizes and the limits, not on how many
+photos a submit carries or how large they are.
+
+Photos can also be uploaded ahead of the form, in chunks that survive a
+dropped connection: start_upload() opens a PhotoUpload, receive_chunk()
+streams each chunk to its byte offset in a file under CHUNKED_UPLOAD_DIR
+(checking it against its SHA-256 when the client sends one), and the client
+resumes from the stored offset after a failure. The form names a complete
+upload by id (completed_file()) and it goes through normalize() like any other.
+"""
+import hashlib
+import io
+import math
+import mimetypes
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, UnidentifiedImageError
+
+from . import images
+
+# Leading bytes of an upload kept for reading its image header
+HEADER_BYTES = 256 * 1024
+
+JPEG_OPTIONS = {'quality': 88, 'optimize': True, 'progressive': True}
+
+INVALID_IMAGE = ("Upload a valid image. The file you uploaded was either not an image "
+                 "or a corrupted image.")
+
+# Unfinished chunked uploads a user may have at once
+MAX_OPEN_UPLOADS = 16
+# Bytes read from the request at a time while storing a chunk
+READ_SIZE = 64 * 1024
+SHA256 = re.compile(r'[0-9a-f]{64}')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def too_many_pixels():
+    return f"Photos can be at most {settings.UPLOAD_MAX_IMAGE_PIXELS / 1e6:g} megapixels."
+
+
+def pixels_in_header(header):
+    """width * height from the first bytes of an image file, or None if they don't tell"""
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            return image.width * image.height
+    except Image.DecompressionBombError:
+        return math.inf
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+
+
+class RejectedUpload(UploadedFile):
+    """Stands in for an upload refused while streaming; ListingPhotoField reports ``error``"""
+
+    def __init__(self, name, content_type, error):
+        super().__init__(io.BytesIO(), name=name, content_type=content_type, size=0)
+        self.error = error
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream uploads to temporary files, refusing those over the byte or pixel
+    limits while they arrive
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_FILE_SIZE:
+            self.reject(f"Files can be at most {filesizeformat(settings.UPLOAD_MAX_FILE_SIZE)}.")
+            return None
+        if self.header is not None:
+            self.header += raw_data[:HEADER_BYTES - len(self.header)]
+            pixels = pixels_in_header(self.header)
+            if pixels is not None or len(self.header) >= HEADER_BYTES:
+                # Sniffing is over; files that aren't images are left to form validation
+                self.header = None
+                if pixels is not None and pixels > settings.UPLOAD_MAX_IMAGE_PIXELS:
+                    self.reject(too_many_pixels())
+                    return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def reject(self, error):
+        self.error = error
+        self.header = None
+        # Closing a temporary upload deletes it
+        self.file.close()
+
+    def file_complete(self, file_size):
+        if self.error:
+            return RejectedUpload(self.file_name, self.content_type, self.error)
+        return super().file_complete(file_size)
+
+
+def limited_uploads(view):
+    """
+    Receive a view's uploads through LimitedUploadHandler. CsrfViewMiddleware
+    reads the body before the view runs, with the handlers it finds then, so
+    the view is exempt from it and checked by csrf_protect once the handler
+    is in place.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, LimitedUploadHandler(request))
+        return protected(request, *args, **kwargs)
+    return wrapper
+
+
+def normalize(upload):
+    """
+    Decode an uploaded photo in full and re-encode it upright, without
+    metadata and at most LISTING_PHOTO_MAX_DIMENSION on its long side, as a
+    JPEG in a new temporary file. Raises ValidationError unless it is an
+    intact image within the pixel limit.
+    """
+    max_dimension = settings.LISTING_PHOTO_MAX_DIMENSION
+    try:
+        upload.seek(0)
+        with Image.open(upload) as probe:
+            if probe.width * probe.height > settings.UPLOAD_MAX_IMAGE_PIXELS:
+                raise ValidationError(too_many_pixels(), code='too_large')
+            icc_profile = probe.info.get('icc_profile')
+        upload.seek(0)
+        image, _ = images.open_rgb(upload, max_size=max_dimension)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise ValidationError(INVALID_IMAGE, code='invalid_image')
+
+    stem = os.path.splitext(os.path.basename(upload.name))[0] or 'photo'
+    output = TemporaryUploadedFile(f'{stem}.jpg', 'image/jpeg', 0, None)
+    image.save(output.file, 'JPEG', icc_profile=icc_profile, **JPEG_OPTIONS)
+    output.size = output.file.tell()
+    output.seek(0)
+    upload.close()
+    return output
+
+
+def executor():
+    """The shared pool that bounds how many photos are decoded at once"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.LISTING_PHOTO_WORKERS,
+                                           thread_name_prefix='listing-photos')
+    return _executor
+
+
+def normalize_all(uploads):
+    """
+    Normalize a {field name: upload} mapping in parallel. Returns
+    {field name: normalized upload or the ValidationError it raised}.
+    """
+    futures = {name: executor().submit(normalize, upload) for name, upload in uploads.items()}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except ValidationError as error:
+            results[name] = error
+    return results
+
+
+class ChunkError(Exception):
+    """A chunked upload request that was refused; ``status`` is the HTTP status to answer"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def start_upload(user, filename, size, sha256=''):
+    """New PhotoUpload of ``size`` bytes for ``user``; ChunkError if it is refused"""
+    from .models import PhotoUpload
+
+    sha256 = sha256.lower()
+    if size <= 0 or size > settings.UPLOAD_MAX_FILE_SIZE:
+        raise ChunkError(f"Files can be at most {filesizeformat(settings.UPLOAD_MAX_FILE_SIZE)}.", status=413)
+    if sha256 and not SHA256.fullmatch(sha256):
+        raise ChunkError("sha256 must be 64 hex digits.")
+    if PhotoUpload.objects.filter(user=user, completed_at__isnull=True).count() >= MAX_OPEN_UPLOADS:
+        raise ChunkError("Too many unfinished uploads.", status=429)
+
+    upload = PhotoUpload.objects.create(
+        user=user, filename=os.path.basename(filename)[-255:] or 'photo', size=size, sha256=sha256,
+    )
+    os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+    open(upload.path, 'xb').close()
+    return upload
+
+
+def receive_chunk(upload, offset, stream, length, checksum=''):
+    """
+    Write ``length`` bytes read from ``stream`` at ``offset`` of ``upload``
+    and move its offset past them, without holding more than READ_SIZE bytes
+    in memory. A chunk that doesn't match its ``checksum`` is discarded;
+    without one, as much of a cut-off chunk as arrived is kept. Raises
+    ChunkError when the chunk is refused.
+    """
+    if upload.is_complete:
+        raise ChunkError("The upload is already complete.", status=409)
+    if offset != upload.received:
+        raise ChunkError(f"The upload continues at byte {upload.received}.", status=409)
+    if length <= 0 or offset + length > upload.size:
+        raise ChunkError("The chunk does not fit the upload.", status=416)
+
+    digest = hashlib.sha256()
+    written = 0
+    with open(upload.path, 'r+b') as file:
+        file.seek(offset)
+        while written < length:
+            try:
+                data = stream.read(min(READ_SIZE, length - written))
+            except OSError:
+                data = b''  # the connection dropped
+            if not data:
+                break
+            file.write(data)
+            digest.update(data)
+            written += len(data)
+    if checksum and (written < length or digest.hexdigest() != checksum.lower()):
+        raise ChunkError("The chunk does not match its checksum.")
+
+    # A retried chunk may have been stored twice; only one request moves the offset
+    type(upload).objects.filter(pk=upload.pk, received=offset).update(
+        received=offset + written, updated_at=timezone.now(),
+    )
+    upload.refresh_from_db()
+
+    if offset < HEADER_BYTES:
+        with open(upload.path, 'rb') as file:
+            header = file.read(min(upload.received, HEADER_BYTES))
+        pixels = pixels_in_header(header)
+        if pixels is not None and pixels > settings.UPLOAD_MAX_IMAGE_PIXELS:
+            upload.delete()
+            raise ChunkError(too_many_pixels(), status=413)
+    if upload.received == upload.size:
+        complete(upload)
+    return upload
+
+
+def complete(upload):
+    """Check a fully received upload against its checksum and mark it complete"""
+    if upload.sha256:
+        digest = hashlib.sha256()
+        with open(upload.path, 'rb') as file:
+            for data in iter(lambda: file.read(READ_SIZE), b''):
+                digest.update(data)
+        if digest.hexdigest() != upload.sha256:
+            # Start over rather than keep bytes we can't trust
+            with open(upload.path, 'r+b') as file:
+                file.truncate(0)
+            upload.received = 0
+            upload.save(update_fields=['received', 'updated_at'])
+            raise ChunkError("The file does not match its checksum; upload it again.")
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['completed_at', 'updated_at'])
+
+
+def completed_file(user, upload_id):
+    """
+    An UploadedFile reading a complete chunked upload of ``user``, with the
+    PhotoUpload as its ``upload``. Raises ValidationError if there is none.
+    """
+    from .models import PhotoUpload
+
+    try:
+        upload = PhotoUpload.objects.get(pk=upload_id, user=user, completed_at__isnull=False)
+        file = open(upload.path, 'rb')
+    except (PhotoUpload.DoesNotExist, FileNotFoundError):
+        raise ValidationError("This photo upload has expired; choose the photo again.", code='upload_missing')
+    uploaded = UploadedFile(file, name=upload.filename, size=upload.size,
+                            content_type=mimetypes.guess_type(upload.filename)[0])
+    uploaded.upload = upload
+    return uploaded
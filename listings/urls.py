@@ -17,10 +17,16 @@ urlpatterns = [
     path('my-listings/', views.my_listings, name='my_bnb_listings'),
     path('edit/<int:listing_id>/', views.edit_listing, name='edit_bnb_listing'),
     path('delete/<int:listing_id>/', views.delete_listing, name='delete_listing'),
+    path('api/listing-draft/', views.listing_draft_status, name='listing_draft_status'),
 
 
+    # Resumable chunked photo uploads for the listing forms
+    path('api/uploads/', views.start_photo_upload, name='start_photo_upload'),
+    path('api/uploads/<uuid:upload_id>/', views.photo_upload, name='photo_upload'),
+
     # Individual listing detail
     path('listing/<slug:slug>/', views.listing_detail, name='listing_detail'),
+    path('api/listings/<int:listing_id>/visitor/', views.listing_visitor, name='listing_visitor'),
 
     # Booking pages
     path('book/<int:listing_id>/', views.booking_view, name='booking_form'),
@@ -29,6 +35,15 @@ urlpatterns = [
     # WhatsApp booking
     path('book-via-whatsapp/', views.book_via_whatsapp, name='whatsapp_booking'),
 
+    # Geo search (JSON)
+    path('api/listings/nearby/', views.nearby_listings, name='nearby_listings'),
+    path('api/listings/bbox/', views.listings_in_bbox, name='listings_in_bbox'),
+    path('api/listings/clusters/<int:zoom>/<int:x>/<int:y>/', views.listing_clusters, name='listing_clusters'),
+
+    # Card galleries, loaded when a card is opened (JSON)
+    path('api/listings/gallery/', views.listing_galleries, name='listing_galleries'),
+    path('api/listings/<int:listing_id>/gallery/', views.listing_gallery, name='listing_gallery'),
+
     # Property type URLs (clean URLs)
 
 
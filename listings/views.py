@@ -8,15 +8,20 @@ from django.db.models.functions import Coalesce
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 import json
-from django.http import HttpResponse
-from django.views.decorators.http import require_GET
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 from .forms import ListingSubmissionForm, BookingForm
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-from .models import Listing, Booking
+from .models import Listing, Booking, PhotoUpload, AMENITY_BITS
+from . import caching, cards, clusters, delivery, drafts, facets, gallery, geo, keyset, pagecache, resize, results, search, uploads
+import os
 import logging
 import urllib.parse
+from PIL import Image, UnidentifiedImageError
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -26,86 +31,165 @@ logger = logging.getLogger(__name__)
 # HELPER FUNCTIONS - Shared logic for all listing views
 # ============================================================================
 
+def get_filter_values(request, **kwargs):
+    """
+    The listing filters of a request, with 'all' and empty values as None.
+    Keyword arguments (e.g. a location from the URL) take precedence.
+    """
+    location = kwargs.get('location') or request.GET.get('location')
+    listing_type = request.GET.get('listing_type', 'all')
+    return {
+        'location': location if location and location != 'all' else None,
+        'property_type': kwargs.get('property_type') or request.GET.get('property_type') or None,
+        'min_price': request.GET.get('min_price') or None,
+        'max_price': request.GET.get('max_price') or None,
+        'listing_type': listing_type if listing_type and listing_type != 'all' else None,
+        'amenities': kwargs.get('amenities') or get_amenity_filters(request),
+    }
+
+
 def get_filtered_listings(request, base_queryset=None, **kwargs):
     """
     Shared filtering logic for all listing views
     """
     if base_queryset is None:
-        base_queryset = Listing.objects.filter(is_approved=True)
+        base_queryset = Listing.objects.approved()
 
     # Get filters from request
-    location = kwargs.get('location') or request.GET.get('location')
-    property_type = kwargs.get('property_type') or request.GET.get('property_type')
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    listing_type = request.GET.get('listing_type', 'all')
+    filters = get_filter_values(request, **kwargs)
 
     # Apply filters
-    if location and location != 'all':
-        base_queryset = base_queryset.filter(location=location)
-    if property_type:
-        base_queryset = base_queryset.filter(property_type=property_type)
-    if min_price:
-        base_queryset = base_queryset.filter(price_per_night__gte=min_price)
-    if max_price:
-        base_queryset = base_queryset.filter(price_per_night__lte=max_price)
-    if listing_type and listing_type != 'all':
-        base_queryset = base_queryset.filter(listing_type=listing_type)
+    if filters['location']:
+        base_queryset = base_queryset.filter(location=filters['location'])
+    if filters['property_type']:
+        base_queryset = base_queryset.filter(property_type=filters['property_type'])
+    if filters['min_price']:
+        base_queryset = base_queryset.filter(effective_price__gte=filters['min_price'])
+    if filters['max_price']:
+        base_queryset = base_queryset.filter(effective_price__lte=filters['max_price'])
+    if filters['listing_type']:
+        base_queryset = base_queryset.filter(listing_type=filters['listing_type'])
+    if filters['amenities']:
+        base_queryset = base_queryset.with_amenities(filters['amenities'])
 
     return base_queryset
 
 
-def prepare_listing_context(request, queryset, context_extra=None):
+def get_amenity_filters(request):
     """
-    Prepare common context for listing pages (both location and property type)
-    This creates all the data needed for listings.html template
+    Amenity names from ?amenities=wifi,pool or ?amenities=wifi&amenities=pool
     """
-    # Generate a random seed based on session or current timestamp
-    random_seed = request.session.get('random_seed', random.randint(1, 1000000))
-    request.session['random_seed'] = random_seed + 1
-
-    # Convert to list for shuffling
-    all_listings = list(queryset)
-
-    # Separate featured and non-featured listings
-    featured_listings = [listing for listing in all_listings if listing.listing_type == 'featured']
-    non_featured_listings = [listing for listing in all_listings if listing.listing_type != 'featured']
+    names = []
+    for value in request.GET.getlist('amenities'):
+        names.extend(name.strip() for name in value.split(',') if name.strip() in AMENITY_BITS)
+    return names
 
-    # Shuffle both lists separately with the current random seed
-    random.seed(random_seed)
-    random.shuffle(featured_listings)
-    random.shuffle(non_featured_listings)
 
-    # Combine: featured first, then non-featured
-    all_listings_shuffled = featured_listings + non_featured_listings
-
-    # Pagination
-    paginator = Paginator(all_listings_shuffled, 99)  # 12 listings per page for better UX
+def prepare_listing_context(request, queryset, context_extra=None, filters=None):
+    """
+    Prepare common context for listing pages (both location and property type)
+    This creates all the data needed for listings.html template.
+    ``filters`` are the get_filter_values() the queryset was built from.
+    """
+    # The shuffle seed travels in the next page's URL, so a visitor keeps one
+    # order while paging through results and the pages can be cached for
+    # everyone; a fresh visit to the first page reshuffles
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Get counts
-    total_listings = len(all_listings_shuffled)
-    featured_count = len(featured_listings)
-    free_count = len(non_featured_listings)
-
-    # Get featured listings for slider
-    featured_slider_listings = featured_listings[:3]
-    if not featured_slider_listings:
-        featured_slider_listings = non_featured_listings[:3]
+    try:
+        random_seed = int(request.GET['seed']) if page_number else None
+    except (KeyError, ValueError):
+        random_seed = None
+    if random_seed is None or not 1 <= random_seed <= SHUFFLE_SEEDS:
+        random_seed = random.randint(1, SHUFFLE_SEEDS)
+
+    # Read before any listing is, so cards changed meanwhile are not cached
+    cards_version = cards.listings_version()
+
+    # Approved listing counts per location/property type/price band (one query)
+    facet_counts = facets.FacetCounts.load()
+
+    search_query = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort')
+    next_page_params = None
+    if search_query:
+        # Keyword search: best matches first, paginated over the ranked ids
+        ranked_ids = search.search_listing_ids(search_query, queryset)
+        listing_types = dict(queryset.filter(pk__in=ranked_ids).values_list('pk', 'listing_type'))
+        ranked_ids = [pk for pk in ranked_ids if pk in listing_types]
+
+        paginator = Paginator(ranked_ids, 99)
+        page_obj = paginator.get_page(page_number)
+        page_obj.object_list = Listing.objects.cards_by_ids(page_obj.object_list)
+
+        total_listings = paginator.count
+        featured_count = sum(1 for listing_type in listing_types.values() if listing_type == 'featured')
+        free_count = total_listings - featured_count
+
+        featured_slider_listings = [
+            listing for listing in page_obj.object_list if listing.listing_type == 'featured'
+        ][:3] or page_obj.object_list[:3]
+        if page_obj.has_next():
+            next_page_params = {'page': page_obj.next_page_number()}
+    elif sort in keyset.SORTS:
+        # Sorted pages continue from a cursor instead of counting and offsetting
+        page_obj = keyset.paginate(queryset, sort, request.GET.get('cursor'), 99)
+        totals = facet_counts.totals(filters) if filters is not None else None
+        total_listings, featured_count = totals if totals is not None else (None, None)
+        free_count = total_listings - featured_count if totals is not None else None
+
+        featured_slider_listings = [
+            listing for listing in page_obj if listing.is_featured
+        ][:3] or page_obj.object_list[:3]
+        if page_obj.has_next():
+            next_page_params = {'cursor': page_obj.next_cursor}
+    else:
+        # Featured first, shuffled by the database with the current seed; the
+        # order is cached per filters and seed (see results.py) and the page
+        # only fetches its own cards, from the queryset so they are current
+        matching = results.get(filters, random_seed, queryset)
+        paginator = Paginator(matching.ids, 99)
+        page_obj = paginator.get_page(page_number)
+        page_obj.object_list = queryset.cards_by_ids(page_obj.object_list)
+
+        total_listings = paginator.count
+        featured_count = matching.featured_count
+        free_count = total_listings - featured_count
+
+        # On the first page the slider's cards are among the page's own
+        page_cards = {listing.id: listing for listing in page_obj.object_list}
+        if all(pk in page_cards for pk in matching.slider_ids):
+            featured_slider_listings = [page_cards[pk] for pk in matching.slider_ids]
+        else:
+            featured_slider_listings = queryset.cards_by_ids(matching.slider_ids)
+        if page_obj.has_next():
+            next_page_params = {'page': page_obj.next_page_number(), 'seed': random_seed}
+
+    next_page_url = None
+    if next_page_params:
+        query = request.GET.copy()
+        for name, value in next_page_params.items():
+            query[name] = value
+        next_page_url = f'?{query.urlencode()}'
+
+    # The first three cards of the page go in the slider, the rest in the grid
+    page_listings = list(page_obj)
+    rendered_cards = cards.render({'slide': page_listings[:3], 'grid': page_listings[3:]}, cards_version)
 
     # Create location data with slugs for template
     all_location_choices = Listing.LOCATIONS
     locations_with_slugs = []
     location_choices_dict = dict(all_location_choices)
 
+    location_counts = facet_counts.by_value(facets.LOCATION)
+
     for location_code, loc_display_name in all_location_choices:
         slug = location_code.lower()
         locations_with_slugs.append({
             'code': location_code,
             'name': loc_display_name,
             'slug': slug,
-            'url': f'/location/{slug}/'
+            'url': f'/location/{slug}/',
+            'count': location_counts.get(location_code, 0),
         })
 
     # Get property types from model choices
@@ -118,6 +202,8 @@ def prepare_listing_context(request, queryset, context_extra=None):
     context = {
         'listings': page_obj,
         'page_obj': page_obj,
+        'slide_cards': rendered_cards['slide'],
+        'grid_cards': rendered_cards['grid'],
         'all_locations': locations_with_slugs,
         'location_choices_dict': location_choices_dict,
         'property_types': property_types,
@@ -133,7 +219,22 @@ def prepare_listing_context(request, queryset, context_extra=None):
             'listing_type': request.GET.get('listing_type', 'all'),
             'min_price': request.GET.get('min_price'),
             'max_price': request.GET.get('max_price'),
+            'amenities': get_amenity_filters(request),
+            'q': search_query,
+            'sort': sort if sort in keyset.SORTS else None,
         },
+        'search_query': search_query,
+        'sort': sort if sort in keyset.SORTS else None,
+        'sort_choices': [(code, spec.label) for code, spec in keyset.SORTS.items()],
+        'next_page_url': next_page_url,
+        'amenity_groups': Listing.AMENITY_GROUPS,
+        'property_type_counts': facet_counts.by_value(facets.PROPERTY_TYPE),
+        'listing_type_counts': facet_counts.by_listing_type(),
+        'price_band_counts': [
+            {'value': value, 'min_price': lower, 'max_price': upper,
+             'count': facet_counts.count(facets.PRICE_BAND, value)}
+            for value, lower, upper in facets.PRICE_BANDS
+        ],
     }
 
     # Add extra context if provided
@@ -170,10 +271,58 @@ def get_property_type_slug_mappings():
 # MAIN LISTING VIEWS - Both use the same listings.html template
 # ============================================================================
 
+# Shuffled orders a visitor can be given; few, so every page of each can be cached
+SHUFFLE_SEEDS = 32
+
+# Listing pages past this one are rendered without the page cache
+MAX_CACHED_PAGE = 100
+
+
+def clean_amenity(value):
+    """Pages filtered by one amenity are cached, combinations are not"""
+    if value not in AMENITY_BITS:
+        raise ValueError(value)
+    return value
+
+
+def clean_cursor(value):
+    if not any(keyset.decode_cursor(value, sort) for sort in keyset.SORTS):
+        raise ValueError(value)
+    return value
+
+
+# The query parameters of the listing pages that may be cached (see pagecache.py);
+# searches and price filters take any value, so those pages are not
+LISTING_PAGE_PARAMETERS = {
+    'location': pagecache.choice(['all', *dict(Listing.LOCATIONS)]),
+    'property_type': pagecache.choice(dict(Listing.PROPERTY_TYPES)),
+    'listing_type': pagecache.choice(['all', *dict(Listing.LISTING_TYPE_CHOICES)]),
+    'amenities': clean_amenity,
+    'sort': pagecache.choice(keyset.SORTS),
+    'cursor': clean_cursor,
+    'page': pagecache.positive_int(MAX_CACHED_PAGE),
+    'seed': pagecache.choice(str(seed) for seed in range(1, SHUFFLE_SEEDS + 1)),
+}
+
+
+def listing_page_tags(request, location_slug=None):
+    """Cache tags of a listing_list page: its location, or every listing"""
+    location = get_location_slug_mappings().get(location_slug) if location_slug else request.GET.get('location')
+    if location and location != 'all':
+        return {caching.location_tag(location), caching.FACETS}
+    return {caching.ALL_LISTINGS, caching.FACETS}
+
+
+def property_type_page_tags(request, property_type_slug):
+    return {caching.property_type_tag(property_type_slug), caching.FACETS}
+
+
+@pagecache.cached_page(listing_page_tags, LISTING_PAGE_PARAMETERS)
 def listing_list(request, location_slug=None):
     """
     Home page - Display all approved listings or location-specific listings
     Uses listings.html template
+    Sort modes: ?sort=newest|price_asc|price_desc|most_viewed|verified_first
     """
     # Get location mappings
     LOCATION_SLUGS = get_location_slug_mappings()
@@ -201,6 +350,7 @@ def listing_list(request, location_slug=None):
                 break
 
     # Get filtered listings
+    filters = get_filter_values(request, location=selected_location)
     queryset = get_filtered_listings(request, location=selected_location)
 
     # Prepare context
@@ -215,14 +365,15 @@ def listing_list(request, location_slug=None):
         'meta_description': f' Bnb,staycations,Holiday homes & Furnished houses for rent in {display_location_name}. Browse verified listings with photos, amenities, and booking details.' if selected_location != 'all' else 'Bnb,staycations,Holiday homes & houses for rent in Kenya. Browse verified listings with photos, amenities, and booking details.',
     }
 
-    context = prepare_listing_context(request, queryset, context_extra)
+    context = prepare_listing_context(request, queryset, context_extra, filters)
     return render(request, 'listings/listings.html', context)
 
 
+@pagecache.cached_page(property_type_page_tags, LISTING_PAGE_PARAMETERS)
 def listings_by_property_type(request, property_type_slug):
     """
     Display listings filtered by property type
-    URL example: /property-type/rent_studio/
+    URL example: /property-type/rent_studio/?sort=price_asc
     Uses listings.html template
     """
     # Get property type mappings
@@ -259,6 +410,7 @@ def listings_by_property_type(request, property_type_slug):
                 break
 
     # Get filtered listings
+    filters = get_filter_values(request, property_type=property_code)
     queryset = get_filtered_listings(request, property_type=property_code)
 
     # Prepare context
@@ -276,7 +428,7 @@ def listings_by_property_type(request, property_type_slug):
         'meta_description': f'Find the best {property_display_name} properties in Kenya. Browse listings for bnb,staycations, rent, and shortlet.',
     }
 
-    context = prepare_listing_context(request, queryset, context_extra)
+    context = prepare_listing_context(request, queryset, context_extra, filters)
     return render(request, 'listings/listings.html', context)
 
 # ============================================================================
@@ -284,17 +436,32 @@ def listings_by_property_type(request, property_type_slug):
 # ============================================================================
 
 @login_required
+@uploads.limited_uploads
 def submit_listing(request):
     """
     Submit new listing page - Allow authenticated users to submit new listings
     """
+    # Values and photos kept from a submit that failed validation (see drafts.py)
+    draft = drafts.get(request.user)
+
+    if request.method == 'POST' and drafts.is_orphaned(draft, request.POST):
+        # Show what did arrive and have the whole form sent again
+        messages.error(request, 'Your saved draft has expired. Please check every field and submit the form again.')
+        form = ListingSubmissionForm(
+            user=request.user, initial=drafts.parsed(ListingSubmissionForm, request.POST, user=request.user),
+        )
+        context = {
+            'form': form,
+            'title': 'Submit New Listing | Bnb.co.ke',
+            'featured_price': 1000.00,
+        }
+        return render(request, 'listings/create_listing.html', context, status=409)
+
     if request.method == 'POST':
-        form = ListingSubmissionForm(request.POST, request.FILES, user=request.user)
+        form = ListingSubmissionForm(drafts.merged_data(draft, request.POST), request.FILES, user=request.user)
 
-        # Debug: Print form errors if any
         if not form.is_valid():
-            print("Form errors:", form.errors.as_json())
-            print("Form non-field errors:", form.non_field_errors())
+            logger.debug("Listing submission errors: %s", form.errors.as_json())
 
             # Add detailed error messages for the user
             for field, errors in form.errors.items():
@@ -305,8 +472,12 @@ def submit_listing(request):
                         field_label = form.fields[field].label if field in form.fields else field
                         messages.error(request, f"{field_label}: {error}")
 
+            # Keep what was entered, photos included, for the next attempt
+            draft = drafts.save(form)
+
             context = {
                 'form': form,
+                'draft': draft,
                 'title': 'Submit New Listing | Bnb.co.ke',
                 'featured_price': 1000.00,
             }
@@ -337,6 +508,7 @@ def submit_listing(request):
 
             # Save many-to-many and file fields
             form.save_m2m()
+            drafts.discard(request.user)
 
             # Different success messages based on listing type
             if listing_type == 'featured':
@@ -355,11 +527,10 @@ def submit_listing(request):
 
             return redirect('my_bnb_listings')  # Redirect to user's listings page
 
-        except Exception as e:
-            # Catch any unexpected errors
-            messages.error(request, f'An error occurred while saving: {str(e)}')
-            import traceback
-            traceback.print_exc()  # This will print the full error to your console
+        except Exception:
+            # Catch any unexpected errors; the details are for the log, not the user
+            messages.error(request, 'Your listing could not be saved. Please try again.')
+            logger.exception("Could not save a listing submission")
 
             context = {
                 'form': form,
@@ -369,16 +540,28 @@ def submit_listing(request):
             return render(request, 'listings/create_listing.html', context)
 
     else:
-        form = ListingSubmissionForm(user=request.user)
+        form = ListingSubmissionForm(
+            user=request.user, initial=drafts.initial(ListingSubmissionForm, draft, user=request.user),
+        )
 
     context = {
         'form': form,
+        'draft': draft,
         'title': 'Submit New Listing | Bnb.co.ke',
         'featured_price': 1000.00,
     }
     return render(request, 'listings/create_listing.html', context)
 
 
+@login_required
+@require_GET
+@never_cache
+def listing_draft_status(request):
+    """Whether the user still has a listing draft; asked by listing-draft.js before a partial submit"""
+    return JsonResponse({'exists': drafts.get(request.user) is not None})
+
+
+@pagecache.cached_page(lambda request: set())
 def book_via_whatsapp(request):
     """
     Simple WhatsApp booking page - Just a big WhatsApp button
@@ -450,7 +633,7 @@ def my_listings(request):
     """
     Display user's listings
     """
-    listings = Listing.objects.filter(user=request.user).order_by('-created_at')
+    listings = Listing.objects.filter(user=request.user).prefetch_related('images').order_by('-created_at')
 
     # Statistics
     active_listings = listings.filter(is_approved=True)
@@ -468,9 +651,10 @@ def my_listings(request):
 
 
 @login_required
+@uploads.limited_uploads
 def edit_listing(request, listing_id):
     """Edit existing listing - only accessible by listing owner"""
-    listing = get_object_or_404(Listing, id=listing_id)
+    listing = get_object_or_404(Listing.objects.prefetch_related('images'), id=listing_id)
 
     # Check if user owns the listing
     if listing.user != request.user:
@@ -485,46 +669,7 @@ def edit_listing(request, listing_id):
             user=request.user
         )
         if form.is_valid():
-            # Handle image deletions before saving
-            if request.POST.get('delete_main_image') == 'true':
-                listing.main_image.delete(save=False)
-                listing.main_image = None
-
-            if request.POST.get('delete_image_2') == 'true':
-                if listing.image_2:
-                    listing.image_2.delete(save=False)
-                listing.image_2 = None
-
-            if request.POST.get('delete_image_3') == 'true':
-                if listing.image_3:
-                    listing.image_3.delete(save=False)
-                listing.image_3 = None
-
-            if request.POST.get('delete_image_4') == 'true':
-                if listing.image_4:
-                    listing.image_4.delete(save=False)
-                listing.image_4 = None
-
-            if request.POST.get('delete_image_5') == 'true':
-                if listing.image_5:
-                    listing.image_5.delete(save=False)
-                listing.image_5 = None
-
-            if request.POST.get('delete_image_6') == 'true':
-                if listing.image_6:
-                    listing.image_6.delete(save=False)
-                listing.image_6 = None
-
-            if request.POST.get('delete_image_7') == 'true':
-                if listing.image_7:
-                    listing.image_7.delete(save=False)
-                listing.image_7 = None
-
-            if request.POST.get('delete_image_8') == 'true':
-                if listing.image_8:
-                    listing.image_8.delete(save=False)
-                listing.image_8 = None
-
+            # Photo uploads and deletions (delete_<slot> flags) are saved by the form
             form.save()
             messages.success(request, 'Listing updated successfully!')
             return redirect('my_bnb_listings')
@@ -563,19 +708,259 @@ def delete_listing(request, listing_id):
     return render(request, 'listings/delete_listing.html', context)
 
 
-def listing_detail(request, slug):
+# ============================================================================
+# CHUNKED PHOTO UPLOADS - resumable, referred to by id from the listing forms
+# ============================================================================
+
+def upload_status(upload):
+    return {'id': str(upload.id), 'offset': upload.received, 'size': upload.size, 'complete': upload.is_complete}
+
+
+@login_required
+@require_POST
+def start_photo_upload(request):
     """
-    Display individual listing detail page
+    Open a chunked photo upload
+    POST /api/uploads/ with filename, size and optionally sha256 (hex, of the whole file)
     """
-    listing = get_object_or_404(Listing, slug=slug, is_approved=True)
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'size is required'}, status=400)
+    try:
+        upload = uploads.start_upload(request.user, request.POST.get('filename', ''), size,
+                                      request.POST.get('sha256', ''))
+    except uploads.ChunkError as error:
+        return JsonResponse({'error': str(error)}, status=error.status)
+    return JsonResponse({
+        **upload_status(upload),
+        'chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+        'url': reverse('photo_upload', args=[upload.id]),
+    }, status=201)
 
-    # Check if user is the owner
-    is_owner = request.user.is_authenticated and listing.user == request.user
+
+@login_required
+@require_http_methods(['GET', 'PATCH', 'DELETE'])
+def photo_upload(request, upload_id):
+    """
+    GET: how far a chunked upload got, to resume it from there.
+    PATCH: the next chunk as the request body, at the Upload-Offset header,
+    optionally with an Upload-Checksum header (SHA-256 hex of the chunk).
+    DELETE: cancel it.
+    """
+    upload = get_object_or_404(PhotoUpload, pk=upload_id, user=request.user)
+    if request.method == 'DELETE':
+        upload.delete()
+        return HttpResponse(status=204)
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset is required'}, status=400)
+        try:
+            upload = uploads.receive_chunk(upload, offset, request, length,
+                                           request.headers.get('Upload-Checksum', ''))
+        except uploads.ChunkError as error:
+            received = PhotoUpload.objects.filter(pk=upload.pk).values_list('received', flat=True).first()
+            return JsonResponse({'error': str(error), 'offset': received}, status=error.status)
+    return JsonResponse(upload_status(upload))
+
+
+def listing_detail_tags(request, slug):
+    pk = Listing.objects.filter(slug=slug, is_approved=True).values_list('pk', flat=True).first()
+    return {caching.listing_tag(pk)} if pk is not None else None
+
+
+@pagecache.cached_page(listing_detail_tags)
+def listing_detail(request, slug):
+    """
+    Display individual listing detail page; the same for every visitor, whose
+    own bits the page fetches from listing_visitor
+    """
+    listing = get_object_or_404(Listing.objects.prefetch_related('images'), slug=slug, is_approved=True)
 
     context = {
         'listing': listing,
-        'is_owner': is_owner,
         'page_title': f' {listing.title} | Bnb.co.ke',
         'meta_description': f'Book {listing.title} in {listing.get_location_display()}. {listing.guests} guests, {listing.bedrooms} bedrooms, KES {listing.price_per_night}/night.',
     }
-    return render(request, 'listings/listing_detail.html', context)
\ No newline at end of file
+    if listing.main_image:
+        # Share previews (WhatsApp, Facebook) want a 1.91:1 picture
+        context['og_image'] = request.build_absolute_uri(resize.resized_url(listing.main_image.name, '1200x630'))
+    return render(request, 'listings/listing_detail.html', context)
+
+
+@require_GET
+@never_cache
+def listing_visitor(request, listing_id):
+    """
+    What the shared listing_detail page shows only to this visitor. Every
+    view of the page asks, so views are counted here rather than in
+    listing_detail, which only runs on a page cache miss; crawlers that do not
+    run the page's script and the owner's own visits are not counted.
+    """
+    is_owner = (request.user.is_authenticated
+                and Listing.objects.filter(pk=listing_id, user=request.user).exists())
+    if not is_owner:
+        Listing.objects.filter(pk=listing_id, is_approved=True).count_view()
+    return JsonResponse({'is_owner': is_owner})
+
+# ============================================================================
+# GEO SEARCH - JSON endpoints for "near me" and map viewports
+# ============================================================================
+
+GEO_PAGE_SIZE = 24
+MAX_NEARBY_RADIUS_KM = 50
+
+
+def parse_float(request, name, minimum, maximum, default=None):
+    """Float query parameter within [minimum, maximum], or default"""
+    try:
+        value = float(request.GET[name])
+    except (KeyError, ValueError):
+        return default
+    if not minimum <= value <= maximum:
+        return default
+    return value
+
+
+def get_page_number(request):
+    try:
+        return max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        return 1
+
+
+def geo_results_response(request, queryset, lat, lng, max_radius_km, bbox=None):
+    """Page of listings nearest to (lat, lng) as JSON, closest first"""
+    page = get_page_number(request)
+    offset = (page - 1) * GEO_PAGE_SIZE
+    # One extra hit tells whether another page exists, without counting them all
+    hits = geo.nearest(queryset, lat, lng, offset + GEO_PAGE_SIZE + 1, max_radius_km, bbox=bbox)
+    page_hits = hits[offset:offset + GEO_PAGE_SIZE]
+    distances = dict(page_hits)
+    cards = Listing.objects.cards_by_ids(pk for pk, distance in page_hits)
+
+    return JsonResponse({
+        'page': page,
+        'has_next': len(hits) > offset + GEO_PAGE_SIZE,
+        'results': [
+            {
+                'id': card.id,
+                'title': card.title,
+                'url': card.get_absolute_url(),
+                'location': card.get_location_display(),
+                'specific_location': card.specific_location,
+                'property_type': card.get_property_type_display(),
+                'price': card.formatted_price,
+                'is_featured': card.is_featured,
+                'image': card.main_image.url if card.main_image else None,
+                'latitude': float(card.latitude),
+                'longitude': float(card.longitude),
+                'distance_km': round(distances[card.id], 2),
+            }
+            for card in cards
+        ],
+    })
+
+
+@require_GET
+def nearby_listings(request):
+    """
+    Listings within radius_km of a point, nearest first
+    URL example: /api/listings/nearby/?lat=-1.2921&lng=36.8219&radius_km=5
+    """
+    lat = parse_float(request, 'lat', -90, 90)
+    lng = parse_float(request, 'lng', -180, 180)
+    if lat is None or lng is None:
+        return JsonResponse({'error': 'lat and lng are required'}, status=400)
+    radius_km = parse_float(request, 'radius_km', 0.1, MAX_NEARBY_RADIUS_KM, default=5)
+
+    return geo_results_response(request, get_filtered_listings(request), lat, lng, radius_km)
+
+
+@require_GET
+def listings_in_bbox(request):
+    """
+    Listings inside a map viewport, nearest to its centre first
+    URL example: /api/listings/bbox/?south=-1.35&west=36.65&north=-1.15&east=36.95
+    """
+    south = parse_float(request, 'south', -90, 90)
+    north = parse_float(request, 'north', -90, 90)
+    west = parse_float(request, 'west', -180, 180)
+    east = parse_float(request, 'east', -180, 180)
+    if None in (south, west, north, east) or south > north or west > east:
+        return JsonResponse({'error': 'south, west, north and east are required'}, status=400)
+
+    bbox = (south, west, north, east)
+    lat, lng = (south + north) / 2, (west + east) / 2
+    return geo_results_response(request, get_filtered_listings(request), lat, lng,
+                                geo.bbox_max_radius_km(lat, lng, bbox), bbox=bbox)
+
+
+@require_GET
+def listing_clusters(request, zoom, x, y):
+    """
+    Marker clusters for one 256px map tile, accepting the listing filters
+    URL example: /api/listings/clusters/12/2453/2029/?property_type=apartment
+    """
+    if not clusters.valid_tile(zoom, x, y):
+        return JsonResponse({'error': 'invalid tile'}, status=400)
+
+    filters = get_filter_values(request)
+    filters['amenities'] = sorted(filters['amenities'])
+    result = clusters.tile_clusters(get_filtered_listings(request), zoom, x, y, filters)
+    return JsonResponse({'zoom': zoom, 'x': x, 'y': y, **result})
+
+
+@require_GET
+@cache_control(public=True, max_age=gallery.MAX_AGE)
+def listing_gallery(request, listing_id):
+    """Photos and modal details of one listing card: /api/listings/42/gallery/"""
+    results = gallery.galleries([listing_id])
+    if not results:
+        raise Http404("No such listing")
+    return JsonResponse(results[0])
+
+
+@require_GET
+@cache_control(public=True, max_age=gallery.MAX_AGE)
+def listing_galleries(request):
+    """Photos and modal details of several listing cards: /api/listings/gallery/?ids=3,17,42"""
+    try:
+        ids = gallery.parse_ids(request.GET.get('ids', ''))
+    except ValueError:
+        return JsonResponse({'error': f'ids must be up to {gallery.MAX_BATCH} listing ids'}, status=400)
+    return JsonResponse({'results': gallery.galleries(ids)})
+
+
+# ============================================================================
+# MEDIA - checked here, sent by the web server (see delivery.py)
+# ============================================================================
+
+def protected_media(request, path):
+    """A media file, if the request may see it"""
+    return delivery.send_file(
+        request, settings.MEDIA_ROOT, path, settings.MEDIA_ACCEL_LOCATION,
+        delivery.cache_control(request, path),
+    )
+
+
+def resized_media(request, size, path):
+    """
+    A media image resized to one of MEDIA_RESIZE_SIZES, rendered on the first
+    request and served from the disk cache after that
+    """
+    cache_control = delivery.cache_control(request, path)
+    try:
+        cached = resize.resized(path, size)
+    except (ValueError, FileNotFoundError):
+        raise Http404("No such image or size")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        logger.warning("Could not resize %s to %s", path, size, exc_info=True)
+        raise Http404("No such image or size")
+    cache_dir = os.fspath(settings.MEDIA_RESIZE_CACHE_DIR)
+    return delivery.send_file(
+        request, cache_dir, os.path.relpath(cached, cache_dir), settings.MEDIA_RESIZE_ACCEL_LOCATION, cache_control,
+    )
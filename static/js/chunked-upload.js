@@ -0,0 +1,181 @@
+/*
+ * Resumable chunked photo uploads for the listing forms.
+ *
+ * A form with data-chunked-uploads="<start url>" uploads each photo as soon
+ * as it is chosen, in chunks, and after a dropped connection resumes from the
+ * offset the server has instead of starting over. The finished upload's id
+ * goes in a hidden <name>_upload input and the file input is emptied on
+ * submit, so the submit itself carries no photo bytes. A photo whose upload
+ * gives up is posted with the form as before.
+ */
+(function () {
+  'use strict';
+
+  var MAX_FAILURES = 8;
+
+  function csrfToken(form) {
+    var input = form.querySelector('input[name=csrfmiddlewaretoken]');
+    return input ? input.value : '';
+  }
+
+  function hex(buffer) {
+    return Array.prototype.map.call(new Uint8Array(buffer), function (byte) {
+      return ('0' + byte.toString(16)).slice(-2);
+    }).join('');
+  }
+
+  async function sha256(blob) {
+    // crypto.subtle only exists on https (and localhost); the server then skips the check
+    if (!window.crypto || !window.crypto.subtle) {
+      return '';
+    }
+    return hex(await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer()));
+  }
+
+  function sleep(ms) {
+    return new Promise(function (resolve) { setTimeout(resolve, ms); });
+  }
+
+  async function send(form, method, url, body, headers) {
+    var response = await fetch(url, {
+      method: method,
+      body: body,
+      credentials: 'same-origin',
+      headers: Object.assign({'X-CSRFToken': csrfToken(form)}, headers || {})
+    });
+    var data = await response.json().catch(function () { return {}; });
+    data.status = response.status;
+    return data;
+  }
+
+  async function upload(form, file, progress) {
+    var start = new FormData();
+    start.append('filename', file.name);
+    start.append('size', file.size);
+    start.append('sha256', await sha256(file));
+    var session = await send(form, 'POST', form.dataset.chunkedUploads, start);
+    if (session.status !== 201) {
+      throw new Error(session.error || 'Upload refused');
+    }
+
+    var offset = 0;
+    var failures = 0;
+    for (;;) {
+      var chunk = file.slice(offset, offset + session.chunk_size);
+      var result = null;
+      try {
+        result = await send(form, 'PATCH', session.url, chunk, {
+          'Upload-Offset': String(offset),
+          'Upload-Checksum': await sha256(chunk)
+        });
+      } catch (networkError) {
+        result = null;
+      }
+      if (result && result.status === 200) {
+        if (result.complete) {
+          return session.id;
+        }
+        offset = result.offset;
+        failures = 0;
+        progress(offset / file.size);
+        continue;
+      }
+      // Refused for good (too large, too many pixels, gone); 400/409 are worth retrying
+      if (result && result.status >= 401 && result.status < 500 && result.status !== 409) {
+        throw new Error(result.error || 'Upload refused');
+      }
+      if (++failures > MAX_FAILURES) {
+        throw new Error('Upload failed');
+      }
+      await sleep(Math.min(30000, 1000 * Math.pow(2, failures)));
+      // Carry on from wherever the server got to
+      try {
+        var status = await send(form, 'GET', session.url);
+        if (status.status === 200) {
+          if (status.complete) {
+            return session.id;
+          }
+          offset = status.offset;
+        }
+      } catch (networkError) {
+        // still offline; the next attempt will tell
+      }
+    }
+  }
+
+  function hiddenInput(form, name) {
+    var input = form.querySelector('input[name="' + name + '_upload"]');
+    if (!input) {
+      input = document.createElement('input');
+      input.type = 'hidden';
+      input.name = name + '_upload';
+      form.appendChild(input);
+    }
+    return input;
+  }
+
+  function statusNote(input) {
+    var note = input.parentNode.querySelector('.chunked-upload-status');
+    if (!note) {
+      note = document.createElement('small');
+      note.className = 'chunked-upload-status';
+      input.parentNode.appendChild(note);
+    }
+    return note;
+  }
+
+  function init(form) {
+    var jobs = new Map();
+
+    form.querySelectorAll('input[type=file]').forEach(function (input) {
+      input.addEventListener('change', function () {
+        var hidden = hiddenInput(form, input.name);
+        var file = input.files[0];
+        hidden.value = '';
+        delete form.dataset.chunkedReady;
+        if (!file) {
+          jobs.delete(input);
+          return;
+        }
+        var note = statusNote(input);
+        note.textContent = 'Uploading…';
+        jobs.set(input, upload(form, file, function (done) {
+          note.textContent = 'Uploading… ' + Math.round(done * 100) + '%';
+        }).then(function (id) {
+          if (input.files[0] === file) {
+            hidden.value = id;
+          }
+          note.textContent = 'Uploaded';
+        }, function (error) {
+          note.textContent = error.message + ' - the photo will be sent with the form';
+        }));
+      });
+    });
+
+    form.addEventListener('submit', function (event) {
+      if (form.dataset.chunkedReady) {
+        return;
+      }
+      event.preventDefault();
+      var submitter = event.submitter;
+      Promise.all(Array.from(jobs.values())).then(function () {
+        jobs.forEach(function (job, input) {
+          // Already on the server
+          if (hiddenInput(form, input.name).value) {
+            input.value = '';
+          }
+        });
+        form.dataset.chunkedReady = '1';
+        if (form.requestSubmit) {
+          form.requestSubmit(submitter);
+        } else {
+          form.submit();
+        }
+      });
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('form[data-chunked-uploads]').forEach(init);
+  });
+})();
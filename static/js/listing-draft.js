@@ -0,0 +1,99 @@
+/*
+ * Partial submits of a listing form rendered from a server-side draft.
+ *
+ * The draft already holds every value the form was rendered with, so a form
+ * marked data-listing-draft="<status url>" only posts the fields the host
+ * changed, plus partial_draft=1; the server fills in the rest from the draft.
+ * The draft may have expired since the form was rendered, so the status url
+ * is asked first and the whole form is posted when it is gone. Loaded after
+ * chunked-upload.js, whose submit handler first waits for pending photos.
+ */
+(function () {
+  'use strict';
+
+  function hidden(form, name, value) {
+    var input = document.createElement('input');
+    input.type = 'hidden';
+    input.name = name;
+    input.value = value;
+    form.appendChild(input);
+  }
+
+  function unchanged(element) {
+    switch (element.type) {
+      case 'checkbox':
+      case 'radio':
+        return element.checked === element.defaultChecked;
+      case 'select-one':
+      case 'select-multiple':
+        return Array.prototype.every.call(element.options, function (option) {
+          return option.selected === option.defaultSelected;
+        });
+      case 'file':
+        return !element.files.length;
+      case 'hidden':
+        // Setting a hidden input's value moves its default too; always post them
+        return false;
+      default:
+        return element.value === element.defaultValue;
+    }
+  }
+
+  function leaveOutUnchanged(form) {
+    var groups = {};
+    Array.prototype.forEach.call(form.elements, function (element) {
+      if (!element.name || element.disabled || element.name === 'csrfmiddlewaretoken' ||
+          element.type === 'submit' || element.type === 'button') {
+        return;
+      }
+      (groups[element.name] = groups[element.name] || []).push(element);
+    });
+    Object.keys(groups).forEach(function (name) {
+      var elements = groups[name];
+      if (elements.every(unchanged)) {
+        elements.forEach(function (element) { element.disabled = true; });
+      } else if (elements.length === 1 && elements[0].type === 'checkbox' && !elements[0].checked) {
+        // Unticked boxes aren't posted; say so explicitly
+        elements[0].disabled = true;
+        hidden(form, name, 'false');
+      }
+    });
+    hidden(form, 'partial_draft', '1');
+  }
+
+  function draftExists(url) {
+    return fetch(url, { credentials: 'same-origin', cache: 'no-store' }).then(function (response) {
+      return response.ok ? response.json() : { exists: false };
+    }).then(function (status) {
+      return status.exists;
+    }, function () {
+      // Unsure: the whole form is always safe to send
+      return false;
+    });
+  }
+
+  function init(form) {
+    form.addEventListener('submit', function (event) {
+      if (event.defaultPrevented || form.dataset.draftChecked) {
+        return;
+      }
+      event.preventDefault();
+      var submitter = event.submitter;
+      draftExists(form.dataset.listingDraft).then(function (exists) {
+        if (exists) {
+          leaveOutUnchanged(form);
+        }
+        form.dataset.draftChecked = '1';
+        if (form.requestSubmit) {
+          form.requestSubmit(submitter);
+        } else {
+          form.submit();
+        }
+      });
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('form[data-listing-draft]').forEach(init);
+  });
+})();